@@ -0,0 +1,16 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts
+(``gunicorn prompt_platform.wsgi:application``). Module-level names are
+gunicorn settings, so imports stay inside the hooks.
+"""
+
+
+def child_exit(server, worker):
+    # Keep an exited worker's counts without leaving its metrics file behind
+    from decouple import config
+
+    directory = config('PROMETHEUS_MULTIPROC_DIR', default='')
+    if directory:
+        from prompt_platform.metrics import mark_process_dead
+
+        mark_process_dead(worker.pid, directory)
@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Payment, StripeAccount
+from django.utils import timezone
+
+from prompt_platform.pagination import EstimatedCountPaginator
+
+from .models import (
+    CreatorBalance, LedgerEntry, Payment, Payout, ReconciliationCheckpoint, Settlement, StripeAccount, WebhookEvent,
+)
 
 
 @admin.register(Payment)
@@ -21,6 +27,11 @@ class PaymentAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'prompt')
 
 
 @admin.register(StripeAccount)
@@ -28,4 +39,84 @@ class StripeAccountAdmin(admin.ModelAdmin):
     list_display = ['user', 'stripe_account_id', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['user__username', 'user__email', 'stripe_account_id']
-    readonly_fields = ['created_at', 'updated_at'] 
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ['stripe_event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at']
+    list_filter = ['status', 'event_type', 'received_at']
+    search_fields = ['stripe_event_id']
+    readonly_fields = [
+        'stripe_event_id', 'event_type', 'payload', 'attempts', 'last_error',
+        'stripe_created_at', 'received_at', 'processed_at', 'locked_at'
+    ]
+    actions = ['retry_events']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    @admin.action(description='Retry selected events')
+    def retry_events(self, request, queryset):
+        updated = queryset.exclude(status='processing').update(
+            status='pending', next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} events queued for processing.')
+
+
+@admin.register(ReconciliationCheckpoint)
+class ReconciliationCheckpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'last_created_at', 'last_payment_id', 'updated_at']
+    readonly_fields = ['last_run_stats', 'updated_at']
+
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['creator', 'entry_type', 'gross', 'platform_fee', 'net', 'settlement', 'created_at']
+    list_filter = ['entry_type', 'created_at']
+    search_fields = ['creator__username', 'purchase__stripe_payment_intent_id']
+    raw_id_fields = ['creator', 'purchase', 'settlement']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('creator', 'settlement')
+    
+    # The ledger is append-only
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class PayoutInline(admin.TabularInline):
+    model = Payout
+    extra = 0
+    raw_id_fields = ['creator']
+    readonly_fields = ['creator', 'entry_count', 'gross', 'platform_fee', 'net', 'created_at']
+
+
+@admin.register(Settlement)
+class SettlementAdmin(admin.ModelAdmin):
+    list_display = ['pk', 'creator_count', 'entry_count', 'gross', 'platform_fee', 'net', 'cutoff', 'created_at']
+    readonly_fields = ['creator_count', 'entry_count', 'gross', 'platform_fee', 'net', 'cutoff', 'created_at']
+    inlines = [PayoutInline]
+
+
+@admin.register(Payout)
+class PayoutAdmin(admin.ModelAdmin):
+    list_display = ['creator', 'net', 'currency', 'status', 'settlement', 'created_at', 'paid_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['creator__username', 'stripe_transfer_id']
+    raw_id_fields = ['creator', 'settlement']
+    readonly_fields = ['entry_count', 'gross', 'platform_fee', 'net', 'created_at']
+
+
+@admin.register(CreatorBalance)
+class CreatorBalanceAdmin(admin.ModelAdmin):
+    list_display = ['creator', 'unsettled', 'settled_total', 'net_total', 'gross_total', 'entry_count', 'updated_at']
+    search_fields = ['creator__username', 'creator__email']
+    raw_id_fields = ['creator']
+    readonly_fields = [
+        'gross_total', 'fee_total', 'net_total', 'unsettled', 'settled_total', 'entry_count', 'updated_at'
+    ]
@@ -3,4 +3,16 @@ from django.apps import AppConfig
 
 class PaymentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'payments' 
\ No newline at end of file
+    name = 'payments'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_save
+
+        from . import stripe_client
+        from .customers import provision_on_signup
+        from .ledger import book_purchase
+
+        stripe_client.configure()
+        post_save.connect(provision_on_signup, sender=settings.AUTH_USER_MODEL, dispatch_uid='payments.provision_on_signup')
+        post_save.connect(book_purchase, sender='prompts.PromptPurchase', dispatch_uid='payments.book_purchase')
@@ -0,0 +1,69 @@
+"""
+Stripe customers for platform users.
+
+New users get their Stripe customer created in the background right after
+signup (``provision_on_signup``), so checkout normally needs a single Stripe
+call. ``ensure_customer`` covers users created before that, or whose
+provisioning failed, and is safe to race: both paths use the same
+idempotency key and only fill ``stripe_customer_id`` while it is empty.
+"""
+import logging
+
+import stripe
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from prompt_platform import background
+
+from .stripe_client import stripe_call
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_customer(user):
+    """Return ``user``'s Stripe customer ID, creating the customer if needed."""
+    if user.stripe_customer_id:
+        return user.stripe_customer_id
+
+    with stripe_call('customer.create'):
+        customer = stripe.Customer.create(
+            email=user.email,
+            name=user.full_name,
+            metadata={'user_id': user.pk},
+            idempotency_key=f'customer-{user.pk}',
+        )
+
+    # Write just this column, and only if no one else got there first
+    User = get_user_model()
+    updated = User.objects.filter(pk=user.pk, stripe_customer_id='').update(stripe_customer_id=customer.id)
+    if updated:
+        user.stripe_customer_id = customer.id
+    else:
+        user.stripe_customer_id = User.objects.values_list('stripe_customer_id', flat=True).get(pk=user.pk)
+    return user.stripe_customer_id
+
+
+def provision_customer(user_id):
+    """Create the Stripe customer for a new user (the ``provision_customer`` task)."""
+    user = get_user_model().objects.filter(pk=user_id).first()
+    if user is None:
+        return
+    try:
+        ensure_customer(user)
+    except stripe.error.StripeError:
+        # Checkout will try again with ensure_customer
+        logger.warning('Could not provision a Stripe customer for user %s', user_id, exc_info=True)
+
+
+def provision_on_signup(sender, instance, created, raw=False, **kwargs):
+    """``post_save`` receiver for the user model."""
+    if not created or raw or instance.stripe_customer_id:
+        return
+    if not (settings.STRIPE_PROVISION_CUSTOMERS and settings.STRIPE_SECRET_KEY):
+        return
+    # Imported here: tasks imports this module
+    from .tasks import provision_customer as provision_task
+
+    # Wait for the user row to be committed before a worker looks for it
+    transaction.on_commit(lambda: background.enqueue(provision_task, instance.pk))
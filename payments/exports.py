@@ -0,0 +1,16 @@
+PAYMENT_EXPORT_FIELDS = [
+    'created_at', 'prompt', 'amount', 'currency', 'status', 'stripe_payment_intent_id', 'completed_at',
+]
+
+
+def payment_export_row(payment):
+    """Serialize a payment (with ``prompt`` selected) into an export row."""
+    return {
+        'created_at': payment.created_at.isoformat(),
+        'prompt': payment.prompt.title,
+        'amount': float(payment.amount),
+        'currency': payment.currency,
+        'status': payment.status,
+        'stripe_payment_intent_id': payment.stripe_payment_intent_id,
+        'completed_at': payment.completed_at.isoformat() if payment.completed_at else '',
+    }
@@ -0,0 +1,350 @@
+"""
+A local stand-in for the parts of the Stripe API this project uses.
+
+``FakeStripe`` keeps customers, PaymentIntents and account links in memory
+and answers the form-encoded requests ``stripe-python`` sends, honouring
+``Idempotency-Key``. It can add latency (``latency`` plus up to ``jitter``
+seconds) and fail a ``failure_rate`` fraction of requests with a 500.
+Confirming a PaymentIntent queues a signed ``payment_intent.succeeded``
+event; delivery threads hand it to ``deliver(payload, signature)``, which
+returns the HTTP status. Like Stripe, they retry events that did not get a
+2xx (up to ``delivery_attempts`` times) and send a ``duplicate_rate``
+fraction twice.
+
+``FakeStripeServer`` serves a ``FakeStripe`` over HTTP. Point the app at it
+with ``STRIPE_API_BASE`` (see the ``fake_stripe`` command), or let
+``payments_loadtest`` start one in process.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import queue
+import random
+import re
+import secrets
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+
+def sign_payload(payload, secret, timestamp=None):
+    """A ``Stripe-Signature`` header value for ``payload``, as Stripe computes it."""
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+def parse_form(body):
+    """Decode Stripe's ``a[b][c]=value`` form encoding into nested dicts."""
+    params = {}
+    for key, value in parse_qsl(body, keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        target = params
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        target[parts[-1]] = value
+    return params
+
+
+class FakeStripeError(Exception):
+    def __init__(self, status, error_type, message):
+        super().__init__(message)
+        self.status = status
+        self.body = {'error': {'type': error_type, 'message': message}}
+
+
+class FakeStripe:
+    def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, duplicate_rate=0.0,
+                 webhook_secret='', deliver=None, delivery_workers=4, delivery_attempts=3, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.duplicate_rate = duplicate_rate
+        self.webhook_secret = webhook_secret
+        self.deliver = deliver
+        self.delivery_workers = delivery_workers
+        self.delivery_attempts = delivery_attempts
+
+        self.customers = {}
+        self.payment_intents = {}
+        self.account_links = []
+        self.events = []
+        self.deliveries = []  # (event id, attempt, status code, seconds)
+        self.requests = 0
+        self.injected_failures = 0
+
+        self._random = random.Random(seed)
+        self._ids = itertools.count(1)
+        self._idempotent = {}
+        self._lock = threading.Lock()
+        self._outbox = queue.Queue()
+        self._delivery_threads = []
+
+    def _id(self, prefix):
+        return f'{prefix}_{next(self._ids):08d}{secrets.token_hex(4)}'
+
+    # Request handling
+
+    def handle(self, method, path, params, idempotency_key=None):
+        """Return ``(status, body)`` for one API request."""
+        with self._lock:
+            self.requests += 1
+            delay = self.latency + self._random.random() * self.jitter
+            fail = self._random.random() < self.failure_rate
+            if idempotency_key and (method, path, idempotency_key) in self._idempotent:
+                return self._idempotent[method, path, idempotency_key]
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.injected_failures += 1
+            return 500, FakeStripeError(500, 'api_error', 'Injected failure').body
+
+        try:
+            response = 200, self.route(method, path, params)
+        except FakeStripeError as e:
+            response = e.status, e.body
+        if idempotency_key:
+            # Replays return the first response, as Stripe's do
+            with self._lock:
+                response = self._idempotent.setdefault((method, path, idempotency_key), response)
+        return response
+
+    def route(self, method, path, params):
+        parts = path.strip('/').split('/')[1:]  # drop the version prefix
+        if method == 'POST' and parts == ['customers']:
+            return self.create_customer(params)
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'customers':
+            return self._get(self.customers, parts[1], 'customer')
+        if method == 'POST' and parts == ['payment_intents']:
+            return self.create_payment_intent(params)
+        if method == 'GET' and parts == ['payment_intents']:
+            return self.list_payment_intents(params)
+        if method == 'GET' and len(parts) == 2 and parts[0] == 'payment_intents':
+            return self._get(self.payment_intents, parts[1], 'payment_intent')
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'payment_intents' and parts[2] == 'confirm':
+            return self.confirm_payment_intent(parts[1])
+        if method == 'POST' and parts == ['account_links']:
+            return self.create_account_link(params)
+        raise FakeStripeError(404, 'invalid_request_error', f'Unrecognized request URL ({method}: {path})')
+
+    def _get(self, objects, object_id, name):
+        try:
+            return objects[object_id]
+        except KeyError:
+            raise FakeStripeError(404, 'invalid_request_error', f"No such {name}: '{object_id}'")
+
+    def create_customer(self, params):
+        customer = {
+            'id': self._id('cus'),
+            'object': 'customer',
+            'created': int(time.time()),
+            'email': params.get('email'),
+            'name': params.get('name'),
+            'metadata': params.get('metadata', {}),
+        }
+        with self._lock:
+            self.customers[customer['id']] = customer
+        return customer
+
+    def create_payment_intent(self, params):
+        try:
+            amount = int(params['amount'])
+        except (KeyError, ValueError):
+            raise FakeStripeError(400, 'invalid_request_error', 'Missing required param: amount.')
+        customer = params.get('customer')
+        if customer and customer not in self.customers:
+            raise FakeStripeError(400, 'invalid_request_error', f"No such customer: '{customer}'")
+        intent_id = self._id('pi')
+        intent = {
+            'id': intent_id,
+            'object': 'payment_intent',
+            'created': int(time.time()),
+            'amount': amount,
+            'amount_received': 0,
+            'currency': params.get('currency', 'usd'),
+            'customer': customer,
+            'metadata': params.get('metadata', {}),
+            'status': 'requires_payment_method',
+            'client_secret': f'{intent_id}_secret_{secrets.token_hex(8)}',
+        }
+        with self._lock:
+            self.payment_intents[intent_id] = intent
+        return intent
+
+    def list_payment_intents(self, params):
+        """A page of intents, newest first, filtered by ``created[gte|gt|lte|lt]``."""
+        try:
+            limit = min(max(int(params.get('limit', 10)), 1), 100)
+        except ValueError:
+            raise FakeStripeError(400, 'invalid_request_error', 'Invalid integer: limit.')
+        created = params.get('created', {})
+        if not isinstance(created, dict):
+            created = {'gte': created, 'lte': created}
+        bounds = {op: int(value) for op, value in created.items()}
+        checks = {
+            'gte': lambda t, v: t >= v,
+            'gt': lambda t, v: t > v,
+            'lte': lambda t, v: t <= v,
+            'lt': lambda t, v: t < v,
+        }
+        with self._lock:
+            # Insertion order breaks ties between intents created in the same second
+            intents = list(self.payment_intents.values())[::-1]
+        intents.sort(key=lambda intent: intent['created'], reverse=True)
+        intents = [
+            intent for intent in intents
+            if all(checks[op](intent['created'], value) for op, value in bounds.items() if op in checks)
+        ]
+        starting_after = params.get('starting_after')
+        if starting_after:
+            ids = [intent['id'] for intent in intents]
+            if starting_after not in ids:
+                raise FakeStripeError(400, 'invalid_request_error', f"No such payment_intent: '{starting_after}'")
+            intents = intents[ids.index(starting_after) + 1:]
+        return {
+            'object': 'list',
+            'url': '/v1/payment_intents',
+            'has_more': len(intents) > limit,
+            'data': intents[:limit],
+        }
+
+    def confirm_payment_intent(self, intent_id, succeed=True):
+        """Settle an intent (what Stripe.js does in the browser) and queue its webhook."""
+        intent = self._get(self.payment_intents, intent_id, 'payment_intent')
+        with self._lock:
+            if intent['status'] in ('succeeded', 'canceled'):
+                raise FakeStripeError(400, 'payment_intent_unexpected_state', 'This PaymentIntent has already been confirmed.')
+            intent['status'] = 'succeeded' if succeed else 'requires_payment_method'
+            if succeed:
+                intent['amount_received'] = intent['amount']
+        self.emit('payment_intent.succeeded' if succeed else 'payment_intent.payment_failed', dict(intent))
+        return intent
+
+    def create_account_link(self, params):
+        link = {
+            'object': 'account_link',
+            'created': int(time.time()),
+            'expires_at': int(time.time()) + 300,
+            'url': f'https://connect.stripe.test/setup/{params.get("account", "")}/{secrets.token_hex(8)}',
+        }
+        with self._lock:
+            self.account_links.append(link)
+        return link
+
+    def find_payment_intent(self, client_secret):
+        intent_id = client_secret.split('_secret_')[0]
+        return self.payment_intents.get(intent_id)
+
+    # Webhooks
+
+    def emit(self, event_type, obj):
+        event = {
+            'id': self._id('evt'),
+            'object': 'event',
+            'type': event_type,
+            'created': int(time.time()),
+            'api_version': '2023-10-16',
+            'livemode': False,
+            'data': {'object': obj},
+        }
+        with self._lock:
+            self.events.append(event)
+            duplicate = self._random.random() < self.duplicate_rate
+        if self.deliver is None:
+            return event
+        self._outbox.put((event, 1))
+        if duplicate:
+            self._outbox.put((event, 1))
+        return event
+
+    def start_delivery(self):
+        for i in range(self.delivery_workers):
+            thread = threading.Thread(target=self._deliver_loop, name=f'fake-stripe-webhooks-{i}', daemon=True)
+            thread.start()
+            self._delivery_threads.append(thread)
+
+    def _deliver_loop(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                self._outbox.task_done()
+                return
+            event, attempt = item
+            payload = json.dumps(event)
+            started = time.perf_counter()
+            try:
+                status = self.deliver(payload, sign_payload(payload, self.webhook_secret))
+            except Exception:
+                status = 0
+            with self._lock:
+                self.deliveries.append((event['id'], attempt, status, time.perf_counter() - started))
+            if not 200 <= status < 300 and attempt < self.delivery_attempts:
+                self._outbox.put((event, attempt + 1))
+            self._outbox.task_done()
+
+    def wait_for_deliveries(self):
+        """Block until every queued webhook has been delivered."""
+        self._outbox.join()
+
+    def stop_delivery(self):
+        for _ in self._delivery_threads:
+            self._outbox.put(None)
+        for thread in self._delivery_threads:
+            thread.join()
+        self._delivery_threads = []
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+    def _respond(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length).decode() if length else ''
+        url = urlsplit(self.path)
+        params = parse_form(body or url.query)
+        status, payload = self.server.fake.handle(
+            self.command, url.path, params, self.headers.get('Idempotency-Key')
+        )
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Request-Id', f'req_{secrets.token_hex(8)}')
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _respond
+    do_POST = _respond
+    do_DELETE = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fake, host='127.0.0.1', port=0):
+        super().__init__((host, port), _Handler)
+        self.fake = fake
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve from a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-stripe', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
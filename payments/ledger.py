@@ -0,0 +1,258 @@
+"""
+Creator earnings ledger and payout settlement.
+
+Every completed purchase books a ``sale`` entry that splits the price into
+the platform fee (``PLATFORM_FEE_PERCENT``) and the creator's net; a refund
+books a negated ``refund`` entry. Booking also bumps the creator's
+``CreatorBalance`` with F() expressions in the same transaction, so a
+balance is one row read, never a scan of purchase history.
+
+``settle`` claims every unsettled entry older than a cutoff with a single
+UPDATE, totals the claimed entries per creator in one grouped query and
+writes a ``Payout`` per creator. Creators whose net isn't positive (refunds
+outweighing sales) are released to roll into the next settlement.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from prompts.models import PromptPurchase
+
+from .models import CreatorBalance, LedgerEntry, Payout, Settlement
+
+CENTS = Decimal('0.01')
+
+
+def split_amount(gross, fee_percent=None):
+    """Return ``(platform_fee, net)`` for a ``gross`` amount."""
+    if fee_percent is None:
+        fee_percent = settings.PLATFORM_FEE_PERCENT
+    fee = (gross * Decimal(str(fee_percent)) / 100).quantize(CENTS, rounding=ROUND_HALF_UP)
+    return fee, gross - fee
+
+
+def creator_balance(user):
+    """``user``'s balance row, or an unsaved zero balance if nothing was booked yet."""
+    return CreatorBalance.objects.filter(creator=user).first() or CreatorBalance(creator=user)
+
+
+def _apply_to_balance(creator_id, gross, fee, net):
+    updates = {
+        'gross_total': F('gross_total') + gross,
+        'fee_total': F('fee_total') + fee,
+        'net_total': F('net_total') + net,
+        'unsettled': F('unsettled') + net,
+        'entry_count': F('entry_count') + 1,
+        'updated_at': timezone.now(),
+    }
+    if not CreatorBalance.objects.filter(creator_id=creator_id).update(**updates):
+        CreatorBalance.objects.get_or_create(creator_id=creator_id)
+        CreatorBalance.objects.filter(creator_id=creator_id).update(**updates)
+
+
+def book(purchase, entry_type='sale'):
+    """
+    Write ``purchase``'s ``sale`` or ``refund`` entry and update the balance.
+
+    Returns the entry, or None if that entry was already booked.
+    """
+    fee, net = split_amount(purchase.amount)
+    gross = purchase.amount
+    if entry_type == 'refund':
+        gross, fee, net = -gross, -fee, -net
+    creator_id = purchase.prompt.author_id
+    try:
+        with transaction.atomic():
+            entry = LedgerEntry.objects.create(
+                creator_id=creator_id,
+                purchase=purchase,
+                entry_type=entry_type,
+                gross=gross,
+                platform_fee=fee,
+                net=net,
+            )
+            _apply_to_balance(creator_id, gross, fee, net)
+    except IntegrityError:
+        # The unique (purchase, entry_type) constraint: booked already
+        return None
+    return entry
+
+
+def book_purchase(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """``post_save`` receiver for ``PromptPurchase``."""
+    if raw or (update_fields is not None and 'payment_status' not in update_fields):
+        return
+    if instance.payment_status == 'completed':
+        book(instance, 'sale')
+    elif instance.payment_status == 'refunded':
+        # Only reverse what was booked; purchases from before the ledger need backfill first
+        if LedgerEntry.objects.filter(purchase=instance, entry_type='sale').exists():
+            book(instance, 'refund')
+
+
+def rebuild_balances(creator_ids):
+    """Recompute the balances of ``creator_ids`` from their ledger entries."""
+    totals = LedgerEntry.objects.filter(creator_id__in=creator_ids).values('creator_id').annotate(
+        gross_sum=Sum('gross'),
+        fee_sum=Sum('platform_fee'),
+        net_sum=Sum('net'),
+        unsettled_sum=Sum('net', filter=Q(settlement__isnull=True)),
+        entries=Count('pk'),
+    ).order_by()
+    for row in totals:
+        unsettled = row['unsettled_sum'] or Decimal('0')
+        CreatorBalance.objects.update_or_create(
+            creator_id=row['creator_id'],
+            defaults={
+                'gross_total': row['gross_sum'],
+                'fee_total': row['fee_sum'],
+                'net_total': row['net_sum'],
+                'unsettled': unsettled,
+                'settled_total': row['net_sum'] - unsettled,
+                'entry_count': row['entries'],
+            },
+        )
+
+
+def backfill(batch_size=1000):
+    """
+    Book entries for completed and refunded purchases made before the ledger
+    existed, ``batch_size`` purchases at a time. Safe to run again.
+    """
+    booked = 0
+    last_pk = 0
+    while True:
+        purchases = list(
+            PromptPurchase.objects.filter(pk__gt=last_pk, payment_status__in=('completed', 'refunded'))
+            .order_by('pk')
+            .values('pk', 'amount', 'payment_status', 'prompt__author_id')[:batch_size]
+        )
+        if not purchases:
+            return booked
+        last_pk = purchases[-1]['pk']
+
+        entries = []
+        for purchase in purchases:
+            fee, net = split_amount(purchase['amount'])
+            sale = LedgerEntry(
+                creator_id=purchase['prompt__author_id'],
+                purchase_id=purchase['pk'],
+                entry_type='sale',
+                gross=purchase['amount'],
+                platform_fee=fee,
+                net=net,
+            )
+            entries.append(sale)
+            if purchase['payment_status'] == 'refunded':
+                entries.append(LedgerEntry(
+                    creator_id=sale.creator_id,
+                    purchase_id=sale.purchase_id,
+                    entry_type='refund',
+                    gross=-sale.gross,
+                    platform_fee=-fee,
+                    net=-net,
+                ))
+
+        creator_ids = {entry.creator_id for entry in entries}
+        with transaction.atomic():
+            before = LedgerEntry.objects.filter(creator_id__in=creator_ids).count()
+            LedgerEntry.objects.bulk_create(entries, ignore_conflicts=True)
+            booked += LedgerEntry.objects.filter(creator_id__in=creator_ids).count() - before
+            rebuild_balances(creator_ids)
+
+
+def backfill_preview():
+    """
+    What ``backfill`` would book, without writing: the number of entries
+    and their net total, from the purchases that lack them.
+    """
+    booked = LedgerEntry.objects.filter(purchase=OuterRef('pk'))
+    purchases = PromptPurchase.objects.annotate(
+        has_sale=Exists(booked.filter(entry_type='sale')),
+        has_refund=Exists(booked.filter(entry_type='refund')),
+    )
+    sales = purchases.filter(payment_status__in=('completed', 'refunded'), has_sale=False)
+    refunds = purchases.filter(payment_status='refunded', has_refund=False)
+
+    entries = 0
+    net = Decimal('0')
+    for queryset, sign in ((sales, 1), (refunds, -1)):
+        # Fees are rounded per purchase, so the split is done per amount
+        for amount, count in queryset.values_list('amount').annotate(count=Count('pk')).order_by():
+            entries += count
+            net += sign * split_amount(amount)[1] * count
+    return entries, net
+
+
+def pending_totals(cutoff):
+    """Per-creator totals of the unsettled entries created before ``cutoff``."""
+    return LedgerEntry.objects.filter(settlement__isnull=True, created_at__lt=cutoff).values('creator_id').annotate(
+        entries=Count('pk'),
+        gross=Sum('gross'),
+        fee=Sum('platform_fee'),
+        net=Sum('net'),
+    ).order_by('creator_id')
+
+
+def settle(cutoff=None):
+    """
+    Roll the unsettled entries created before ``cutoff`` into payouts.
+
+    Returns the new ``Settlement``, or None if nobody is owed anything.
+    """
+    cutoff = cutoff or timezone.now()
+    with transaction.atomic():
+        settlement = Settlement.objects.create(cutoff=cutoff)
+        # Claim first, then total exactly what was claimed: entries booked meanwhile wait for the next run
+        claimed = LedgerEntry.objects.filter(settlement__isnull=True, created_at__lt=cutoff).update(
+            settlement=settlement
+        )
+        totals = []
+        if claimed:
+            totals = list(
+                LedgerEntry.objects.filter(settlement=settlement).values('creator_id').annotate(
+                    entries=Count('pk'),
+                    gross=Sum('gross'),
+                    fee=Sum('platform_fee'),
+                    net=Sum('net'),
+                ).order_by('creator_id')
+            )
+
+        held = [row['creator_id'] for row in totals if row['net'] <= 0]
+        if held:
+            LedgerEntry.objects.filter(settlement=settlement, creator_id__in=held).update(settlement=None)
+        owed = [row for row in totals if row['net'] > 0]
+        if not owed:
+            settlement.delete()
+            return None
+
+        Payout.objects.bulk_create([
+            Payout(
+                settlement=settlement,
+                creator_id=row['creator_id'],
+                entry_count=row['entries'],
+                gross=row['gross'],
+                platform_fee=row['fee'],
+                net=row['net'],
+            )
+            for row in owed
+        ])
+        payout_net = Subquery(
+            Payout.objects.filter(settlement=settlement, creator_id=OuterRef('creator_id')).values('net')
+        )
+        CreatorBalance.objects.filter(creator_id__in=[row['creator_id'] for row in owed]).update(
+            unsettled=F('unsettled') - payout_net,
+            settled_total=F('settled_total') + payout_net,
+            updated_at=timezone.now(),
+        )
+
+        settlement.entry_count = sum(row['entries'] for row in owed)
+        settlement.creator_count = len(owed)
+        settlement.gross = sum(row['gross'] for row in owed).quantize(CENTS)
+        settlement.platform_fee = sum(row['fee'] for row in owed).quantize(CENTS)
+        settlement.net = sum(row['net'] for row in owed).quantize(CENTS)
+        settlement.save(update_fields=['entry_count', 'creator_count', 'gross', 'platform_fee', 'net'])
+    return settlement
@@ -0,0 +1,380 @@
+"""
+Payments throughput and consistency harness (see ``payments_loadtest``).
+
+A simulated checkout is one buyer opening ``create_payment`` for a prompt
+they don't own and paying; the fake Stripe settles the PaymentIntent, as
+Stripe.js would in the browser, and delivers the signed
+``payment_intent.succeeded`` webhook to ``stripe_webhook``. A
+``redirect_rate`` fraction of buyers also land on ``payment_success``, so
+the browser redirect races the webhook as it does in production.
+
+Requests go through the Django test client in process, or over HTTP to a
+running server that uses this database and the fake Stripe.
+``check_consistency`` then compares the database with what the fake
+actually charged.
+"""
+import http.client
+import queue
+import random
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import DatabaseError, connections
+from django.db.models import Count, Q, Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from prompts.benchmarking import server_name, session_cookies, summarize
+from prompts.models import Category, Prompt, PromptPurchase
+
+from .models import CreatorBalance, LedgerEntry, Payment, WebhookEvent
+from .stripe_client import breaker
+from .webhooks import drain
+
+User = get_user_model()
+
+CLIENT_SECRET_RE = re.compile(r'(pi_[A-Za-z0-9]+_secret_[A-Za-z0-9]+)')
+
+
+class ClientTransport:
+    """Requests through the Django test client, in process."""
+
+    def __init__(self):
+        self.server_name = server_name()
+
+    def request(self, method, path, cookies=None, body='', headers=None):
+        client = Client(raise_request_exception=False, SERVER_NAME=self.server_name)
+        if cookies:
+            client.cookies.load(cookies)
+        response = client.generic(method, path, body, content_type='application/json', headers=headers)
+        return response.status_code, response.content.decode()
+
+
+class HttpTransport:
+    """Requests to a running server over one keep-alive connection per thread."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, cookies=None, body='', headers=None):
+        headers = dict(headers or {})
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in cookies.items())
+        if body:
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            conn = getattr(self._local, 'conn', None)
+            if conn is None:
+                conn = self._local.conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.request(method, self.prefix + path, body=body.encode() if body else None, headers=headers)
+                response = conn.getresponse()
+                return response.status, response.read().decode()
+            except (OSError, http.client.HTTPException):
+                # The server may have closed an idle keep-alive connection; reconnect once
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+
+
+@contextmanager
+def use_fake_stripe(server, api_key='sk_test_loadtest'):
+    """Point the ``stripe`` module at a running ``FakeStripeServer``."""
+    old = stripe.api_key, stripe.api_base
+    stripe.api_key, stripe.api_base = api_key, server.url
+    breaker.reset()
+    try:
+        yield
+    finally:
+        stripe.api_key, stripe.api_base = old
+        breaker.reset()
+
+
+class LoadTestData:
+    def __init__(self, creator, prompts, buyers):
+        self.creator = creator
+        self.prompts = prompts
+        self.buyers = buyers
+
+    @property
+    def prompt_ids(self):
+        return [prompt.pk for prompt in self.prompts]
+
+
+def seed_loadtest_data(fake, buyers, prompts, price='9.99'):
+    """
+    A creator with ``prompts`` paid prompts and ``buyers`` buyers.
+
+    Buyers already have a customer in ``fake``, as they would after signup
+    provisioning. Users are bulk-created, so no signup signal reaches Stripe.
+    """
+    run = get_random_string(6, allowed_chars='abcdefghijklmnopqrstuvwxyz0123456789')
+    password = make_password(None)
+    category, _ = Category.objects.get_or_create(name='Load test', defaults={'slug': 'load-test'})
+
+    creator = User.objects.create(
+        username=f'loadtest-{run}-creator', email=f'loadtest-{run}-creator@example.com',
+        password=password, is_creator=True,
+    )
+    prompt_objects = []
+    for i in range(prompts):
+        prompt = Prompt(
+            title=f'Load test prompt {run} {i}',
+            slug=f'loadtest-{run}-{i}',
+            description='Created by payments_loadtest.',
+            content='Load test prompt content.',
+            preview_content='Load test preview.',
+            author=creator,
+            category=category,
+            price_type='paid',
+            price=price,
+            status='published',
+        )
+        prompt.populate_derived_fields()
+        prompt_objects.append(prompt)
+    Prompt.objects.bulk_create(prompt_objects, batch_size=500)
+
+    buyer_objects = []
+    for i in range(buyers):
+        username = f'loadtest-{run}-buyer-{i}'
+        customer = fake.create_customer({'email': f'{username}@example.com', 'name': username})
+        buyer_objects.append(User(
+            username=username, email=f'{username}@example.com', password=password,
+            stripe_customer_id=customer['id'],
+        ))
+    User.objects.bulk_create(buyer_objects, batch_size=500)
+
+    return LoadTestData(
+        creator,
+        list(Prompt.objects.filter(slug__startswith=f'loadtest-{run}-').order_by('pk')),
+        list(User.objects.filter(username__startswith=f'loadtest-{run}-buyer-').order_by('pk')),
+    )
+
+
+def checkout_pairs(data, checkouts, seed=0):
+    """``checkouts`` distinct (buyer, prompt) pairs in random order."""
+    capacity = len(data.buyers) * len(data.prompts)
+    if checkouts > capacity:
+        raise ValueError(f'{checkouts} checkouts need more than {len(data.buyers)} buyers x {len(data.prompts)} prompts')
+    pairs = [
+        (data.buyers[n % len(data.buyers)], data.prompts[n // len(data.buyers)])
+        for n in range(checkouts)
+    ]
+    random.Random(seed).shuffle(pairs)
+    return pairs
+
+
+class PaymentsLoadTest:
+    def __init__(self, transport, fake, concurrency=32, redirect_rate=1.0, seed=0):
+        self.transport = transport
+        self.fake = fake
+        self.concurrency = concurrency
+        self.redirect_rate = redirect_rate
+        self.seed = seed
+        placeholder = 987654321
+        self.success_re = re.compile(
+            re.escape(reverse('payments:payment_success', kwargs={'payment_id': placeholder})).replace(
+                str(placeholder), r'(\d+)'
+            )
+        )
+        self.webhook_path = reverse('payments:stripe_webhook')
+
+    def deliver_webhook(self, payload, signature):
+        """``FakeStripe.deliver`` callback: POST the event to ``stripe_webhook``."""
+        try:
+            status, _ = self.transport.request(
+                'POST', self.webhook_path, body=payload, headers={'Stripe-Signature': signature}
+            )
+        finally:
+            # Delivery threads have no request cycle to close their connections
+            connections.close_all()
+        return status
+
+    def _timed(self, stats, step, method, path, cookies):
+        started = time.perf_counter()
+        status, body = self.transport.request(method, path, cookies=cookies)
+        latencies, statuses = stats.setdefault(step, ([], Counter()))
+        latencies.append(time.perf_counter() - started)
+        statuses[status] += 1
+        return status, body
+
+    def checkout(self, buyer, prompt, cookies, stats, rng):
+        """Run one checkout; returns True once the buyer has paid."""
+        path = reverse('payments:create_payment', kwargs={'prompt_id': prompt.pk})
+        status, body = self._timed(stats, 'checkout', 'GET', path, cookies)
+        match = CLIENT_SECRET_RE.search(body) if status == 200 else None
+        intent = self.fake.find_payment_intent(match.group(1)) if match else None
+        if intent is None:
+            return False
+
+        self.fake.confirm_payment_intent(intent['id'])
+        if rng.random() < self.redirect_rate:
+            success = self.success_re.search(body)
+            if success:
+                self._timed(stats, 'success', 'GET', success.group(0), cookies)
+        return True
+
+    def run(self, pairs, cookies_by_user):
+        work = queue.SimpleQueue()
+        for pair in pairs:
+            work.put(pair)
+        lock = threading.Lock()
+        stats = {}
+        totals = Counter()
+
+        def worker(index):
+            rng = random.Random(f'{self.seed}-{index}')
+            local_stats = {}
+            local_totals = Counter()
+            try:
+                while True:
+                    try:
+                        buyer, prompt = work.get_nowait()
+                    except queue.Empty:
+                        break
+                    try:
+                        paid = self.checkout(buyer, prompt, cookies_by_user[buyer.pk], local_stats, rng)
+                    except (OSError, http.client.HTTPException):
+                        paid = False
+                        local_totals['transport_errors'] += 1
+                    local_totals['paid' if paid else 'abandoned'] += 1
+            finally:
+                # Worker threads own their connections
+                connections.close_all()
+                with lock:
+                    totals.update(local_totals)
+                    for step, (latencies, statuses) in local_stats.items():
+                        merged = stats.setdefault(step, ([], Counter()))
+                        merged[0].extend(latencies)
+                        merged[1].update(statuses)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for index in range(self.concurrency):
+                executor.submit(worker, index)
+        elapsed = time.perf_counter() - started
+
+        return {
+            'checkouts': len(pairs),
+            'concurrency': self.concurrency,
+            'elapsed_seconds': round(elapsed, 3),
+            'paid': totals['paid'],
+            'abandoned': totals['abandoned'],
+            'transport_errors': totals['transport_errors'],
+            'paid_checkouts_per_second': round(totals['paid'] / elapsed, 2) if elapsed else None,
+            'steps': {
+                step: dict(summarize(latencies, elapsed), statuses={str(code): count for code, count in sorted(statuses.items())})
+                for step, (latencies, statuses) in stats.items()
+            },
+        }
+
+    def settle(self, since, timeout=60):
+        """
+        Wait for webhook delivery, then process stored events until none is left.
+
+        Events are drained from this process whatever the server does, so the
+        result doesn't depend on its ``WEBHOOK_AUTO_PROCESS`` setting. Returns
+        the webhook delivery summary.
+        """
+        started = time.perf_counter()
+        self.fake.wait_for_deliveries()
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                drain()
+            except DatabaseError:
+                # Lost a lock race with the app's own background drain; poll again
+                pass
+            waiting = WebhookEvent.objects.filter(received_at__gte=since).exclude(
+                status__in=['processed', 'failed']
+            ).count()
+            if not waiting or time.monotonic() >= deadline:
+                break
+            time.sleep(0.5)
+
+        deliveries = self.fake.deliveries
+        attempts = Counter(attempt for _, attempt, _, _ in deliveries)
+        return dict(
+            summarize([seconds for _, _, _, seconds in deliveries]),
+            events=len(self.fake.events),
+            statuses={str(code): count for code, count in sorted(Counter(status for _, _, status, _ in deliveries).items())},
+            retries=sum(count for attempt, count in attempts.items() if attempt > 1),
+            unsettled_events=waiting,
+            settle_seconds=round(time.perf_counter() - started, 3),
+        )
+
+
+def check_consistency(fake, prompt_ids, since):
+    """Compare the database with what ``fake`` charged; returns ``{check: [problems]}``."""
+    succeeded = {
+        intent['id'] for intent in fake.payment_intents.values() if intent['status'] == 'succeeded'
+    }
+    payments = dict(
+        Payment.objects.filter(prompt_id__in=prompt_ids).values_list('stripe_payment_intent_id', 'status')
+    )
+    purchases = dict(
+        PromptPurchase.objects.filter(prompt_id__in=prompt_ids, payment_status='completed')
+        .values('stripe_payment_intent_id').annotate(total=Count('id'))
+        .values_list('stripe_payment_intent_id', 'total')
+    )
+    counters = Prompt.objects.filter(pk__in=prompt_ids).annotate(
+        completed=Count('promptpurchase_set', filter=Q(promptpurchase_set__payment_status='completed'))
+    ).values_list('slug', 'purchases', 'completed')
+    events = dict(WebhookEvent.objects.filter(received_at__gte=since).values_list('stripe_event_id', 'status'))
+    booked = dict(
+        LedgerEntry.objects.filter(purchase__prompt_id__in=prompt_ids, entry_type='sale')
+        .values('purchase__stripe_payment_intent_id').annotate(total=Count('id'))
+        .values_list('purchase__stripe_payment_intent_id', 'total')
+    )
+    balances = dict(CreatorBalance.objects.values_list('creator_id', 'net_total'))
+    ledger_totals = LedgerEntry.objects.values('creator_id').annotate(net_sum=Sum('net')).values_list(
+        'creator_id', 'net_sum'
+    )
+
+    return {
+        # Charged by Stripe but not completed here
+        'payment_not_completed': sorted(pi for pi in succeeded if payments.get(pi) != 'completed'),
+        'purchase_missing': sorted(pi for pi in succeeded if not purchases.get(pi)),
+        'purchase_duplicated': sorted(f'{pi} x{total}' for pi, total in purchases.items() if total > 1),
+        # Completed here without a successful charge
+        'completed_without_charge': sorted(
+            pi for pi, status in payments.items() if status == 'completed' and pi not in succeeded
+        ),
+        'purchase_counter_drift': [
+            f'{slug}: purchases={stored}, completed purchases={completed}'
+            for slug, stored, completed in counters if stored != completed
+        ],
+        # Every purchase booked once, and balances matching the ledger
+        'ledger_entry_missing': sorted(pi for pi in purchases if booked.get(pi) != 1),
+        'balance_drift': [
+            f'creator {creator_id}: balance={balances.get(creator_id)}, ledger={total}'
+            # SQLite sums decimals as floats
+            for creator_id, total in ledger_totals if balances.get(creator_id) != total.quantize(Decimal('0.01'))
+        ],
+        'webhook_not_processed': sorted(
+            f'{event["id"]} ({events.get(event["id"], "missing")})'
+            for event in fake.events if events.get(event['id']) != 'processed'
+        ),
+    }
+
+
+def login_buyers(buyers):
+    """Session cookies for each buyer, keyed by user ID."""
+    return {buyer.pk: session_cookies(buyer) for buyer in buyers}
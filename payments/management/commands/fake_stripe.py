@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.urls import reverse
+
+from payments.fake_stripe import FakeStripe, FakeStripeServer
+from payments.loadtest import HttpTransport
+
+
+class Command(BaseCommand):
+    help = 'Serve a local fake Stripe API for development (set STRIPE_API_BASE to its URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1', help='Interface to listen on')
+        parser.add_argument('--port', type=int, default=12111, help='Port to listen on')
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Seconds added to every API request'
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0.0,
+            help='Extra random latency of up to this many seconds'
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of API requests that fail with a 500'
+        )
+        parser.add_argument(
+            '--webhook-url',
+            type=str,
+            default='',
+            help='Base URL of the app; confirmed PaymentIntents send signed webhooks to its stripe_webhook view'
+        )
+        parser.add_argument(
+            '--duplicate-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of webhook events delivered twice'
+        )
+
+    def handle(self, *args, **options):
+        fake = FakeStripe(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            failure_rate=options['failure_rate'],
+            duplicate_rate=options['duplicate_rate'],
+            webhook_secret=settings.STRIPE_WEBHOOK_SECRET,
+        )
+        if options['webhook_url']:
+            transport = HttpTransport(options['webhook_url'])
+            webhook_path = reverse('payments:stripe_webhook')
+
+            def deliver(payload, signature):
+                status, _ = transport.request('POST', webhook_path, body=payload, headers={'Stripe-Signature': signature})
+                return status
+
+            fake.deliver = deliver
+            fake.start_delivery()
+
+        server = FakeStripeServer(fake, host=options['host'], port=options['port'])
+        self.stdout.write(f'Fake Stripe listening on {server.url} (STRIPE_API_BASE={server.url}); Ctrl-C to stop')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            fake.stop_delivery()
@@ -0,0 +1,212 @@
+import json
+import logging
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from payments.fake_stripe import FakeStripe, FakeStripeServer
+from payments.loadtest import (
+    ClientTransport, HttpTransport, PaymentsLoadTest, check_consistency, checkout_pairs, login_buyers,
+    seed_loadtest_data, use_fake_stripe,
+)
+from prompts.benchmarking import scratch_database
+
+
+class Command(BaseCommand):
+    help = 'Drive concurrent checkouts and webhooks against a fake Stripe and check payment consistency'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checkouts',
+            type=int,
+            default=1000,
+            help='Number of checkouts (each a distinct buyer and prompt pair)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Concurrent simulated buyers'
+        )
+        parser.add_argument(
+            '--prompts',
+            type=int,
+            default=20,
+            help='Paid prompts to spread the checkouts over'
+        )
+        parser.add_argument(
+            '--redirect-rate',
+            type=float,
+            default=1.0,
+            help='Fraction of buyers who return to payment_success (the rest rely on the webhook)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for checkout order, redirects and fault injection'
+        )
+
+        # Fake Stripe
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.05,
+            help='Seconds the fake Stripe takes per API request'
+        )
+        parser.add_argument(
+            '--jitter',
+            type=float,
+            default=0.0,
+            help='Extra random latency of up to this many seconds'
+        )
+        parser.add_argument(
+            '--failure-rate',
+            type=float,
+            default=0.0,
+            help='Fraction of Stripe API requests that fail with a 500'
+        )
+        parser.add_argument(
+            '--duplicate-rate',
+            type=float,
+            default=0.1,
+            help='Fraction of webhook events delivered twice'
+        )
+        parser.add_argument(
+            '--webhook-workers',
+            type=int,
+            default=8,
+            help='Concurrent webhook deliveries'
+        )
+        parser.add_argument(
+            '--webhook-secret',
+            type=str,
+            default='whsec_loadtest',
+            help='Webhook signing secret (must match the server\'s STRIPE_WEBHOOK_SECRET with --url)'
+        )
+        parser.add_argument(
+            '--stripe-port',
+            type=int,
+            default=12111,
+            help='Port for the fake Stripe with --url (in-process runs pick a free port)'
+        )
+
+        # Target
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='',
+            help='Base URL of a running server using this database; data is seeded into it'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=60.0,
+            help='Seconds to wait for webhook events to be processed after the run'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='',
+            help='Write JSON results to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        if options['url']:
+            report = self.run(options, HttpTransport(options['url']), port=options['stripe_port'])
+        else:
+            # Failed requests are counted per step; their tracebacks only show with -v 2
+            request_logger = logging.getLogger('django.request')
+            level = request_logger.level
+            if options['verbosity'] < 2:
+                request_logger.setLevel(logging.CRITICAL)
+            # In process: a scratch database, and this process's settings pointed at the fake
+            try:
+                with scratch_database('payments-loadtest'), override_settings(STRIPE_WEBHOOK_SECRET=options['webhook_secret']):
+                    report = self.run(options, ClientTransport(), port=0)
+            finally:
+                request_logger.setLevel(level)
+
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+        else:
+            self.stdout.write(payload)
+
+        violations = {check: found for check, found in report['violations'].items() if found['count']}
+        if not violations:
+            self.stderr.write(self.style.SUCCESS('No consistency violations'))
+            return
+        for check, found in violations.items():
+            self.stderr.write(self.style.WARNING(f'{check}: {found["count"]} (e.g. {found["examples"][0]})'))
+        raise CommandError(f'{sum(found["count"] for found in violations.values())} consistency violation(s)')
+
+    def run(self, options, transport, port):
+        fake = FakeStripe(
+            latency=options['latency'],
+            jitter=options['jitter'],
+            failure_rate=options['failure_rate'],
+            duplicate_rate=options['duplicate_rate'],
+            webhook_secret=options['webhook_secret'],
+            delivery_workers=options['webhook_workers'],
+            seed=options['seed'],
+        )
+        server = FakeStripeServer(fake, port=port).start()
+        if options['url']:
+            self.stderr.write(
+                f'Fake Stripe at {server.url}; the server under test needs STRIPE_API_BASE={server.url}, '
+                f'STRIPE_SECRET_KEY=sk_test_loadtest and STRIPE_WEBHOOK_SECRET={options["webhook_secret"]}'
+            )
+
+        try:
+            with use_fake_stripe(server):
+                buyers = math.ceil(options['checkouts'] / options['prompts'])
+                self.stderr.write(f'Seeding {options["prompts"]} prompts and {buyers} buyers...')
+                data = seed_loadtest_data(fake, buyers=buyers, prompts=options['prompts'])
+                pairs = checkout_pairs(data, options['checkouts'], seed=options['seed'])
+                cookies = login_buyers(data.buyers)
+
+                loadtest = PaymentsLoadTest(
+                    transport, fake,
+                    concurrency=options['concurrency'],
+                    redirect_rate=options['redirect_rate'],
+                    seed=options['seed'],
+                )
+                fake.deliver = loadtest.deliver_webhook
+                fake.start_delivery()
+                since = timezone.now()
+                self.stderr.write(f'Running {len(pairs)} checkouts with concurrency {options["concurrency"]}...')
+                results = loadtest.run(pairs, cookies)
+                results['webhooks'] = loadtest.settle(since, timeout=options['timeout'])
+                fake.stop_delivery()
+                violations = check_consistency(fake, data.prompt_ids, since)
+        finally:
+            server.stop()
+
+        results['stripe'] = {
+            'requests': fake.requests,
+            'injected_failures': fake.injected_failures,
+            'payment_intents': len(fake.payment_intents),
+            'succeeded': sum(1 for intent in fake.payment_intents.values() if intent['status'] == 'succeeded'),
+        }
+        return {
+            'vendor': connection.vendor,
+            'target': options['url'] or 'in-process',
+            'options': {
+                key: options[key]
+                for key in (
+                    'checkouts', 'concurrency', 'prompts', 'redirect_rate', 'latency', 'jitter',
+                    'failure_rate', 'duplicate_rate', 'webhook_workers', 'seed',
+                )
+            },
+            'results': results,
+            'violations': {
+                check: {'count': len(problems), 'examples': problems[:10]}
+                for check, problems in violations.items()
+            },
+        }
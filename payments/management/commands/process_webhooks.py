@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.models import WebhookEvent
+from payments.webhooks import drain
+
+
+class Command(BaseCommand):
+    help = 'Process stored Stripe webhook events'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Events claimed per batch (defaults to WEBHOOK_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling for new events instead of exiting when none are due'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep between polls when idle (with --loop)'
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue events that exhausted their retries again before processing'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            requeued = WebhookEvent.objects.filter(status='failed').update(
+                status='pending', attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'Requeued {requeued} failed events')
+
+        while True:
+            processed = drain(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} events')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('Done'))
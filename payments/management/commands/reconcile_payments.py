@@ -0,0 +1,104 @@
+import json
+import sys
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from payments.models import ReconciliationCheckpoint
+from payments.reconciliation import Reconciler
+
+
+class Command(BaseCommand):
+    help = 'Reconcile pending and recent payments against Stripe PaymentIntents and report discrepancies'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Payments per batch (defaults to RECONCILE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            default=None,
+            help='Stop after this many batches; the next run continues from the checkpoint'
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=None,
+            help='Skip payments younger than this many seconds (defaults to RECONCILE_MIN_AGE)'
+        )
+        parser.add_argument(
+            '--abandon-after',
+            type=int,
+            default=None,
+            help='Close pending payments older than this many seconds whose intent was never paid '
+                 '(defaults to RECONCILE_ABANDON_AFTER)'
+        )
+        parser.add_argument(
+            '--window',
+            type=int,
+            default=3600,
+            help='Payments further apart than this many seconds get separate PaymentIntent listings'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default='default',
+            help='Name of the stored checkpoint to resume from'
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Forget the checkpoint and check every payment again'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without updating payments or the checkpoint'
+        )
+        parser.add_argument(
+            '--report',
+            type=str,
+            default='',
+            help='Write discrepancies to this file as JSON lines (default: stderr)'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset'] and not options['dry_run']:
+            ReconciliationCheckpoint.objects.filter(name=options['checkpoint']).delete()
+
+        report = open(options['report'], 'w') if options['report'] else sys.stderr
+
+        def on_discrepancy(problem):
+            report.write(json.dumps(problem) + '\n')
+
+        def seconds(value):
+            return timedelta(seconds=value) if value is not None else None
+
+        reconciler = Reconciler(
+            batch_size=options['batch_size'],
+            min_age=seconds(options['min_age']),
+            abandon_after=seconds(options['abandon_after']),
+            window=timedelta(seconds=options['window']),
+            max_batches=options['max_batches'],
+            checkpoint=options['checkpoint'],
+            dry_run=options['dry_run'],
+            on_discrepancy=on_discrepancy,
+        )
+        try:
+            stats = reconciler.run()
+        except Exception as e:
+            raise CommandError(f'Reconciliation stopped after {reconciler.stats["checked"]} payments: {e}')
+        finally:
+            if options['report']:
+                report.close()
+
+        self.stdout.write(json.dumps(dict(sorted(stats.items())), indent=2))
+        discrepancies = sum(count for key, count in stats.items() if key.startswith('discrepancy_'))
+        if discrepancies:
+            self.stderr.write(self.style.WARNING(f'{discrepancies} discrepancies need attention'))
+        else:
+            self.stderr.write(self.style.SUCCESS('No discrepancies'))
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from payments.ledger import backfill, backfill_preview, pending_totals, settle
+
+
+class Command(BaseCommand):
+    help = 'Roll unsettled creator ledger entries into payouts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hold-days',
+            type=int,
+            default=None,
+            help='Only settle entries older than this many days (defaults to PAYOUT_HOLD_DAYS)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what each creator would be paid, and what --backfill would book, without writing anything'
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='First book ledger entries for purchases made before the ledger existed'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Purchases per batch when backfilling'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill'] and options['dry_run']:
+            entries, net = backfill_preview()
+            # Backfilled entries are dated now, so they wait out the hold like new sales
+            self.stdout.write(
+                f'Would book {entries} ledger entries ({net} net to creators) for earlier purchases; '
+                f'they are not in the totals below'
+            )
+        elif options['backfill']:
+            booked = backfill(batch_size=options['batch_size'])
+            self.stdout.write(f'Booked {booked} ledger entries for earlier purchases')
+
+        hold_days = options['hold_days'] if options['hold_days'] is not None else settings.PAYOUT_HOLD_DAYS
+        cutoff = timezone.now() - timedelta(days=hold_days)
+
+        if options['dry_run']:
+            totals = pending_totals(cutoff)
+            owed = [row for row in totals if row['net'] > 0]
+            for row in owed:
+                self.stdout.write(f'Creator {row["creator_id"]}: {row["net"]} from {row["entries"]} entries')
+            total = sum((row['net'] for row in owed), 0)
+            self.stdout.write(self.style.SUCCESS(f'Would pay {total} to {len(owed)} creators'))
+            return
+
+        settlement = settle(cutoff)
+        if settlement is None:
+            self.stdout.write('Nothing to settle')
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Settlement #{settlement.pk}: {settlement.net} to {settlement.creator_count} creators '
+            f'from {settlement.entry_count} entries (platform fee {settlement.platform_fee})'
+        ))
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -31,6 +32,14 @@ class Payment(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # reconcile_payments walks payments in (created_at, id) order, and
+            # pending ones on their own
+            models.Index(fields=['created_at', 'id'], name='payment_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+            # A buyer's payment history, newest first, a page at a time
+            models.Index(fields=['user', 'created_at', 'id'], name='payment_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.prompt.title} - ${self.amount}"
@@ -49,4 +58,181 @@ class StripeAccount(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self):
-        return f"{self.user.username} - {self.stripe_account_id}" 
\ No newline at end of file
+        return f"{self.user.username} - {self.stripe_account_id}" 
+
+class WebhookEvent(models.Model):
+    """A verified Stripe event, stored on receipt and processed asynchronously."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Stripe's event ID; retried deliveries of the same event are ignored
+    stripe_event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    
+    # Retry bookkeeping
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    
+    # Timestamps
+    stripe_created_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['received_at']
+        indexes = [
+            # Consumers claim due events in arrival order
+            models.Index(fields=['status', 'next_attempt_at'], name='webhook_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.event_type} {self.stripe_event_id} ({self.status})"
+
+
+class ReconciliationCheckpoint(models.Model):
+    """How far ``reconcile_payments`` has checked payments, in (created_at, id) order."""
+    name = models.CharField(max_length=50, unique=True)
+    last_created_at = models.DateTimeField(null=True, blank=True)
+    last_payment_id = models.BigIntegerField(default=0)
+    
+    # Totals for the run that last moved the checkpoint
+    last_run_stats = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.last_created_at} #{self.last_payment_id}"
+
+
+class LedgerEntry(models.Model):
+    """
+    One line of a creator's earnings ledger.
+
+    Entries are append-only: amounts never change once written. A refund is
+    a new entry with negated amounts. The only column ever updated is
+    ``settlement``, set once when a settlement run claims the entry.
+    """
+    ENTRY_TYPES = [
+        ('sale', 'Sale'),
+        ('refund', 'Refund'),
+    ]
+    
+    creator = models.ForeignKey(User, on_delete=models.PROTECT, related_name='ledger_entries')
+    # Kept when the prompt (and with it the purchase) is deleted
+    purchase = models.ForeignKey(
+        'prompts.PromptPurchase', on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    
+    # gross = platform_fee + net; all negative for refunds
+    gross = models.DecimalField(max_digits=10, decimal_places=2)
+    platform_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    net = models.DecimalField(max_digits=10, decimal_places=2)
+    currency = models.CharField(max_length=3, default='USD')
+    
+    settlement = models.ForeignKey(
+        'Settlement', on_delete=models.PROTECT, null=True, blank=True, related_name='entries'
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name_plural = 'Ledger entries'
+        constraints = [
+            # A purchase is booked (and refunded) at most once
+            models.UniqueConstraint(fields=['purchase', 'entry_type'], name='unique_ledger_purchase_entry'),
+        ]
+        indexes = [
+            # Settlement runs claim unsettled entries by age
+            models.Index(
+                fields=['created_at'], name='ledger_unsettled_idx', condition=models.Q(settlement__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_entry_type_display()} {self.net} for {self.creator_id}"
+    
+    def save(self, *args, **kwargs):
+        if self.pk and not kwargs.get('force_insert'):
+            raise ValueError('Ledger entries are append-only')
+        super().save(*args, **kwargs)
+
+
+class Settlement(models.Model):
+    """A batch run that rolled unsettled ledger entries up into payouts."""
+    entry_count = models.PositiveIntegerField(default=0)
+    creator_count = models.PositiveIntegerField(default=0)
+    gross = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    platform_fee = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Entries created before this moment were eligible
+    cutoff = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"Settlement #{self.pk}: {self.net} to {self.creator_count} creators"
+
+
+class Payout(models.Model):
+    """What a settlement owes one creator."""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+    ]
+    
+    settlement = models.ForeignKey(Settlement, on_delete=models.PROTECT, related_name='payouts')
+    creator = models.ForeignKey(User, on_delete=models.PROTECT, related_name='payouts')
+    entry_count = models.PositiveIntegerField()
+    gross = models.DecimalField(max_digits=12, decimal_places=2)
+    platform_fee = models.DecimalField(max_digits=12, decimal_places=2)
+    net = models.DecimalField(max_digits=12, decimal_places=2)
+    currency = models.CharField(max_length=3, default='USD')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    stripe_transfer_id = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['settlement', 'creator'], name='unique_payout_per_settlement'),
+        ]
+        indexes = [
+            models.Index(fields=['creator', 'created_at'], name='payout_creator_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Payout of {self.net} to {self.creator_id} ({self.status})"
+
+
+class CreatorBalance(models.Model):
+    """
+    Running totals of a creator's ledger, kept in step with every entry and
+    settlement so balances are read from one row.
+    """
+    creator = models.OneToOneField(User, on_delete=models.CASCADE, related_name='balance')
+    gross_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    fee_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    net_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Net earnings not yet in a payout, and the sum of payouts so far
+    unsettled = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    settled_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    entry_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.creator_id}: {self.unsettled} unsettled"
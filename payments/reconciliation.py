@@ -0,0 +1,232 @@
+"""
+Batch reconciliation of payments against Stripe.
+
+``Reconciler.run`` makes two passes over ``Payment``, both keyset-paginated
+in ``(created_at, id)`` order in batches of ``batch_size``:
+
+* pending payments older than ``min_age``: the ones that drift, because a
+  webhook never arrived or the buyer abandoned checkout;
+* settled payments created after the stored ``ReconciliationCheckpoint``
+  (and older than ``min_age``), to confirm they still agree with Stripe.
+  The checkpoint moves after every batch, so runs are incremental and an
+  interrupted run resumes where it stopped.
+
+Each batch's PaymentIntents are fetched with paginated
+``PaymentIntent.list`` calls over the batch's creation window (split where
+payments are more than ``window`` apart), not one request per payment.
+Succeeded intents are completed through ``finalize_purchase``; canceled and
+abandoned ones are closed with one UPDATE per status. Anything that can't be
+fixed safely is passed to ``on_discrepancy`` for the report.
+"""
+import logging
+from collections import Counter
+from datetime import timedelta
+
+import stripe
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from prompts.models import PromptPurchase
+from .models import Payment, ReconciliationCheckpoint
+from .services import finalize_purchase
+from .stripe_client import stripe_call
+
+logger = logging.getLogger(__name__)
+
+# Stripe creates the intent just before checkout saves the Payment, and clocks differ
+CLOCK_SKEW = timedelta(minutes=5)
+
+
+def list_payment_intents(created_gte, created_lte, page_size=100):
+    """Yield the PaymentIntents created between two Unix times, a page per request."""
+    params = {'created': {'gte': created_gte, 'lte': created_lte}, 'limit': page_size}
+    while True:
+        with stripe_call('payment_intent.list'):
+            page = stripe.PaymentIntent.list(**params)
+        yield from page.data
+        if not page.has_more or not page.data:
+            return
+        params['starting_after'] = page.data[-1].id
+
+
+def discrepancy(kind, payment, intent=None, **extra):
+    return {
+        'kind': kind,
+        'payment_id': payment.pk,
+        'payment_intent': payment.stripe_payment_intent_id,
+        'payment_status': payment.status,
+        'intent_status': intent.status if intent is not None else None,
+        'created_at': payment.created_at.isoformat(),
+        **extra,
+    }
+
+
+class Reconciler:
+    def __init__(self, batch_size=None, min_age=None, abandon_after=None, window=timedelta(hours=1),
+                 max_batches=None, checkpoint='default', dry_run=False, on_discrepancy=None):
+        self.batch_size = batch_size or settings.RECONCILE_BATCH_SIZE
+        self.min_age = min_age if min_age is not None else timedelta(seconds=settings.RECONCILE_MIN_AGE)
+        self.abandon_after = (
+            abandon_after if abandon_after is not None
+            else timedelta(seconds=settings.RECONCILE_ABANDON_AFTER)
+        )
+        self.window = window
+        self.max_batches = max_batches
+        self.checkpoint_name = checkpoint
+        self.dry_run = dry_run
+        self.on_discrepancy = on_discrepancy or (lambda problem: None)
+        self.stats = Counter()
+
+    def run(self, now=None):
+        """Reconcile both passes; returns the totals."""
+        now = now or timezone.now()
+        self.cutoff = now - self.min_age
+        self.abandon_cutoff = now - self.abandon_after
+
+        self.reconcile_pending()
+        self.reconcile_recent()
+        return self.stats
+
+    def _budget_left(self):
+        return self.max_batches is None or self.stats['batches'] < self.max_batches
+
+    def batches(self, queryset, after=None):
+        """Keyset pagination over ``queryset`` in (created_at, id) order, from ``after``."""
+        while self._budget_left():
+            page = queryset
+            if after is not None:
+                page = page.filter(Q(created_at__gt=after[0]) | Q(created_at=after[0], pk__gt=after[1]))
+            batch = list(page.order_by('created_at', 'pk')[:self.batch_size])
+            if not batch:
+                return
+            self.stats['batches'] += 1
+            yield batch
+            after = (batch[-1].created_at, batch[-1].pk)
+
+    def reconcile_pending(self):
+        pending = Payment.objects.filter(status='pending', created_at__lte=self.cutoff)
+        for batch in self.batches(pending):
+            self.reconcile_batch(batch)
+
+    def reconcile_recent(self):
+        checkpoint, _ = ReconciliationCheckpoint.objects.get_or_create(name=self.checkpoint_name)
+        after = None
+        if checkpoint.last_created_at is not None:
+            after = (checkpoint.last_created_at, checkpoint.last_payment_id)
+
+        # Pending payments are the first pass's job
+        settled = Payment.objects.filter(created_at__lte=self.cutoff).exclude(status='pending')
+        for batch in self.batches(settled, after=after):
+            self.reconcile_batch(batch)
+            if not self.dry_run:
+                checkpoint.last_created_at = batch[-1].created_at
+                checkpoint.last_payment_id = batch[-1].pk
+                checkpoint.last_run_stats = dict(self.stats)
+                checkpoint.save()
+        self.stats['checkpoint_payment_id'] = checkpoint.last_payment_id
+
+    def fetch_intents(self, payments):
+        """The batch's PaymentIntents by ID, listed per creation window."""
+        wanted = {payment.stripe_payment_intent_id for payment in payments}
+        windows = []
+        for payment in payments:
+            if windows and payment.created_at - windows[-1][1] <= self.window:
+                windows[-1][1] = payment.created_at
+            else:
+                windows.append([payment.created_at, payment.created_at])
+
+        intents = {}
+        for start, end in windows:
+            self.stats['stripe_list_calls'] += 1
+            for intent in list_payment_intents(
+                int((start - CLOCK_SKEW).timestamp()), int((end + CLOCK_SKEW).timestamp()) + 1
+            ):
+                if intent.id in wanted:
+                    intents[intent.id] = intent
+
+        # Stragglers outside their window (or not Stripe's at all) are looked up one by one
+        for intent_id in wanted - intents.keys():
+            self.stats['stripe_retrieve_calls'] += 1
+            try:
+                with stripe_call('payment_intent.retrieve'):
+                    intents[intent_id] = stripe.PaymentIntent.retrieve(intent_id)
+            except stripe.error.InvalidRequestError:
+                pass
+        return intents
+
+    def reconcile_batch(self, payments):
+        intents = self.fetch_intents(payments)
+        to_complete = []
+        to_close = {'cancelled': [], 'failed': []}
+        completed = []
+
+        for payment in payments:
+            self.stats['checked'] += 1
+            intent = intents.get(payment.stripe_payment_intent_id)
+            if intent is None:
+                self.report(discrepancy('intent_not_found', payment))
+                continue
+            if intent.amount != round(payment.amount * 100) or intent.currency.lower() != payment.currency.lower():
+                self.report(discrepancy(
+                    'amount_mismatch', payment, intent,
+                    payment_amount=str(payment.amount), intent_amount=intent.amount, intent_currency=intent.currency,
+                ))
+                continue
+
+            if intent.status == 'succeeded':
+                if payment.status == 'completed':
+                    completed.append(payment)
+                else:
+                    to_complete.append(payment)
+            elif payment.status == 'completed':
+                # Never undo a purchase automatically; someone has to look at it
+                self.report(discrepancy('completed_without_charge', payment, intent))
+            elif payment.status != 'pending':
+                continue
+            elif intent.status == 'canceled':
+                to_close['cancelled'].append(payment.pk)
+            elif intent.status == 'requires_payment_method' and payment.created_at <= self.abandon_cutoff:
+                # Checkout abandoned, or the last attempt was declined and never retried
+                to_close['failed' if intent.get('last_payment_error') else 'cancelled'].append(payment.pk)
+
+        self.check_purchases(completed)
+        self.complete(to_complete)
+        for status, ids in to_close.items():
+            self.close(ids, status)
+
+    def check_purchases(self, payments):
+        """Report completed payments with no purchase recorded."""
+        if not payments:
+            return
+        recorded = set(
+            PromptPurchase.objects.filter(
+                stripe_payment_intent_id__in=[payment.stripe_payment_intent_id for payment in payments]
+            ).values_list('stripe_payment_intent_id', flat=True)
+        )
+        for payment in payments:
+            if payment.stripe_payment_intent_id not in recorded:
+                self.report(discrepancy('purchase_missing', payment))
+
+    def complete(self, payments):
+        for payment in payments:
+            if self.dry_run:
+                self.stats['would_complete'] += 1
+            elif finalize_purchase(payment.stripe_payment_intent_id):
+                self.stats['completed'] += 1
+                logger.info('Reconciliation completed payment %s (%s)', payment.pk, payment.stripe_payment_intent_id)
+
+    def close(self, ids, status):
+        if not ids:
+            return
+        if self.dry_run:
+            self.stats[f'would_mark_{status}'] += len(ids)
+            return
+        # Still conditional: a webhook may have completed some of these meanwhile
+        self.stats[f'marked_{status}'] += Payment.objects.filter(pk__in=ids, status='pending').update(
+            status=status, updated_at=timezone.now()
+        )
+
+    def report(self, problem):
+        self.stats[f'discrepancy_{problem["kind"]}'] += 1
+        self.on_discrepancy(problem)
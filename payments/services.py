@@ -0,0 +1,49 @@
+"""
+Purchase finalization.
+
+A payment is completed both by the buyer's redirect to ``payment_success``
+and by the ``payment_intent.succeeded`` webhook, often at the same moment.
+``finalize_purchase`` is the only code that completes one: a conditional
+UPDATE moves the payment out of its open states, so exactly one caller wins
+and the others return after that single statement. The winner records the
+purchase and bumps ``Prompt.purchases`` in the same transaction. The unique
+constraint on ``PromptPurchase.stripe_payment_intent_id`` backs this up in
+the database.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from prompts.models import PromptPurchase
+
+from .models import Payment
+
+# A failed or cancelled checkout can still be paid later with the same PaymentIntent
+FINALIZABLE_STATUSES = ('pending', 'failed', 'cancelled')
+
+
+def finalize_purchase(payment_intent_id):
+    """
+    Complete the payment for ``payment_intent_id`` and record the purchase.
+
+    Returns True if this call completed it, False if it was already
+    completed (or no payment uses that PaymentIntent).
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        claimed = Payment.objects.filter(
+            stripe_payment_intent_id=payment_intent_id,
+            status__in=FINALIZABLE_STATUSES,
+        ).update(status='completed', completed_at=now, updated_at=now)
+        if not claimed:
+            return False
+
+        payment = Payment.objects.select_related('prompt').get(stripe_payment_intent_id=payment_intent_id)
+        # Saving a completed purchase bumps Prompt.purchases with an atomic UPDATE
+        PromptPurchase.objects.create(
+            prompt=payment.prompt,
+            user_id=payment.user_id,
+            amount=payment.amount,
+            payment_status='completed',
+            stripe_payment_intent_id=payment_intent_id,
+        )
+    return True
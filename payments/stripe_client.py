@@ -0,0 +1,136 @@
+"""
+Stripe API client setup and call wrapper.
+
+``configure`` (run from ``PaymentsConfig.ready``) routes every Stripe request
+through one pooled, keep-alive ``requests`` session, so API calls reuse open
+connections instead of paying a TLS handshake each time, and bounds them with
+``STRIPE_CONNECT_TIMEOUT``/``STRIPE_READ_TIMEOUT``. ``STRIPE_API_BASE`` points
+the client at another server, e.g. a local stripe-mock
+(``http://localhost:12111``) in development and load tests.
+
+Wrap calls in ``stripe_call``: it records metrics and feeds a circuit breaker.
+After ``STRIPE_CIRCUIT_FAILURE_THRESHOLD`` consecutive connection, server or
+rate-limit errors the circuit opens and calls fail at once with
+``CircuitOpenError`` for ``STRIPE_CIRCUIT_RESET_TIMEOUT`` seconds; then a
+single trial call decides whether it closes again.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+import stripe
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from prompt_platform.metrics import STRIPE_API_ERRORS, STRIPE_API_LATENCY
+
+# Errors that say Stripe (or the way to it) is unhealthy, not that the request was bad
+TRANSIENT_ERRORS = (stripe.error.APIConnectionError, stripe.error.APIError, stripe.error.RateLimitError)
+
+
+class CircuitOpenError(stripe.error.APIConnectionError):
+    """Raised instead of calling Stripe while the circuit is open."""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return 'open'
+        return 'half-open'
+
+    def before_call(self):
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Stripe is temporarily unavailable. Please try again shortly.')
+            # Half-open: let this one call test the water
+            self.trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            # A failed trial reopens the circuit for another full timeout
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.trial_running = False
+
+    def reset(self):
+        self.record_success()
+
+
+breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30)
+
+
+def build_http_client():
+    """A Stripe HTTP client sharing one pooled keep-alive session across threads."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.STRIPE_HTTP_POOL_SIZE)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return stripe.http_client.RequestsClient(
+        timeout=(settings.STRIPE_CONNECT_TIMEOUT, settings.STRIPE_READ_TIMEOUT),
+        session=session,
+    )
+
+
+def configure():
+    """Apply the Stripe settings to the ``stripe`` module."""
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    if settings.STRIPE_API_BASE:
+        stripe.api_base = settings.STRIPE_API_BASE
+    # Retried POSTs carry an idempotency key, so a retry never charges twice
+    stripe.max_network_retries = settings.STRIPE_MAX_NETWORK_RETRIES
+    stripe.default_http_client = build_http_client()
+    breaker.failure_threshold = settings.STRIPE_CIRCUIT_FAILURE_THRESHOLD
+    breaker.reset_timeout = settings.STRIPE_CIRCUIT_RESET_TIMEOUT
+
+
+@contextmanager
+def stripe_call(operation):
+    """Guard a Stripe API call with the circuit breaker and record its latency and failures."""
+    try:
+        breaker.before_call()
+    except CircuitOpenError as e:
+        STRIPE_API_ERRORS.inc(operation=operation, error=type(e).__name__)
+        raise
+
+    started = time.perf_counter()
+    try:
+        yield
+    except TRANSIENT_ERRORS as e:
+        breaker.record_failure()
+        STRIPE_API_ERRORS.inc(operation=operation, error=type(e).__name__)
+        raise
+    except stripe.error.StripeError as e:
+        # Stripe answered (card declined, bad request, ...): it is up
+        breaker.record_success()
+        STRIPE_API_ERRORS.inc(operation=operation, error=type(e).__name__)
+        raise
+    except BaseException:
+        # Not Stripe's failure; don't leave a half-open trial hanging
+        breaker.record_success()
+        raise
+    else:
+        breaker.record_success()
+    finally:
+        STRIPE_API_LATENCY.observe(time.perf_counter() - started, operation=operation)
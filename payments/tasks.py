@@ -0,0 +1,27 @@
+"""
+Background tasks for the payments app.
+
+Enqueue them with ``prompt_platform.background.enqueue``. The periodic ones
+are scheduled in ``CELERY_BEAT_SCHEDULE``.
+"""
+from celery import shared_task
+from django.core.management import call_command
+
+from . import customers, webhooks
+
+
+@shared_task
+def provision_customer(user_id):
+    customers.provision_customer(user_id)
+
+
+@shared_task
+def drain_webhooks(batch_size=None):
+    """Process stored webhook events until none is due."""
+    return webhooks.drain(batch_size)
+
+
+@shared_task
+def reconcile_payments():
+    """Run ``reconcile_payments``; it continues from its checkpoint each time."""
+    call_command('reconcile_payments')
@@ -0,0 +1,467 @@
+import base64
+import itertools
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from prompt_platform.pagination import CursorPaginator, decode_cursor, encode_cursor
+from prompts.models import Category, Prompt, PromptPurchase
+
+from . import webhooks
+from .customers import ensure_customer
+from .fake_stripe import FakeStripe, FakeStripeServer, sign_payload
+from .ledger import backfill, backfill_preview
+from .loadtest import use_fake_stripe
+from .models import CreatorBalance, LedgerEntry, Payment, WebhookEvent
+from .reconciliation import Reconciler
+from .services import finalize_purchase
+from .stripe_client import CircuitBreaker, CircuitOpenError, stripe_call
+
+User = get_user_model()
+
+WEBHOOK_SECRET = 'whsec_test'
+_event_ids = itertools.count(1)
+
+
+def payment_intent(intent_id, status='succeeded', amount=1000, **fields):
+    return {'id': intent_id, 'object': 'payment_intent', 'status': status, 'amount': amount, 'currency': 'usd', **fields}
+
+
+def webhook_event(event_type, obj, event_id=None):
+    return {
+        'id': event_id or f'evt_test_{next(_event_ids)}',
+        'object': 'event',
+        'type': event_type,
+        'created': int(time.time()),
+        'data': {'object': obj},
+    }
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+def deliver(event):
+    """POST ``event`` to the webhook view, signed as Stripe would; returns the status code."""
+    payload = json.dumps(event)
+    response = Client().post(
+        reverse('payments:stripe_webhook'), payload, content_type='application/json',
+        HTTP_STRIPE_SIGNATURE=sign_payload(payload, WEBHOOK_SECRET),
+    )
+    return response.status_code
+
+
+class PaymentsTestCase(TestCase):
+    """A creator with a paid prompt and a buyer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            username='creator', email='creator@example.com', password='password', is_creator=True
+        )
+        cls.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='password')
+        cls.category = Category.objects.create(name='Writing', slug='writing')
+        cls.prompt = Prompt.objects.create(
+            title='Cover letter',
+            description='Writes cover letters',
+            content='Write a cover letter',
+            author=cls.creator,
+            category=cls.category,
+            price_type='paid',
+            price=Decimal('10.00'),
+            status='published',
+        )
+
+
+class LedgerBackfillTests(PaymentsTestCase):
+    def setUp(self):
+        # bulk_create sends no post_save, like purchases made before the ledger existed
+        PromptPurchase.objects.bulk_create([
+            PromptPurchase(prompt=self.prompt, user=self.buyer, amount=Decimal('10.00'), payment_status='completed'),
+            PromptPurchase(prompt=self.prompt, user=self.creator, amount=Decimal('10.00'), payment_status='refunded'),
+        ])
+
+    def test_preview_matches_backfill(self):
+        entries, net = backfill_preview()
+
+        self.assertEqual(entries, 3)
+        self.assertEqual(net, Decimal('9.00'))
+        self.assertEqual(backfill(), entries)
+        self.assertEqual(CreatorBalance.objects.get(creator=self.creator).unsettled, net)
+        self.assertEqual(backfill_preview(), (0, Decimal('0')))
+
+    def test_dry_run_backfill_writes_nothing(self):
+        out = StringIO()
+        call_command('settle_payouts', backfill=True, dry_run=True, stdout=out)
+
+        self.assertIn('Would book 3 ledger entries', out.getvalue())
+        self.assertFalse(LedgerEntry.objects.exists())
+        self.assertFalse(CreatorBalance.objects.exists())
+
+
+class FinalizePurchaseTests(PaymentsTestCase):
+    def setUp(self):
+        self.payment = Payment.objects.create(
+            user=self.buyer, prompt=self.prompt, amount=Decimal('10.00'), stripe_payment_intent_id='pi_race'
+        )
+
+    def assertPurchasedOnce(self):
+        self.payment.refresh_from_db()
+        self.prompt.refresh_from_db()
+        self.assertEqual(self.payment.status, 'completed')
+        self.assertEqual(PromptPurchase.objects.filter(stripe_payment_intent_id='pi_race').count(), 1)
+        self.assertEqual(self.prompt.purchases, 1)
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='sale').count(), 1)
+
+    def test_only_the_first_call_completes(self):
+        self.assertTrue(finalize_purchase('pi_race'))
+        self.assertFalse(finalize_purchase('pi_race'))
+        self.assertPurchasedOnce()
+
+    def test_webhook_lands_while_the_redirect_checks_stripe(self):
+        def retrieve(intent_id, *args, **kwargs):
+            # The webhook completes the payment between the redirect's status check and its finalize
+            self.assertEqual(deliver(webhook_event('payment_intent.succeeded', payment_intent(intent_id))), 200)
+            return stripe.PaymentIntent.construct_from(payment_intent(intent_id), 'sk_test')
+
+        self.client.force_login(self.buyer)
+        with mock.patch('stripe.PaymentIntent.retrieve', side_effect=retrieve) as retrieve_mock:
+            response = self.client.get(reverse('payments:payment_success', args=[self.payment.pk]))
+
+        self.assertEqual(response.status_code, 302)
+        retrieve_mock.assert_called_once()
+        self.assertEqual(WebhookEvent.objects.get().status, 'processed')
+        self.assertPurchasedOnce()
+
+    def test_redirect_after_the_webhook_skips_stripe(self):
+        self.assertEqual(deliver(webhook_event('payment_intent.succeeded', payment_intent('pi_race'))), 200)
+
+        self.client.force_login(self.buyer)
+        with mock.patch('stripe.PaymentIntent.retrieve') as retrieve_mock:
+            self.client.get(reverse('payments:payment_success', args=[self.payment.pk]))
+
+        retrieve_mock.assert_not_called()
+        self.assertPurchasedOnce()
+
+
+@override_settings(WEBHOOK_AUTO_PROCESS=False, WEBHOOK_RETRY_BASE_DELAY=30, WEBHOOK_MAX_ATTEMPTS=3)
+class WebhookProcessingTests(PaymentsTestCase):
+    def setUp(self):
+        Payment.objects.create(
+            user=self.buyer, prompt=self.prompt, amount=Decimal('10.00'), stripe_payment_intent_id='pi_webhook'
+        )
+        self.event = webhook_event('payment_intent.succeeded', payment_intent('pi_webhook'))
+
+    def fail_handler(self):
+        return mock.patch.dict(webhooks.EVENT_HANDLERS, {
+            'payment_intent.succeeded': mock.Mock(side_effect=RuntimeError('database went away')),
+        })
+
+    def make_due(self):
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+
+    def test_redelivered_event_is_stored_and_applied_once(self):
+        self.assertEqual(deliver(self.event), 200)
+        self.assertEqual(deliver(self.event), 200)
+
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        self.assertEqual(webhooks.drain(), 1)
+        self.assertEqual(PromptPurchase.objects.count(), 1)
+
+    def test_failed_event_is_retried_with_backoff(self):
+        deliver(self.event)
+        with self.fail_handler():
+            started = timezone.now()
+            self.assertEqual(webhooks.process_batch(), 1)
+            event = WebhookEvent.objects.get()
+            self.assertEqual((event.status, event.attempts), ('pending', 1))
+            self.assertIn('RuntimeError: database went away', event.last_error)
+            self.assertGreaterEqual(event.next_attempt_at, started + timedelta(seconds=30))
+
+            # Not due yet
+            self.assertEqual(webhooks.process_batch(), 0)
+
+            self.make_due()
+            started = timezone.now()
+            webhooks.process_batch()
+            event.refresh_from_db()
+            self.assertEqual(event.attempts, 2)
+            self.assertGreaterEqual(event.next_attempt_at, started + timedelta(seconds=60))
+
+        self.make_due()
+        webhooks.process_batch()
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('processed', 3))
+        self.assertEqual(PromptPurchase.objects.count(), 1)
+
+    def test_event_fails_after_max_attempts(self):
+        deliver(self.event)
+        with self.fail_handler(), self.assertLogs('payments.webhooks', 'ERROR'):
+            for _ in range(3):
+                self.make_due()
+                webhooks.process_batch()
+
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ('failed', 3))
+        self.make_due()
+        self.assertEqual(webhooks.claim_batch(), [])
+
+    def test_stale_processing_lock_is_reclaimed(self):
+        deliver(self.event)
+        WebhookEvent.objects.update(status='processing', locked_at=timezone.now())
+        self.assertEqual(webhooks.claim_batch(), [])
+
+        WebhookEvent.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(len(webhooks.claim_batch()), 1)
+
+    def test_retry_delay_doubles_up_to_an_hour(self):
+        self.assertEqual(
+            [webhooks.retry_delay(attempts).total_seconds() for attempts in (1, 2, 3, 20)],
+            [30, 60, 120, 3600],
+        )
+
+
+class ReconciliationTests(PaymentsTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeStripeServer(FakeStripe()).start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        self.fake = self.server.fake = FakeStripe()
+        self.enterContext(use_fake_stripe(self.server))
+        self.problems = []
+
+    def payment(self, intent_status, payment_status='pending', amount='10.00', **intent_fields):
+        intent = self.fake.create_payment_intent({'amount': '1000', 'currency': 'usd'})
+        intent.update(status=intent_status, **intent_fields)
+        return Payment.objects.create(
+            user=self.buyer, prompt=self.prompt, amount=Decimal(amount), status=payment_status,
+            stripe_payment_intent_id=intent['id'],
+        )
+
+    def reconcile(self, days_later=2, **kwargs):
+        reconciler = Reconciler(on_discrepancy=self.problems.append, **kwargs)
+        stats = reconciler.run(now=timezone.now() + timedelta(days=days_later))
+        return stats, sorted(problem['kind'] for problem in self.problems)
+
+    def assertStatus(self, payment, status):
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, status)
+
+    def test_pending_payments_follow_their_intents(self):
+        succeeded = self.payment('succeeded')
+        canceled = self.payment('canceled')
+        declined = self.payment('requires_payment_method', last_payment_error={'message': 'Card declined'})
+        abandoned = self.payment('requires_payment_method')
+        processing = self.payment('processing')
+
+        stats, problems = self.reconcile()
+
+        self.assertStatus(succeeded, 'completed')
+        self.assertTrue(PromptPurchase.objects.filter(stripe_payment_intent_id=succeeded.stripe_payment_intent_id).exists())
+        self.assertStatus(canceled, 'cancelled')
+        self.assertStatus(declined, 'failed')
+        self.assertStatus(abandoned, 'cancelled')
+        self.assertStatus(processing, 'pending')
+        self.assertEqual(
+            (stats['completed'], stats['marked_cancelled'], stats['marked_failed']), (1, 2, 1)
+        )
+        self.assertEqual(problems, [])
+
+    def test_recent_checkout_is_not_abandoned_yet(self):
+        payment = self.payment('requires_payment_method')
+
+        self.reconcile(abandon_after=timedelta(days=3))
+
+        self.assertStatus(payment, 'pending')
+
+    def test_discrepancies_are_reported_not_fixed(self):
+        refunded = self.payment('canceled', payment_status='completed')
+        mismatch = self.payment('succeeded', amount='12.00')
+        missing = Payment.objects.create(
+            user=self.buyer, prompt=self.prompt, amount=Decimal('10.00'), stripe_payment_intent_id='pi_unknown'
+        )
+        unrecorded = self.payment('succeeded', payment_status='completed')
+
+        stats, problems = self.reconcile()
+
+        self.assertEqual(problems, ['amount_mismatch', 'completed_without_charge', 'intent_not_found', 'purchase_missing'])
+        self.assertStatus(refunded, 'completed')
+        self.assertStatus(mismatch, 'pending')
+        self.assertStatus(missing, 'pending')
+        self.assertStatus(unrecorded, 'completed')
+        self.assertEqual(stats['completed'], 0)
+
+    def test_dry_run_changes_nothing(self):
+        succeeded = self.payment('succeeded')
+        canceled = self.payment('canceled')
+
+        stats, _ = self.reconcile(dry_run=True)
+
+        self.assertStatus(succeeded, 'pending')
+        self.assertStatus(canceled, 'pending')
+        self.assertEqual((stats['would_complete'], stats['would_mark_cancelled']), (1, 1))
+        self.assertFalse(PromptPurchase.objects.exists())
+
+    def test_checkpoint_makes_runs_incremental(self):
+        self.payment('succeeded', payment_status='completed')
+        stats, _ = self.reconcile()
+        self.assertEqual(stats['checked'], 1)
+
+        # The settled payment is behind the checkpoint now
+        stats, _ = self.reconcile()
+        self.assertEqual(stats['checked'], 0)
+
+
+class CursorPaginatorTests(PaymentsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        older = timezone.now() - timedelta(days=1)
+        newer = timezone.now()
+        cls.payments = []
+        # Ties on created_at, so pages have to split them by pk
+        for index, created_at in enumerate([older, older, older, newer, newer]):
+            payment = Payment.objects.create(
+                user=cls.buyer, prompt=cls.prompt, amount=Decimal('10.00'), stripe_payment_intent_id=f'pi_page_{index}'
+            )
+            Payment.objects.filter(pk=payment.pk).update(created_at=created_at)
+            cls.payments.append(payment.pk)
+        # Newest first, ties newest pk first
+        cls.expected = cls.payments[3:][::-1] + cls.payments[:3][::-1]
+
+    def paginator(self):
+        return CursorPaginator(Payment.objects.all(), per_page=2)
+
+    def pks(self, page):
+        return [payment.pk for payment in page]
+
+    def test_forward_and_back_across_equal_timestamps(self):
+        pages = [self.paginator().get_page()]
+        while pages[-1].has_next:
+            pages.append(self.paginator().get_page(after=pages[-1].next_cursor()))
+
+        self.assertEqual([self.pks(page) for page in pages], [self.expected[0:2], self.expected[2:4], self.expected[4:]])
+        self.assertFalse(pages[0].has_previous)
+        last = pages[-1]
+        self.assertEqual((last.has_next, last.has_previous, last.next_cursor()), (False, True, None))
+
+        back = self.paginator().get_page(before=last.previous_cursor())
+        self.assertEqual(self.pks(back), self.expected[2:4])
+        self.assertTrue(back.has_next)
+        self.assertTrue(back.has_previous)
+        first = self.paginator().get_page(before=back.previous_cursor())
+        self.assertEqual(self.pks(first), self.expected[0:2])
+        self.assertFalse(first.has_previous)
+
+    def test_garbage_cursor_gives_the_first_page(self):
+        for cursor in ('not a cursor', '!!!', encode_cursor(timezone.now(), 1)[:-3]):
+            page = self.paginator().get_page(after=cursor)
+            self.assertEqual(self.pks(page), self.expected[0:2])
+            self.assertFalse(page.has_previous)
+
+    def test_decode_cursor_rejects_malformed_values(self):
+        created_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 7)), (created_at, 7))
+        for data in ('["yesterday", 1]', '["2026-01-01T00:00:00", "1"]', '{}', 'null'):
+            cursor = base64.urlsafe_b64encode(data.encode()).decode()
+            self.assertIsNone(decode_cursor(cursor))
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        clock = mock.Mock(monotonic=lambda: self.now, perf_counter=time.perf_counter)
+        self.enterContext(mock.patch('payments.stripe_client.time', clock))
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        self.enterContext(mock.patch('payments.stripe_client.breaker', self.breaker))
+        self.calls = 0
+
+    def call(self, error=None):
+        with stripe_call('test.call'):
+            self.calls += 1
+            if error is not None:
+                raise error
+
+    def fail(self, times=1):
+        for _ in range(times):
+            with self.assertRaises(stripe.error.APIConnectionError):
+                self.call(stripe.error.APIConnectionError('Connection refused'))
+
+    def test_opens_after_the_threshold_and_short_circuits(self):
+        self.fail(2)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.fail()
+        self.assertEqual(self.breaker.state, 'open')
+
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+        self.assertEqual(self.calls, 3)
+
+    def test_answers_from_stripe_do_not_count_as_failures(self):
+        for _ in range(5):
+            with self.assertRaises(stripe.error.CardError):
+                self.call(stripe.error.CardError('Declined', None, 'card_declined'))
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_successful_probe_closes_the_circuit(self):
+        self.fail(3)
+        self.now += 30
+        self.assertEqual(self.breaker.state, 'half-open')
+
+        self.breaker.before_call()
+        # Only the one probe goes through while it runs
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, 'closed')
+        self.call()
+        self.assertEqual(self.calls, 4)
+
+    def test_failed_probe_reopens_for_another_timeout(self):
+        self.fail(3)
+        self.now += 30
+        self.fail()
+
+        self.assertEqual(self.breaker.state, 'open')
+        self.now += 29
+        with self.assertRaises(CircuitOpenError):
+            self.call()
+
+
+class EnsureCustomerTests(PaymentsTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeStripeServer(FakeStripe()).start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        self.fake = self.server.fake = FakeStripe()
+        self.enterContext(use_fake_stripe(self.server))
+
+    def test_retried_creation_reuses_the_customer(self):
+        customer_id = ensure_customer(self.buyer)
+        # A racing request that read the user before the first one saved
+        User.objects.filter(pk=self.buyer.pk).update(stripe_customer_id='')
+        self.buyer.stripe_customer_id = ''
+
+        self.assertEqual(ensure_customer(self.buyer), customer_id)
+        self.assertEqual(list(self.fake.customers), [customer_id])
+        self.assertEqual(self.fake.customers[customer_id]['metadata'], {'user_id': str(self.buyer.pk)})
+
+    def test_existing_customer_id_wins(self):
+        User.objects.filter(pk=self.buyer.pk).update(stripe_customer_id='cus_existing')
+
+        self.assertEqual(ensure_customer(self.buyer), 'cus_existing')
+        self.assertEqual(self.buyer.stripe_customer_id, 'cus_existing')
@@ -1,123 +1,147 @@
+from decimal import Decimal
+
 import stripe
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.views import redirect_to_login
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import Http404, JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.conf import settings
 from django.utils import timezone
+from django.db.models import Count, Q, Sum
 from django.urls import reverse
 
+from .customers import ensure_customer
+from .exports import PAYMENT_EXPORT_FIELDS, payment_export_row
 from .models import Payment, StripeAccount
+from .services import finalize_purchase
+from .stripe_client import stripe_call
+from .webhooks import kick, record_event
+from prompts.exports import EXPORT_CHUNK_SIZE, streaming_export_response
 from prompts.models import Prompt, PromptPurchase
+from prompt_platform.pagination import CursorPaginator
+from prompt_platform.query_budget import query_budget
+from prompt_platform.replicas import stick_to_primary
 
-# Configure Stripe
-stripe.api_key = settings.STRIPE_SECRET_KEY
+PAYMENT_HISTORY_PAGE_SIZE = 25
 
 
-@login_required
-def create_payment(request, prompt_id):
-    """Create a payment intent for purchasing a prompt."""
-    prompt = get_object_or_404(Prompt, id=prompt_id, status='published')
-    
-    # Check if user already purchased
-    if PromptPurchase.objects.filter(prompt=prompt, buyer=request.user).exists():
-        messages.info(request, 'You have already purchased this prompt.')
-        return redirect('prompts:prompt_detail', slug=prompt.slug)
-    
-    # Check if user is trying to buy their own prompt
-    if prompt.author == request.user:
-        messages.error(request, 'You cannot purchase your own prompt.')
-        return redirect('prompts:prompt_detail', slug=prompt.slug)
-    
-    try:
-        # Create or get Stripe customer
-        if not request.user.stripe_customer_id:
-            customer = stripe.Customer.create(
-                email=request.user.email,
-                name=request.user.full_name,
-            )
-            request.user.stripe_customer_id = customer.id
-            request.user.save()
-        
-        # Create payment intent
-        payment_intent = stripe.PaymentIntent.create(
+def _authenticated_user(request):
+    # Evaluates the lazy request.user, which queries the session and user tables
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+def _create_payment_intent(prompt, user, customer_id):
+    with stripe_call('payment_intent.create'):
+        return stripe.PaymentIntent.create(
             amount=int(prompt.price * 100),  # Convert to cents
             currency='usd',
-            customer=request.user.stripe_customer_id,
+            customer=customer_id,
             metadata={
                 'prompt_id': prompt.id,
-                'user_id': request.user.id,
+                'user_id': user.id,
                 'prompt_title': prompt.title,
             }
         )
-        
-        # Create payment record
-        payment = Payment.objects.create(
-            user=request.user,
-            prompt=prompt,
-            amount=prompt.price,
-            stripe_payment_intent_id=payment_intent.id,
-            stripe_customer_id=request.user.stripe_customer_id,
-        )
-        
-        return render(request, 'payments/checkout.html', {
-            'prompt': prompt,
-            'payment': payment,
-            'client_secret': payment_intent.client_secret,
-            'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY,
-        })
-        
+
+
+@query_budget(6)
+async def create_payment(request, prompt_id):
+    """
+    Create a payment intent for purchasing a prompt.
+
+    Async so that, under ASGI, the worker keeps serving other requests while
+    Stripe answers. The customer is normally created at signup, leaving one
+    Stripe call here.
+    """
+    user = await sync_to_async(_authenticated_user)(request)
+    if user is None:
+        return redirect_to_login(request.get_full_path())
+    
+    try:
+        prompt = await Prompt.objects.aget(id=prompt_id, status='published')
+    except Prompt.DoesNotExist:
+        raise Http404('No Prompt matches the given query.')
+    
+    # Check if user is trying to buy their own prompt
+    if prompt.author_id == user.pk:
+        messages.error(request, 'You cannot purchase your own prompt.')
+        return redirect('prompts:prompt_detail', slug=prompt.slug)
+    
+    # Check if user already purchased
+    if await PromptPurchase.objects.filter(prompt=prompt, user=user, payment_status='completed').aexists():
+        messages.info(request, 'You have already purchased this prompt.')
+        return redirect('prompts:prompt_detail', slug=prompt.slug)
+    
+    try:
+        customer_id = await sync_to_async(ensure_customer)(user)
+        payment_intent = await sync_to_async(_create_payment_intent)(prompt, user, customer_id)
     except stripe.error.StripeError as e:
         messages.error(request, f'Payment error: {str(e)}')
         return redirect('prompts:prompt_detail', slug=prompt.slug)
+    
+    # Create payment record
+    payment = await Payment.objects.acreate(
+        user=user,
+        prompt=prompt,
+        amount=prompt.price,
+        stripe_payment_intent_id=payment_intent.id,
+        stripe_customer_id=customer_id,
+    )
+    
+    return await sync_to_async(render)(request, 'payments/checkout.html', {
+        'prompt': prompt,
+        'payment': payment,
+        'client_secret': payment_intent.client_secret,
+        'stripe_publishable_key': settings.STRIPE_PUBLISHABLE_KEY,
+    })
 
 
+@query_budget(8)
 @login_required
 def payment_success(request, payment_id):
-    """Handle successful payment."""
-    payment = get_object_or_404(Payment, id=payment_id, user=request.user)
-    
-    if payment.status == 'completed':
-        messages.success(request, 'Payment completed successfully!')
-        return redirect('prompts:prompt_detail', slug=payment.prompt.slug)
-    
-    # Update payment status
-    payment.status = 'completed'
-    payment.completed_at = timezone.now()
-    payment.save()
-    
-    # Create purchase record
-    PromptPurchase.objects.create(
-        prompt=payment.prompt,
-        buyer=request.user,
-        seller=payment.prompt.author,
-        amount=payment.amount,
-        stripe_payment_intent_id=payment.stripe_payment_intent_id,
-    )
-    
-    # Update prompt purchase count
-    payment.prompt.purchases += 1
-    payment.prompt.save(update_fields=['purchases'])
+    """Handle the buyer's return from Stripe after paying."""
+    # The purchase was just written; show the buyer pages that include it
+    stick_to_primary(request)
+    payment = get_object_or_404(Payment.objects.select_related('prompt'), id=payment_id, user=request.user)
+    
+    if payment.status != 'completed':
+        # The redirect alone proves nothing; ask Stripe whether the payment went through.
+        # Usually the webhook has completed it already and no call is needed.
+        try:
+            with stripe_call('payment_intent.retrieve'):
+                payment_intent = stripe.PaymentIntent.retrieve(payment.stripe_payment_intent_id)
+        except stripe.error.StripeError:
+            payment_intent = None
+        
+        if payment_intent is None or payment_intent.status != 'succeeded':
+            messages.info(request, 'Your payment is being processed. The prompt will unlock once it is confirmed.')
+            return redirect('prompts:prompt_detail', slug=payment.prompt.slug)
+        
+        finalize_purchase(payment.stripe_payment_intent_id)
     
     messages.success(request, 'Payment completed successfully! You can now access the prompt.')
     return redirect('prompts:prompt_detail', slug=payment.prompt.slug)
 
 
+@query_budget(5)
 @login_required
 def payment_cancel(request, payment_id):
     """Handle cancelled payment."""
-    payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+    payment = get_object_or_404(Payment.objects.select_related('prompt'), id=payment_id, user=request.user)
     
-    if payment.status == 'pending':
-        payment.status = 'cancelled'
-        payment.save()
+    # Conditional, so a webhook completing the payment meanwhile is not overwritten
+    Payment.objects.filter(pk=payment.pk, status='pending').update(status='cancelled', updated_at=timezone.now())
     
     messages.info(request, 'Payment was cancelled.')
     return redirect('prompts:prompt_detail', slug=payment.prompt.slug)
 
 
+@query_budget(2)
 @csrf_exempt
 @require_POST
 def stripe_webhook(request):
@@ -134,73 +158,66 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError as e:
         return HttpResponse(status=400)
     
-    # Handle the event
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        handle_payment_success(payment_intent)
-    elif event['type'] == 'payment_intent.payment_failed':
-        payment_intent = event['data']['object']
-        handle_payment_failure(payment_intent)
+    # Persist only; payments.webhooks processes the event off the request thread
+    if record_event(event):
+        kick()
     
     return HttpResponse(status=200)
 
 
-def handle_payment_success(payment_intent):
-    """Handle successful payment from webhook."""
-    try:
-        payment = Payment.objects.get(
-            stripe_payment_intent_id=payment_intent.id
-        )
-        
-        if payment.status != 'completed':
-            payment.status = 'completed'
-            payment.completed_at = timezone.now()
-            payment.save()
-            
-            # Create purchase record if it doesn't exist
-            if not PromptPurchase.objects.filter(
-                prompt=payment.prompt,
-                buyer=payment.user,
-                stripe_payment_intent_id=payment.stripe_payment_intent_id
-            ).exists():
-                PromptPurchase.objects.create(
-                    prompt=payment.prompt,
-                    buyer=payment.user,
-                    seller=payment.prompt.author,
-                    amount=payment.amount,
-                    stripe_payment_intent_id=payment.stripe_payment_intent_id,
-                )
-                
-                # Update prompt purchase count
-                payment.prompt.purchases += 1
-                payment.prompt.save(update_fields=['purchases'])
-    
-    except Payment.DoesNotExist:
-        pass
-
-
-def handle_payment_failure(payment_intent):
-    """Handle failed payment from webhook."""
-    try:
-        payment = Payment.objects.get(
-            stripe_payment_intent_id=payment_intent.id
-        )
-        payment.status = 'failed'
-        payment.save()
-    except Payment.DoesNotExist:
-        pass
+def _payment_totals(user):
+    """Count and sum the user's payments per status, in one query."""
+    aggregates = {}
+    for status, _ in Payment.STATUS_CHOICES:
+        aggregates[f'{status}_count'] = Count('pk', filter=Q(status=status))
+        aggregates[f'{status}_amount'] = Sum('amount', filter=Q(status=status))
+    totals = Payment.objects.filter(user=user).aggregate(**aggregates)
+    
+    return [
+        {
+            'status': status,
+            'label': label,
+            'count': totals[f'{status}_count'],
+            'amount': totals[f'{status}_amount'] or Decimal('0'),
+        }
+        for status, label in Payment.STATUS_CHOICES
+    ]
 
 
+@query_budget(4)
 @login_required
 def payment_history(request):
-    """Display user's payment history."""
-    payments = Payment.objects.filter(user=request.user).select_related('prompt').order_by('-created_at')
+    """Display the user's payment history a page at a time, or stream all of it as CSV/NDJSON."""
+    payments = Payment.objects.filter(user=request.user).select_related('prompt')
+    
+    export_format = request.GET.get('format')
+    if export_format:
+        if export_format not in ('csv', 'ndjson'):
+            return JsonResponse({'error': 'Invalid export format'}, status=400)
+        rows = (
+            payment_export_row(payment)
+            for payment in payments.order_by('-created_at', '-pk').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+        return streaming_export_response(
+            rows,
+            PAYMENT_EXPORT_FIELDS,
+            export_format,
+            f'payments_{timezone.now().strftime("%Y%m%d")}',
+            compress=request.GET.get('gzip') in ('1', 'true'),
+        )
+    
+    # Keyset pagination: deep pages of a long history cost the same as the first
+    page = CursorPaginator(payments, PAYMENT_HISTORY_PAGE_SIZE).get_page(
+        after=request.GET.get('after'), before=request.GET.get('before')
+    )
     
     return render(request, 'payments/payment_history.html', {
-        'payments': payments,
+        'page': page,
+        'totals': _payment_totals(request.user),
     })
 
 
+@query_budget(3)
 @login_required
 def connect_stripe_account(request):
     """Initiate Stripe Connect onboarding for creators."""
@@ -210,12 +227,13 @@ def connect_stripe_account(request):
     
     try:
         # Create account link for onboarding
-        account_link = stripe.AccountLink.create(
-            account=request.user.stripe_account_id,
-            refresh_url=request.build_absolute_uri(reverse('payments:connect_stripe_account')),
-            return_url=request.build_absolute_uri(reverse('payments:connect_stripe_return')),
-            type='account_onboarding',
-        )
+        with stripe_call('account_link.create'):
+            account_link = stripe.AccountLink.create(
+                account=request.user.stripe_account_id,
+                refresh_url=request.build_absolute_uri(reverse('payments:connect_stripe_account')),
+                return_url=request.build_absolute_uri(reverse('payments:connect_stripe_return')),
+                type='account_onboarding',
+            )
         
         return redirect(account_link.url)
         
@@ -224,6 +242,7 @@ def connect_stripe_account(request):
         return redirect('prompts:user_dashboard')
 
 
+@query_budget(2)
 @login_required
 def connect_stripe_return(request):
     """Handle return from Stripe Connect onboarding."""
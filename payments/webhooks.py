@@ -0,0 +1,169 @@
+"""
+Staged Stripe webhook handling.
+
+The webhook view only verifies the signature and stores the event with
+``record_event``; Stripe's event ID is unique, so redelivered events are
+dropped by the INSERT itself. ``process_batch`` claims due events, runs
+their handlers and retries failures with exponential backoff. Processing
+is started in the background after each delivery (``kick``), every minute
+by the Celery beat schedule, or by the ``process_webhooks`` management
+command.
+"""
+import logging
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import stripe
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from prompt_platform import background
+from prompt_platform.metrics import WEBHOOK_EVENTS, WEBHOOK_LAG
+from .models import Payment, WebhookEvent
+from .services import finalize_purchase
+
+logger = logging.getLogger(__name__)
+
+_kick_lock = threading.Lock()
+_kick_pending = False
+
+
+def handle_payment_success(payment_intent):
+    """Complete the payment and record the purchase, once."""
+    finalize_purchase(payment_intent.id)
+
+
+def handle_payment_failure(payment_intent):
+    """Mark the payment failed unless it already completed."""
+    Payment.objects.filter(
+        stripe_payment_intent_id=payment_intent.id
+    ).exclude(status='completed').update(status='failed', updated_at=timezone.now())
+
+
+EVENT_HANDLERS = {
+    'payment_intent.succeeded': handle_payment_success,
+    'payment_intent.payment_failed': handle_payment_failure,
+}
+
+
+def record_event(event):
+    """Store a verified event; returns False when it was already stored."""
+    created = event.get('created')
+    try:
+        with transaction.atomic():
+            WebhookEvent.objects.create(
+                stripe_event_id=event['id'],
+                event_type=event['type'],
+                payload=event.to_dict_recursive(),
+                stripe_created_at=datetime.fromtimestamp(created, tz=dt_timezone.utc) if created else None,
+            )
+    except IntegrityError:
+        # Stripe redelivered an event we already have
+        WEBHOOK_EVENTS.inc(event_type=event['type'], result='duplicate')
+        return False
+    WEBHOOK_EVENTS.inc(event_type=event['type'], result='received')
+    return True
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2x base, 4x base, ... capped at an hour."""
+    return timedelta(seconds=min(settings.WEBHOOK_RETRY_BASE_DELAY * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(batch_size=None):
+    """
+    Lock up to ``batch_size`` due events for this worker.
+
+    Due events are pending ones whose retry time has come, and ones left in
+    ``processing`` by a worker that died more than WEBHOOK_LOCK_TIMEOUT ago.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.WEBHOOK_LOCK_TIMEOUT)
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                Q(status='pending', next_attempt_at__lte=now) |
+                Q(status='processing', locked_at__lt=stale)
+            ).order_by('received_at')[:batch_size or settings.WEBHOOK_BATCH_SIZE]
+        )
+        WebhookEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            status='processing', locked_at=now
+        )
+    return events
+
+
+def process_event(event):
+    """Run the handler for one claimed event and record the outcome."""
+    handler = EVENT_HANDLERS.get(event.event_type)
+    now = timezone.now()
+    try:
+        if handler is not None:
+            stripe_event = stripe.Event.construct_from(event.payload, stripe.api_key)
+            with transaction.atomic():
+                handler(stripe_event.data.object)
+    except Exception as e:
+        event.attempts += 1
+        event.last_error = f'{type(e).__name__}: {e}'
+        event.locked_at = None
+        if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            event.status = 'failed'
+            logger.exception('Giving up on webhook event %s after %d attempts', event.stripe_event_id, event.attempts)
+        else:
+            event.status = 'pending'
+            event.next_attempt_at = now + retry_delay(event.attempts)
+        event.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'locked_at'])
+        WEBHOOK_EVENTS.inc(event_type=event.event_type, result='failed' if event.status == 'failed' else 'retried')
+        return False
+
+    event.status = 'processed'
+    event.attempts += 1
+    event.processed_at = now
+    event.locked_at = None
+    event.save(update_fields=['status', 'attempts', 'processed_at', 'locked_at'])
+    if event.stripe_created_at:
+        WEBHOOK_LAG.observe(max((now - event.stripe_created_at).total_seconds(), 0), event_type=event.event_type)
+    WEBHOOK_EVENTS.inc(event_type=event.event_type, result='processed')
+    return True
+
+
+def process_batch(batch_size=None):
+    """Claim and process one batch; returns the number of events claimed."""
+    events = claim_batch(batch_size)
+    for event in events:
+        process_event(event)
+    return len(events)
+
+
+def drain(batch_size=None):
+    """Process batches until no event is due."""
+    global _kick_pending
+    with _kick_lock:
+        _kick_pending = False
+    total = 0
+    while True:
+        claimed = process_batch(batch_size)
+        total += claimed
+        if not claimed:
+            return total
+
+
+def kick():
+    """
+    Start a background drain. On the thread pool, bursts share one run;
+    Celery workers claim batches with SKIP LOCKED, so each delivery simply
+    queues a task.
+    """
+    global _kick_pending
+    if not settings.WEBHOOK_AUTO_PROCESS:
+        return
+    # Imported here: tasks imports this module
+    from .tasks import drain_webhooks
+
+    if not background.uses_celery():
+        with _kick_lock:
+            if _kick_pending:
+                return
+            _kick_pending = True
+    background.enqueue(drain_webhooks)
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prompt_platform.settings')
+# Serve the read-only catalog pages with their async views (see prompts.async_views)
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application() 
\ No newline at end of file
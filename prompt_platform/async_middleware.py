@@ -0,0 +1,38 @@
+"""
+An async-capable version of third-party middleware.
+
+Under ASGI, Django runs each sync-only middleware in a thread, so every
+request hops to a thread and back around it. WhiteNoise is sync-only in the
+version pinned here, so this subclass adds an async path with the same
+behaviour. allauth's ``AccountMiddleware`` is sync-only too, but allauth
+insists on finding it in ``MIDDLEWARE`` under its own name, so it can't be
+replaced the same way; it stays last in the chain, where it costs a single
+hop, until allauth is upgraded to a version with async support.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from whitenoise import middleware as whitenoise_middleware
+
+
+class WhiteNoiseMiddleware(whitenoise_middleware.WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
@@ -0,0 +1,31 @@
+"""
+SQLite backend with per-connection tuning.
+
+* ``PRAGMAS`` in the database entry are applied to every new connection;
+  PRAGMAs such as ``synchronous`` last only as long as the connection.
+* ``OPTIONS['transaction_mode']`` (``DEFERRED``, ``IMMEDIATE`` or
+  ``EXCLUSIVE``) picks how ``atomic()`` begins transactions, as Django 5.1
+  does natively. A deferred transaction that reads and then writes must
+  upgrade its lock, and when another connection wrote in between SQLite
+  fails the upgrade with "database is locked" at once, without waiting out
+  the busy timeout. ``IMMEDIATE`` takes the write lock up front, so
+  concurrent writers queue on the busy timeout instead.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('transaction_mode', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,118 @@
+"""
+Background jobs.
+
+``enqueue`` runs a Celery task (a ``shared_task`` from an app's
+``tasks.py``) off the request thread. With ``CELERY_BROKER_URL`` set it is
+sent to the Celery workers; without one it runs on a small in-process
+thread pool, so development and single-server deployments need no broker.
+Set ``BACKGROUND_TASKS_EAGER = True`` to run jobs inline instead (the test
+runner does, and it's useful in management commands).
+
+Queue time, run time and outcome of every task are recorded in the
+``task_*`` metrics either way.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import TASK_DURATION, TASK_QUEUE_SECONDS, TASKS_COMPLETED, TASKS_ENQUEUED
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_captured = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.BACKGROUND_TASK_WORKERS,
+                    thread_name_prefix='background',
+                )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background job %s failed', getattr(func, '__name__', func))
+        raise
+    finally:
+        # Worker threads own their connections; don't leak them between jobs
+        connections.close_all()
+
+
+def submit(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the thread pool (or inline in eager mode)."""
+    if _captured is not None:
+        _captured.append(partial(func, *args, **kwargs))
+        return None
+    if settings.BACKGROUND_TASKS_EAGER:
+        return func(*args, **kwargs)
+    return get_executor().submit(_run, func, args, kwargs)
+
+
+def uses_celery():
+    return bool(settings.CELERY_BROKER_URL) and not settings.BACKGROUND_TASKS_EAGER
+
+
+def enqueue(task, *args, **kwargs):
+    """Run the Celery ``task`` with these arguments in the background; they must be JSON-serializable."""
+    TASKS_ENQUEUED.inc(task=task.name)
+    if uses_celery():
+        return task.apply_async(args, kwargs, headers={'enqueued_at': time.time()})
+    return submit(run_task, task, time.time(), args, kwargs)
+
+
+def task_started(name, enqueued_at):
+    if enqueued_at is not None:
+        TASK_QUEUE_SECONDS.observe(max(time.time() - enqueued_at, 0), task=name)
+
+
+def task_finished(name, seconds, succeeded):
+    TASK_DURATION.observe(seconds, task=name)
+    TASKS_COMPLETED.inc(task=name, result='succeeded' if succeeded else 'failed')
+
+
+def run_task(task, enqueued_at, args, kwargs):
+    """Run ``task`` in this thread, recording its metrics as a Celery worker would."""
+    task_started(task.name, enqueued_at)
+    started = time.perf_counter()
+    succeeded = False
+    try:
+        result = task(*args, **kwargs)
+        succeeded = True
+        return result
+    finally:
+        task_finished(task.name, time.perf_counter() - started, succeeded)
+
+
+@contextmanager
+def captured():
+    """Hold jobs submitted inside the block instead of running them; yields them as callables."""
+    global _captured
+    previous, _captured = _captured, []
+    try:
+        yield _captured
+    finally:
+        _captured = previous
+
+
+def shutdown(wait=True):
+    """Stop the pool after queued jobs finish; the next ``submit`` starts a new one."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
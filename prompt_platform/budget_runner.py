@@ -0,0 +1,301 @@
+"""
+Test runner plugin that enforces view query budgets.
+
+``QueryBudgetTestRunner`` adds a check to the test suite that requests every
+URL in ``QUERY_BUDGET_URLCONFS`` against seeded data at two sizes. It fails
+when a view runs more queries than its budget, or when its query count
+grows with the amount of data (an N+1). It also adds the index usage check
+from ``prompt_platform.query_plans``, and runs background tasks eagerly.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from payments.models import Payment
+from prompts import cache as object_cache
+from prompts.bulk import create_job, run_bulk_action
+from prompts.models import (
+    Category, Prompt, PromptAnalytics, PromptDownload, PromptPurchase, Review, Tag, UserFavorite,
+)
+
+from . import background
+from .query_budget import get_query_budget, iter_url_names
+from .query_plans import QueryPlanTests
+
+User = get_user_model()
+
+# Rows of each kind created per step; both must stay below the page size
+# of paginated views, otherwise pagination hides per-row queries.
+SMALL_SIZE = 2
+LARGE_SIZE = 8
+
+
+class BudgetData:
+    """
+    Seed data that can be grown step by step.
+
+    A creator owns ``size`` published prompts; a buyer has downloaded,
+    purchased, paid for, favorited and reviewed each of them; ``size``
+    reviewers have reviewed the first prompt.
+    """
+
+    def __init__(self):
+        self.category = Category.objects.create(name='Budget Category', slug='budget-category')
+        self.tags = [
+            Tag.objects.create(name=f'budget-tag-{i}', slug=f'budget-tag-{i}')
+            for i in range(4)
+        ]
+        self.creator = User.objects.create_user(
+            username='budget-creator', email='creator@example.com', password='password', is_creator=True
+        )
+        self.buyer = User.objects.create_user(
+            username='budget-buyer', email='buyer@example.com', password='password'
+        )
+        self.prompts = []
+        self.payments = []
+
+    @property
+    def prompt(self):
+        return self.prompts[0]
+
+    def grow(self, size):
+        today = timezone.localdate()
+        for i in range(len(self.prompts), size):
+            prompt = Prompt.objects.create(
+                title=f'Budget prompt {i}',
+                description=f'Budget prompt {i} description',
+                content='Write a budget report',
+                preview_content='A budget report',
+                author=self.creator,
+                category=self.category,
+                price_type='paid',
+                price=5,
+                status='published',
+            )
+            prompt.tags.set(self.tags)
+            self.prompts.append(prompt)
+
+            PromptDownload.objects.create(prompt=prompt, user=self.buyer)
+            PromptPurchase.objects.create(
+                prompt=prompt, user=self.buyer, amount=5, payment_status='completed',
+                stripe_payment_intent_id=f'pi_budget_{i}',
+            )
+            self.payments.append(Payment.objects.create(
+                user=self.buyer, prompt=prompt, amount=5, status='completed',
+                stripe_payment_intent_id=f'pi_budget_{i}', completed_at=timezone.now(),
+            ))
+            UserFavorite.objects.create(prompt=prompt, user=self.buyer)
+            Review.objects.create(prompt=prompt, user=self.buyer, rating=5, title='Great', comment='Great')
+            PromptAnalytics.objects.create(prompt=prompt, date=today, views=10, downloads=1, purchases=1, revenue=5)
+
+            reviewer = User.objects.create_user(username=f'budget-reviewer-{i}', email=f'reviewer{i}@example.com')
+            Review.objects.create(prompt=self.prompt, user=reviewer, rating=4, title='Good', comment='Good')
+
+        # Start every measurement from the same state: the first prompt favorited
+        UserFavorite.objects.get_or_create(prompt=self.prompt, user=self.buyer)
+        # A finished bulk job for the status endpoint to report on
+        self.job_id = create_job(self.creator, 'publish', len(self.prompts)).pk
+        run_bulk_action(self.creator, 'publish', [prompt.pk for prompt in self.prompts], job_id=self.job_id)
+
+
+class BudgetCase:
+    """
+    How to request one URL name: as which user, with which method and data,
+    and the status code a working view answers with.
+    """
+
+    def __init__(self, url_name, kwargs=None, method='GET', data=None, user='creator', query='', status=200):
+        self.url_name = url_name
+        self.status = status
+        self.kwargs = kwargs or (lambda data: {})
+        self.method = method
+        self.data = data or (lambda data: {})
+        self.user = user
+        self.query = query
+
+
+BUDGET_CASES = [
+    BudgetCase('prompts:prompt_list', user=None),
+    BudgetCase('prompts:prompt_create'),
+    BudgetCase('prompts:search_prompts', user=None, query='q=budget'),
+    BudgetCase('prompts:api_search', user=None, query='q=budget'),
+    BudgetCase('prompts:user_dashboard'),
+    BudgetCase('prompts:analytics_dashboard'),
+    BudgetCase('prompts:export_prompts', query='format=json'),
+    BudgetCase('prompts:import_prompts'),
+    BudgetCase(
+        'prompts:bulk_prompt_action',
+        method='POST',
+        data=lambda data: {'action': 'publish', 'prompt_ids': ','.join(str(p.pk) for p in data.prompts)},
+    ),
+    BudgetCase('prompts:bulk_action_status', kwargs=lambda data: {'job_id': data.job_id}),
+    BudgetCase('prompts:category_detail', user=None, kwargs=lambda data: {'slug': data.category.slug}),
+    BudgetCase('prompts:tag_detail', user=None, kwargs=lambda data: {'slug': data.tags[0].slug}),
+    BudgetCase('prompts:prompt_detail', user='buyer', kwargs=lambda data: {'slug': data.prompt.slug}),
+    BudgetCase('prompts:prompt_update', kwargs=lambda data: {'slug': data.prompt.slug}),
+    BudgetCase('prompts:prompt_delete', kwargs=lambda data: {'slug': data.prompt.slug}),
+    BudgetCase('prompts:download_prompt', user='buyer', kwargs=lambda data: {'slug': data.prompt.slug}, status=302),
+    BudgetCase('prompts:purchase_prompt', user='buyer', kwargs=lambda data: {'slug': data.prompt.slug}, status=302),
+    BudgetCase('prompts:add_review', user='buyer', kwargs=lambda data: {'slug': data.prompt.slug}, status=302),
+    BudgetCase(
+        'prompts:toggle_favorite', user='buyer', method='POST',
+        kwargs=lambda data: {'slug': data.prompt.slug},
+    ),
+    # The author cannot buy their own prompt, so no Stripe call is made
+    BudgetCase('payments:create_payment', kwargs=lambda data: {'prompt_id': data.prompt.pk}, status=302),
+    BudgetCase(
+        'payments:payment_success', user='buyer', status=302,
+        kwargs=lambda data: {'payment_id': data.payments[0].pk},
+    ),
+    BudgetCase(
+        'payments:payment_cancel', user='buyer', status=302,
+        kwargs=lambda data: {'payment_id': data.payments[0].pk},
+    ),
+    # Unsigned, so rejected before anything is stored
+    BudgetCase('payments:stripe_webhook', user=None, method='POST', status=400),
+    BudgetCase('payments:payment_history', user='buyer'),
+    # Buyers are not creators, so no Stripe call is made
+    BudgetCase('payments:connect_stripe_account', user='buyer', status=302),
+    BudgetCase('payments:connect_stripe_return', user='buyer', status=302),
+]
+
+
+def measure(case, data, clients):
+    """Run ``case`` once and return ``(query count, status code, sql)``."""
+    client = clients.get(case.user)
+    if client is None:
+        client = Client(raise_request_exception=False)
+        if case.user is not None:
+            client.force_login(getattr(data, case.user))
+        clients[case.user] = client
+
+    path = reverse(case.url_name, kwargs=case.kwargs(data))
+    if case.query:
+        path = f'{path}?{case.query}'
+
+    # Budgets hold for a cold object cache
+    object_cache.clear()
+
+    # Error reports render querysets from the traceback; those queries are not the view's
+    logging.disable(logging.CRITICAL)
+    try:
+        # Background tasks the view enqueues are not part of its budget; run them afterwards
+        with background.captured() as jobs, CaptureQueriesContext(connection) as queries:
+            if case.method == 'POST':
+                response = client.post(path, case.data(data))
+            else:
+                response = client.get(path)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        for job in jobs:
+            job()
+    finally:
+        logging.disable(logging.NOTSET)
+    return len(queries), response.status_code, [query['sql'] for query in queries]
+
+
+def check_query_budgets(cases=None, urlconfs=None):
+    """
+    Measure every URL at ``SMALL_SIZE`` and ``LARGE_SIZE`` and return a list of failures.
+
+    Needs a test database; ``QueryBudgetTests`` provides one.
+    """
+    cases = {case.url_name: case for case in (cases or BUDGET_CASES)}
+    urlconfs = urlconfs or settings.QUERY_BUDGET_URLCONFS
+
+    failures = []
+    views = {}
+    for urlconf in urlconfs:
+        for url_name, view in iter_url_names(urlconf):
+            budget = get_query_budget(url_name, view)
+            if budget is None:
+                failures.append(f'{url_name}: no query budget declared')
+            elif url_name not in cases:
+                failures.append(f'{url_name}: no budget case to exercise it')
+            else:
+                views[url_name] = budget
+
+    data = BudgetData()
+    counts = {}
+    for size in (SMALL_SIZE, LARGE_SIZE):
+        data.grow(size)
+        clients = {}
+        for url_name in views:
+            counts.setdefault(url_name, []).append(measure(cases[url_name], data, clients))
+
+    for url_name, budget in views.items():
+        (small, small_status, _), (large, status, large_sql) = counts[url_name]
+        # A view that errors stops before rendering, so its query count says nothing
+        expected = cases[url_name].status
+        if small_status != expected or status != expected:
+            failures.append(
+                f'{url_name}: HTTP {small_status} for {SMALL_SIZE} rows and {status} for {LARGE_SIZE}, '
+                f'expected {expected}'
+            )
+            continue
+        if large > budget:
+            failures.append(
+                f'{url_name}: {large} queries (HTTP {status}) exceeds budget of {budget}\n  '
+                + '\n  '.join(large_sql)
+            )
+        if large > small:
+            failures.append(
+                f'{url_name}: query count grows with data ({small} queries for {SMALL_SIZE} rows, '
+                f'{large} for {LARGE_SIZE})\n  ' + '\n  '.join(large_sql)
+            )
+    return failures
+
+
+class QueryBudgetTests(TestCase):
+    def test_query_budgets(self):
+        failures = check_query_budgets()
+        self.assertFalse(failures, '\n'.join(failures))
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """``DiscoverRunner`` that also runs the query budget and query plan checks."""
+
+    def __init__(self, skip_query_budgets=False, skip_query_plans=False, **kwargs):
+        super().__init__(**kwargs)
+        self.skip_query_budgets = skip_query_budgets
+        self.skip_query_plans = skip_query_plans
+
+    @classmethod
+    def add_arguments(cls, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--skip-query-budgets',
+            action='store_true',
+            help='Do not run the view query budget check.',
+        )
+        parser.add_argument(
+            '--skip-query-plans',
+            action='store_true',
+            help='Do not run the hot query index usage check.',
+        )
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        # Tests run background tasks inline, never on a broker or the thread pool
+        self._eager_tasks = override_settings(BACKGROUND_TASKS_EAGER=True)
+        self._eager_tasks.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._eager_tasks.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def build_suite(self, *args, **kwargs):
+        suite = super().build_suite(*args, **kwargs)
+        if not self.skip_query_budgets:
+            suite.addTest(QueryBudgetTests('test_query_budgets'))
+        if not self.skip_query_plans:
+            suite.addTest(QueryPlanTests('test_query_plans'))
+        return suite
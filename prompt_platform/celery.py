@@ -0,0 +1,54 @@
+"""
+Celery application.
+
+Tasks live in each app's ``tasks.py`` and are enqueued with
+``prompt_platform.background.enqueue``, which uses Celery when
+``CELERY_BROKER_URL`` is set. Periodic tasks are listed in
+``CELERY_BEAT_SCHEDULE``. Run the workers and the scheduler with::
+
+    celery -A prompt_platform worker -l info
+    celery -A prompt_platform beat -l info
+"""
+import os
+import time
+
+from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'prompt_platform.settings')
+
+app = Celery('prompt_platform')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+
+_started = {}
+
+
+@task_prerun.connect
+def record_task_start(task_id, task, **kwargs):
+    # Imported here: this module is loaded with the package, before Django is set up
+    from .background import task_started
+
+    # enqueue() sends the time as a message header, which Celery exposes on the request
+    task_started(task.name, getattr(task.request, 'enqueued_at', None))
+    _started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def record_task_end(task_id, task, state=None, **kwargs):
+    from .background import task_finished
+    from .metrics import maybe_flush
+
+    started = _started.pop(task_id, None)
+    if started is not None:
+        task_finished(task.name, time.perf_counter() - started, state == 'SUCCESS')
+    maybe_flush()
+
+
+@worker_process_shutdown.connect
+def retire_metrics(**kwargs):
+    from .metrics import flush, mark_process_dead
+
+    # A pool process is going away: fold its counts in with the other exited workers
+    flush()
+    mark_process_dead(os.getpid())
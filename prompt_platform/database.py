@@ -0,0 +1,72 @@
+"""
+Database profiles.
+
+``database_config`` turns a ``DATABASE_URL`` into a ``DATABASES`` entry
+tuned for its engine:
+
+* SQLite: WAL journaling, so readers don't block the writer and the writer
+  doesn't block readers; ``synchronous=NORMAL``, which is durable in WAL
+  mode and syncs at checkpoints instead of every commit; a memory-mapped
+  database file; a busy timeout, so concurrent writers wait for the lock
+  instead of failing with "database is locked"; and ``BEGIN IMMEDIATE``
+  transactions, so they wait rather than fail when upgrading a read lock.
+  The PRAGMAs and the transaction mode are applied by the backend in
+  ``prompt_platform.backends.sqlite3``.
+* PostgreSQL: persistent connections (``CONN_MAX_AGE``) checked before
+  reuse, and server-side cursors for ``QuerySet.iterator()``, so exports and
+  batch jobs stream rows instead of loading them all.
+
+``BASELINE_OVERRIDES`` restores each engine's stock behaviour; the
+``benchmark_db`` command compares the two.
+"""
+from pathlib import Path
+
+import environ
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'temp_store': 'MEMORY',
+}
+
+# Stock settings, for comparison
+BASELINE_OVERRIDES = {
+    'sqlite': {
+        'CONN_MAX_AGE': 0,
+        'OPTIONS': {},
+        'PRAGMAS': {'journal_mode': 'DELETE', 'synchronous': 'FULL', 'mmap_size': 0, 'temp_store': 'DEFAULT'},
+    },
+    'postgresql': {
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': False,
+    },
+}
+
+
+def database_config(url, base_dir=None, conn_max_age=600, sqlite_busy_timeout=5.0,
+                    sqlite_mmap_size=256 * 1024 * 1024, server_side_cursors=True, connect_timeout=5):
+    """A ``DATABASES`` entry for ``url`` with its engine's profile applied."""
+    config = environ.Env.db_url_config(url)
+    engine = config['ENGINE']
+
+    if engine == 'django.db.backends.sqlite3':
+        name = config['NAME']
+        if base_dir is not None and name != ':memory:' and not Path(name).is_absolute():
+            config['NAME'] = str(Path(base_dir) / name)
+        config.update({
+            'ENGINE': 'prompt_platform.backends.sqlite3',
+            'CONN_MAX_AGE': conn_max_age,
+            # Seconds to wait for a lock; sqlite3 turns this into the busy timeout
+            'OPTIONS': {'timeout': sqlite_busy_timeout, 'transaction_mode': 'IMMEDIATE'},
+            'PRAGMAS': {**SQLITE_PRAGMAS, 'mmap_size': sqlite_mmap_size},
+        })
+    elif engine in ('django.db.backends.postgresql', 'django.contrib.gis.db.backends.postgis'):
+        config.update({
+            'CONN_MAX_AGE': conn_max_age,
+            'CONN_HEALTH_CHECKS': True,
+            # Must be turned off behind a transaction-pooling pgbouncer
+            'DISABLE_SERVER_SIDE_CURSORS': not server_side_cursors,
+            'OPTIONS': {'connect_timeout': connect_timeout},
+        })
+    return config
+
@@ -0,0 +1,445 @@
+"""
+In-process metrics in Prometheus text format.
+
+Counters and histograms are aggregated without locks on the hot path: each
+thread updates its own shard, and shards are merged when metrics are read.
+Under gunicorn, point ``PROMETHEUS_MULTIPROC_DIR`` at a directory shared by
+the workers; each worker writes its snapshot there every
+``METRICS_FLUSH_INTERVAL`` seconds (and at exit), and ``/metrics`` merges all
+worker files, so a scrape sees the whole server whichever worker answers it.
+
+Files are named by process id and start time, so a reused PID never
+overwrites another worker's counts. When a worker exits, the process manager
+calls ``mark_process_dead`` (gunicorn does it from ``child_exit`` in
+``gunicorn.conf.py``), which folds the worker's file into ``dead-workers.json``
+and deletes it.
+"""
+import atexit
+import glob
+try:
+    import fcntl
+except ImportError:  # Windows: no multiprocess servers to coordinate
+    fcntl = None
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = {}
+
+_local = threading.local()
+_shards = []  # (thread, shard) pairs
+_retired = {}  # merged shards of finished threads
+_shards_lock = threading.Lock()
+_state = {'pending': 0, 'next_flush': 0.0}
+_process = {'pid': None, 'started': None}
+
+DEAD_WORKERS_FILE = 'dead-workers.json'
+
+
+def _new_shard():
+    shard = {}
+    with _shards_lock:
+        _shards.append((threading.current_thread(), shard))
+    _local.shard = shard
+    return shard
+
+
+def _shard():
+    try:
+        return _local.shard
+    except AttributeError:
+        return _new_shard()
+
+
+def _merge_value(kind, current, value):
+    if current is None:
+        return list(value) if kind == 'histogram' else value
+    if kind == 'histogram':
+        return [a + b for a, b in zip(current, value)]
+    return current + value
+
+
+def _merge_into(target, shard):
+    # dict(shard) is a C-level copy, safe while the owning thread keeps writing
+    for key, value in dict(shard).items():
+        target[key] = _merge_value(REGISTRY[key[0]].kind, target.get(key), value)
+
+
+def snapshot():
+    """This process's metric values as ``{(name, label values): value}``."""
+    with _shards_lock:
+        live = []
+        for thread, shard in _shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                _merge_into(_retired, shard)
+        _shards[:] = live
+        values = {}
+        _merge_into(values, _retired)
+        for _, shard in live:
+            _merge_into(values, shard)
+    return values
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; the parent's values are its own
+    global _shards_lock
+    _shards_lock = threading.Lock()
+    _shards.clear()
+    _retired.clear()
+    _state['pending'] = 0
+    if hasattr(_local, 'shard'):
+        del _local.shard
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def _key(self, labels):
+        return self.name, tuple(str(labels[label]) for label in self.labelnames)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = _shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+        _state['pending'] += 1
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = _shard()
+        key = self._key(labels)
+        # Per-bucket counts (not cumulative), then +Inf, sum and count
+        values = shard.get(key)
+        if values is None:
+            values = shard[key] = [0] * (len(self.buckets) + 3)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+        _state['pending'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+
+# Requests
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by URL name.', ['view', 'method'],
+)
+REQUESTS = Counter('http_requests_total', 'Requests by URL name and status.', ['view', 'method', 'status'])
+DB_QUERIES = Histogram(
+    'db_queries_per_request', 'Database queries per request by URL name.', ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_QUERY_SECONDS = Counter('db_query_seconds_total', 'Time spent in database queries by URL name.', ['view'])
+
+# Caching and search
+CACHE_REQUESTS = Counter('cache_requests_total', 'Cache lookups by cache and result (hit or miss).', ['cache', 'result'])
+SEARCH_LATENCY = Histogram('search_duration_seconds', 'Time to run a prompt search.', ['endpoint'])
+
+# Payments
+STRIPE_API_LATENCY = Histogram('stripe_api_duration_seconds', 'Stripe API call latency.', ['operation'])
+STRIPE_API_ERRORS = Counter('stripe_api_errors_total', 'Failed Stripe API calls.', ['operation', 'error'])
+WEBHOOK_EVENTS = Counter(
+    'stripe_webhook_events_total',
+    'Webhook events by type and outcome (received, duplicate, processed, retried, failed).',
+    ['event_type', 'result'],
+)
+WEBHOOK_LAG = Histogram(
+    'stripe_webhook_lag_seconds', 'Delay between a Stripe event being created and processed.', ['event_type'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+# Background tasks; tasks_enqueued_total minus task_queue_seconds_count is the backlog
+TASKS_ENQUEUED = Counter('tasks_enqueued_total', 'Background tasks enqueued by task name.', ['task'])
+TASK_QUEUE_SECONDS = Histogram(
+    'task_queue_seconds', 'Time tasks waited between being enqueued and starting.', ['task'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300),
+)
+TASK_DURATION = Histogram('task_duration_seconds', 'Task run time.', ['task'])
+TASKS_COMPLETED = Counter(
+    'tasks_completed_total', 'Finished tasks by name and result (succeeded or failed).', ['task', 'result'],
+)
+
+
+def record_cache_lookup(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result='hit' if hit else 'miss')
+
+
+def _worker_file(directory):
+    pid = os.getpid()
+    if _process['pid'] != pid:
+        # First flush in this process, or the first since a fork
+        _process.update(pid=pid, started=time.time_ns())
+    return os.path.join(directory, f"metrics-{pid}-{_process['started']}.json")
+
+
+@contextmanager
+def _directory_lock(directory, exclusive=False):
+    """Keep ``mark_process_dead`` from moving counts while another process reads them."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _write_rows(path, values):
+    rows = [[name, list(labels), value] for (name, labels), value in values.items()]
+    with open(f'{path}.tmp', 'w') as f:
+        json.dump(rows, f)
+    os.replace(f'{path}.tmp', path)
+
+
+def _merge_file(values, path):
+    """Add the values in ``path`` to ``values``; False if it can't be read."""
+    try:
+        with open(path) as f:
+            rows = json.load(f)
+    except (OSError, ValueError):
+        return False
+    for name, labels, value in rows:
+        metric = REGISTRY.get(name)
+        if metric is None:
+            continue
+        key = (name, tuple(labels))
+        values[key] = _merge_value(metric.kind, values.get(key), value)
+    return True
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def flush():
+    """Write this worker's values to ``PROMETHEUS_MULTIPROC_DIR``, if configured."""
+    directory = settings.PROMETHEUS_MULTIPROC_DIR
+    _state['next_flush'] = time.monotonic() + settings.METRICS_FLUSH_INTERVAL
+    if not directory:
+        return
+    _state['pending'] = 0
+    _write_rows(_worker_file(directory), snapshot())
+
+
+def maybe_flush():
+    if time.monotonic() >= _state['next_flush']:
+        flush()
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold the files of the exited worker ``pid`` into ``DEAD_WORKERS_FILE`` and delete them."""
+    directory = directory or settings.PROMETHEUS_MULTIPROC_DIR
+    if not directory or not os.path.isdir(directory):
+        return
+    with _directory_lock(directory, exclusive=True):
+        paths = glob.glob(os.path.join(directory, f'metrics-{pid}-*.json'))
+        if not paths:
+            return
+        archive = os.path.join(directory, DEAD_WORKERS_FILE)
+        values = {}
+        _merge_file(values, archive)
+        for path in paths:
+            _merge_file(values, path)
+        _write_rows(archive, values)
+        for path in paths:
+            os.remove(path)
+
+
+def collect():
+    """Merged values of every worker (or just this process without a multiprocess dir)."""
+    directory = settings.PROMETHEUS_MULTIPROC_DIR
+    if not directory:
+        # Values are read straight from memory; nothing is waiting to be written
+        return snapshot(), 0, 0.0
+
+    backlog = _state['pending']
+    flush()
+    values = {}
+    oldest = time.time()
+    with _directory_lock(directory):
+        _merge_file(values, os.path.join(directory, DEAD_WORKERS_FILE))
+        for path in glob.glob(os.path.join(directory, 'metrics-*-*.json')):
+            if not _merge_file(values, path):
+                continue
+            # Files of workers that exited without mark_process_dead don't go stale
+            pid = int(os.path.basename(path).split('-')[1])
+            if _pid_alive(pid):
+                oldest = min(oldest, os.path.getmtime(path))
+    return values, backlog, time.time() - oldest
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    values, backlog, flush_age = collect()
+    samples = {}
+    for (name, labels), value in values.items():
+        samples.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for labels, value in sorted(samples.get(name, [])):
+            if metric.kind == 'counter':
+                lines.append(f'{name}{_labels(metric.labelnames, labels)} {value}')
+                continue
+            cumulative = 0
+            for bound, count in zip(metric.buckets + ('+Inf',), value):
+                cumulative += count
+                le = [('le', bound if bound == '+Inf' else float(bound))]
+                lines.append(f'{name}_bucket{_labels(metric.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(metric.labelnames, labels)} {value[-2]}')
+            lines.append(f'{name}_count{_labels(metric.labelnames, labels)} {value[-1]}')
+
+    lines.append('# HELP metrics_flush_backlog Updates this worker had not yet written to its metrics file.')
+    lines.append('# TYPE metrics_flush_backlog gauge')
+    lines.append(f'metrics_flush_backlog {backlog}')
+    lines.append('# HELP metrics_flush_age_seconds Age of the stalest metrics file of a running worker.')
+    lines.append('# TYPE metrics_flush_age_seconds gauge')
+    lines.append(f'metrics_flush_age_seconds {flush_age:.3f}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryCounter:
+    """``execute_wrapper`` hook that counts queries and their total time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def _wrap_connections(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class MetricsMiddleware:
+    """Record latency, status and query counts per URL name."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.get_response = get_response
+        self.multiprocess = bool(settings.PROMETHEUS_MULTIPROC_DIR)
+        if self.multiprocess:
+            os.makedirs(settings.PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+            atexit.register(flush)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            _wrap_connections(stack, queries)
+            response = self.get_response(request)
+        self.observe(request, response, queries, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        # Under ASGI a request's queries run on its sync thread, so wrap the connections there
+        with ExitStack() as stack:
+            await sync_to_async(_wrap_connections)(stack, queries)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        self.observe(request, response, queries, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, queries, elapsed):
+        # URL names keep label cardinality bounded; raw paths would not
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        REQUEST_LATENCY.observe(elapsed, view=view, method=request.method)
+        REQUESTS.inc(view=view, method=request.method, status=response.status_code)
+        DB_QUERIES.observe(queries.count, view=view)
+        DB_QUERY_SECONDS.inc(queries.seconds, view=view)
+        if self.multiprocess:
+            maybe_flush()
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for staff sessions and for requests with
+    ``Authorization: Bearer <METRICS_TOKEN>`` once a token is set.
+    """
+    token = settings.METRICS_TOKEN
+    authorized = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
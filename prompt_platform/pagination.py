@@ -0,0 +1,152 @@
+"""
+Pagination for large tables.
+
+``Paginator`` counts the rows and skips with OFFSET, so the deeper the page
+and the longer the history, the slower it gets. ``CursorPaginator`` walks a
+queryset newest first by ``(field, pk)`` instead: a page is a seek on an
+index over those columns plus LIMIT, the same cost on page one as on page
+one thousand. Pages are addressed by opaque ``after``/``before`` cursors
+rather than numbers.
+
+Where page numbers are needed (the admin), ``EstimatedCountPaginator`` keeps
+them but takes the row count of big tables from the database's estimate
+instead of a ``COUNT(*)`` over millions of rows.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max, Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+
+def encode_cursor(value, pk):
+    data = json.dumps([value.isoformat(), pk]).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(datetime, pk)`` for a cursor, or None if it is malformed."""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, pk = json.loads(data)
+        value = parse_datetime(value)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if value is None or not isinstance(pk, int):
+        return None
+    return value, pk
+
+
+class CursorPage:
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def next_cursor(self):
+        return self.paginator.cursor_for(self.object_list[-1]) if self.has_next else None
+
+    def previous_cursor(self):
+        return self.paginator.cursor_for(self.object_list[0]) if self.has_previous else None
+
+
+class CursorPaginator:
+    """Paginate ``queryset`` newest first by ``(field, pk)``; index those columns."""
+
+    def __init__(self, queryset, per_page, field='created_at'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.field = field
+
+    def cursor_for(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def get_page(self, after=None, before=None):
+        """
+        The page of older rows following cursor ``after``, of newer rows
+        preceding cursor ``before``, or the newest rows. Malformed cursors
+        give the newest rows, like ``Paginator.get_page`` does for bad numbers.
+        """
+        after = decode_cursor(after) if after else None
+        before = decode_cursor(before) if before else None
+        field = self.field
+
+        if before is not None:
+            value, pk = before
+            rows = list(
+                self.queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+                .order_by(field, 'pk')[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page][::-1], self, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset
+        if after is not None:
+            value, pk = after
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}))
+        rows = list(queryset.order_by(f'-{field}', '-pk')[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next=has_next, has_previous=after is not None)
+
+
+def estimate_count(queryset):
+    """
+    The database's estimate of ``queryset.count()``, or None where it has none.
+
+    PostgreSQL: the table's ``pg_class.reltuples`` when unfiltered, otherwise
+    the planner's row estimate. SQLite: the highest primary key when
+    unfiltered, which overcounts only by the rows deleted.
+    """
+    connection = connections[queryset.db]
+    filtered = bool(queryset.query.where) or queryset.query.distinct
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            if not filtered:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(queryset.model._meta.db_table)],
+                )
+                row = cursor.fetchone()
+            else:
+                sql, params = queryset.order_by().query.sql_with_params()
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                row = (plan[0]['Plan']['Plan Rows'],)
+        # reltuples is -1 until the table is first analyzed
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'sqlite' and not filtered:
+        table = queryset.model._base_manager.using(queryset.db)
+        return table.aggregate(highest=Max('pk'))['highest'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A ``Paginator`` that trusts ``estimate_count`` once it reaches
+    ``ESTIMATED_COUNT_THRESHOLD`` rows; smaller results are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        if isinstance(self.object_list, QuerySet):
+            estimate = estimate_count(self.object_list)
+            if estimate is not None and estimate >= settings.ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
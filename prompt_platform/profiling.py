@@ -0,0 +1,238 @@
+"""
+Opt-in request profiling.
+
+With ``REQUEST_PROFILING = True``, ``RequestProfilingMiddleware`` profiles a
+``REQUEST_PROFILING_SAMPLE_RATE`` fraction of requests and records the view
+name, total time, template render time, query count, total SQL time, the
+slowest queries with the line of project code that issued them, and
+repeated queries (N+1 candidates). Profiles go to a per-process ring buffer,
+readable by staff at ``profiling_report``, and optionally to the
+``prompt_platform.profiling`` logger as one JSON document per request.
+Query parameters are only recorded with ``DEBUG`` on.
+
+When profiling is disabled the middleware raises ``MiddlewareNotUsed`` and
+Django drops it from the chain, so it costs nothing.
+"""
+import json
+import logging
+import random
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+_buffer = deque(maxlen=200)
+_buffer_lock = threading.Lock()
+_template_hook_installed = False
+
+# Frames that are on every stack and say nothing about where a query came from
+_ENTRY_POINTS = ('manage.py', 'wsgi.py', 'asgi.py')
+
+
+def _query_origin():
+    """``file:line in function`` of the innermost project frame on the stack."""
+    project_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()):
+        if frame.filename == __file__ or frame.filename.endswith(_ENTRY_POINTS):
+            continue
+        if frame.filename.startswith(project_dir):
+            return f'{frame.filename[len(project_dir) + 1:]}:{frame.lineno} in {frame.name}'
+    return ''
+
+
+class RequestProfile:
+    def __init__(self):
+        self.queries = []
+        # (sql, hash of params) per query; the params themselves are kept only under DEBUG
+        self.keys = []
+        self.template_seconds = 0.0
+        self.templates = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            origin = _query_origin()
+            if self.templates:
+                # Querysets evaluated lazily by the template
+                origin = f'{origin} (rendering {self.templates[-1]})'.lstrip()
+            query = {
+                'sql': sql,
+                'ms': (time.perf_counter() - started) * 1000,
+                'alias': context['connection'].alias,
+                'origin': origin,
+            }
+            # Parameters carry emails, tokens and the like; profiles are logged and shown to staff
+            if settings.DEBUG:
+                query['params'] = repr(params)[:200]
+            self.queries.append(query)
+            self.keys.append((sql, hash(repr(params))))
+
+    def summary(self, request, response, total_seconds):
+        slow_count = settings.REQUEST_PROFILING_SLOW_QUERIES
+        similar = Counter(query['sql'] for query in self.queries)
+        repeated = Counter(self.keys)
+        origins = {}
+        firsts = {}
+        for query, key in zip(self.queries, self.keys):
+            origins.setdefault(query['sql'], query['origin'])
+            firsts.setdefault(key, query)
+        duplicates = []
+        for key, count in repeated.most_common():
+            if count > 1:
+                duplicate = {'sql': key[0], 'count': count}
+                if 'params' in firsts[key]:
+                    duplicate['params'] = firsts[key]['params']
+                duplicates.append(duplicate)
+
+        match = request.resolver_match
+        return {
+            'timestamp': time.time(),
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            'total_ms': round(total_seconds * 1000, 3),
+            'template_ms': round(self.template_seconds * 1000, 3),
+            'query_count': len(self.queries),
+            'sql_ms': round(sum(query['ms'] for query in self.queries), 3),
+            'slowest_queries': [
+                dict(query, ms=round(query['ms'], 3))
+                for query in sorted(self.queries, key=lambda query: query['ms'], reverse=True)[:slow_count]
+            ],
+            # Same SQL with different parameters: usually a query inside a loop
+            'similar_queries': [
+                {'sql': sql, 'count': count, 'origin': origins[sql]}
+                for sql, count in similar.most_common() if count > 1
+            ],
+            # Same SQL and parameters: the result could have been reused
+            'duplicate_queries': duplicates,
+        }
+
+
+def _install_template_hook():
+    """Time top-level ``Template.render`` calls for the profiled request, if any."""
+    global _template_hook_installed
+    if _template_hook_installed:
+        return
+    original_render = Template.render
+
+    def render(self, context):
+        profile = _current.get()
+        if profile is None:
+            return original_render(self, context)
+        profile.templates.append(self.name or '<string>')
+        started = time.perf_counter()
+        try:
+            return original_render(self, context)
+        finally:
+            profile.templates.pop()
+            # Included and extended templates render inside their parent
+            if not profile.templates:
+                profile.template_seconds += time.perf_counter() - started
+
+    Template.render = render
+    _template_hook_installed = True
+
+
+def record(entry):
+    with _buffer_lock:
+        _buffer.append(entry)
+    if settings.REQUEST_PROFILING_LOG:
+        logger.info(json.dumps(entry))
+
+
+def recent_profiles():
+    """Buffered profiles of this process, newest first."""
+    with _buffer_lock:
+        return list(reversed(_buffer))
+
+
+def _wrap_connections(stack, wrapper):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+
+
+class RequestProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        global _buffer
+        if _buffer.maxlen != settings.REQUEST_PROFILING_BUFFER_SIZE:
+            _buffer = deque(_buffer, maxlen=settings.REQUEST_PROFILING_BUFFER_SIZE)
+        _install_template_hook()
+        self.get_response = get_response
+        self.sample_rate = settings.REQUEST_PROFILING_SAMPLE_RATE
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                _wrap_connections(stack, profile)
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        # Streaming responses are generated after this point and are not included
+        record(profile.summary(request, response, time.perf_counter() - started))
+        return response
+
+    async def __acall__(self, request):
+        if random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            # Under ASGI a request's queries run on its sync thread, so wrap the connections there
+            with ExitStack() as stack:
+                await sync_to_async(_wrap_connections)(stack, profile)
+                try:
+                    response = await self.get_response(request)
+                finally:
+                    await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        record(profile.summary(request, response, time.perf_counter() - started))
+        return response
+
+
+@staff_member_required
+def profiling_report(request):
+    """Recent request profiles as JSON; filter with ``?view=`` and ``?limit=``."""
+    profiles = recent_profiles()
+    view_name = request.GET.get('view')
+    if view_name:
+        profiles = [profile for profile in profiles if profile['view'] == view_name]
+    try:
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        limit = 50
+    return JsonResponse({'enabled': settings.REQUEST_PROFILING, 'profiles': profiles[:limit]})
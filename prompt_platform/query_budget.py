@@ -0,0 +1,47 @@
+"""
+Query budgets for views.
+
+Each view declares the most queries one request may run, either with the
+``query_budget`` decorator or through the ``QUERY_BUDGETS`` setting (keyed
+by URL name, overriding the decorator). The check that enforces them lives
+in ``prompt_platform.budget_runner``.
+"""
+from importlib import import_module
+
+from django.conf import settings
+from django.urls import URLPattern, URLResolver
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of queries a view may run per request."""
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(url_name, view):
+    """The budget for ``view``: ``QUERY_BUDGETS[url_name]``, else the decorator's value."""
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    if url_name in budgets:
+        return budgets[url_name]
+    budget = getattr(view, 'query_budget', None)
+    if budget is None:
+        # Class-based views carry the decorator on the class
+        budget = getattr(getattr(view, 'view_class', None), 'query_budget', None)
+    return budget
+
+
+def iter_url_names(urlconf):
+    """Yield ``(namespaced url name, view)`` for every named pattern in ``urlconf``."""
+    module = import_module(urlconf)
+    namespace = getattr(module, 'app_name', None)
+
+    def walk(patterns, prefix):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                yield from walk(pattern.url_patterns, prefix)
+            elif isinstance(pattern, URLPattern) and pattern.name:
+                yield prefix + pattern.name, pattern.callback
+
+    yield from walk(module.urlpatterns, f'{namespace}:' if namespace else '')
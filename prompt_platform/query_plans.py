@@ -0,0 +1,134 @@
+"""
+Index usage checks for the hot queries.
+
+Each ``PlanCase`` is a query a hot view runs, with the index it must use.
+``check_query_plans`` asks the database to ``EXPLAIN`` every case and fails
+those whose plan doesn't mention their index, so a change to a query or an
+index that silently falls back to a table scan is caught by the test suite.
+The plans are taken on an empty test database: on PostgreSQL sequential
+scans are disabled for the check, since the planner would otherwise pick
+them for tables this small.
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from prompts.models import PUBLISHED, Prompt, PromptDownload, PromptPurchase, Review, UserFavorite
+
+# Any id will do: the tables are empty and only the plan matters
+SOME_ID = 1
+
+
+class PlanCase:
+    def __init__(self, name, queryset, index):
+        self.name = name
+        self.queryset = queryset
+        self.index = index
+
+
+def _catalog():
+    return Prompt.objects.filter(PUBLISHED).select_related('author', 'category')
+
+
+PLAN_CASES = [
+    PlanCase(
+        'catalog, newest first',
+        lambda: _catalog().order_by('-created_at')[:12],
+        'prompt_published_created_idx',
+    ),
+    PlanCase(
+        'catalog, cheapest first',
+        lambda: _catalog().order_by('price')[:12],
+        'prompt_published_price_idx',
+    ),
+    PlanCase(
+        'catalog, most expensive first',
+        lambda: _catalog().order_by('-price')[:12],
+        'prompt_published_price_idx',
+    ),
+    PlanCase(
+        'catalog, most popular first',
+        lambda: _catalog().order_by('-engagement_score')[:12],
+        'prompt_published_popular_idx',
+    ),
+    PlanCase(
+        'category page',
+        lambda: _catalog().filter(category_id=SOME_ID).order_by('-created_at')[:12],
+        'prompt_published_cat_idx',
+    ),
+    PlanCase(
+        "creator's prompts",
+        lambda: Prompt.objects.filter(author_id=SOME_ID).order_by('-created_at')[:10],
+        'prompt_author_created_idx',
+    ),
+    PlanCase(
+        "prompt's recent downloads",
+        lambda: PromptDownload.objects.filter(
+            prompt_id=SOME_ID, created_at__gte=timezone.now() - timedelta(days=7)
+        ).order_by('created_at'),
+        'download_prompt_created_idx',
+    ),
+    PlanCase(
+        "user's downloads",
+        lambda: PromptDownload.objects.filter(user_id=SOME_ID).order_by('-created_at')[:10],
+        'download_user_created_idx',
+    ),
+    PlanCase(
+        "user's purchases",
+        lambda: PromptPurchase.objects.filter(
+            user_id=SOME_ID, payment_status='completed'
+        ).order_by('-created_at')[:10],
+        'purchase_user_status_idx',
+    ),
+    PlanCase(
+        "prompt's earnings this month",
+        lambda: PromptPurchase.objects.filter(
+            prompt_id=SOME_ID, payment_status='completed', created_at__gte=timezone.now() - timedelta(days=30)
+        ).order_by(),
+        'purchase_prompt_status_idx',
+    ),
+    PlanCase(
+        "prompt's reviews",
+        lambda: Review.objects.filter(prompt_id=SOME_ID).order_by('-created_at')[:10],
+        'review_prompt_created_idx',
+    ),
+    PlanCase(
+        "user's favorites",
+        lambda: UserFavorite.objects.filter(user_id=SOME_ID).order_by('-created_at')[:10],
+        'favorite_user_created_idx',
+    ),
+]
+
+
+@contextmanager
+def _index_scans_preferred():
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+
+
+def check_query_plans(cases=None):
+    """``EXPLAIN`` every case and return a list of failures. Needs a test database."""
+    failures = []
+    with _index_scans_preferred():
+        for case in cases or PLAN_CASES:
+            plan = case.queryset().explain()
+            if case.index not in plan:
+                failures.append(f'{case.name}: does not use {case.index}\n  ' + plan.replace('\n', '\n  '))
+    return failures
+
+
+class QueryPlanTests(TestCase):
+    def test_query_plans(self):
+        failures = check_query_plans()
+        self.assertFalse(failures, '\n'.join(failures))
@@ -0,0 +1,122 @@
+"""
+Read replicas.
+
+Replicas are configured with ``DATABASE_REPLICA_URLS`` and show up in
+``DATABASES`` as ``replica1``, ``replica2``, ... (listed in
+``DATABASE_REPLICAS``). Reads go to a replica only inside views marked with
+``replica_reads`` (the public catalog and the dashboards) and only for safe
+requests; everything else, writes included, uses the primary.
+
+Replicas lag behind the primary, so a user who just wrote something would
+not see it on the next page. After an unsafe request (a POST such as
+``toggle_favorite``) or a view that calls ``stick_to_primary`` (writes
+triggered by a GET, such as the return from Stripe after a purchase),
+``ReplicaMiddleware`` sets a cookie that keeps that browser's reads on the
+primary for ``REPLICA_STICKY_SECONDS``.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+PRIMARY = 'default'
+
+# Read where they are written: a session missing from a lagging replica logs the user out
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_use_replicas = ContextVar('use_replicas', default=False)
+
+
+def replica_reads(view):
+    """Let ``view`` read from replicas; works on function and class-based views."""
+    view.replica_reads = True
+    return view
+
+
+def stick_to_primary(request):
+    """Keep this browser's reads on the primary for a while, as after a POST."""
+    request.stick_to_primary = True
+
+
+def _allows_replica_reads(view):
+    if getattr(view, 'replica_reads', False):
+        return True
+    return getattr(getattr(view, 'view_class', None), 'replica_reads', False)
+
+
+class ReplicaRouter:
+    """Route reads to a random replica while ``ReplicaMiddleware`` allows it."""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _use_replicas.get() or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in replicas:
+            # Related objects come from wherever the instance did
+            return instance._state.db
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.get_response = get_response
+        self.cookie_name = settings.REPLICA_STICKY_COOKIE
+        self.sticky_seconds = settings.REPLICA_STICKY_SECONDS
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.stick_to_primary = False
+        try:
+            response = self.get_response(request)
+        finally:
+            # process_view enabled replica reads for this request only
+            _use_replicas.set(False)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        request.stick_to_primary = False
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replicas.set(False)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if request.stick_to_primary or request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE'):
+            response.set_cookie(
+                self.cookie_name, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _use_replicas.set(
+            request.method in ('GET', 'HEAD')
+            and self.cookie_name not in request.COOKIES
+            and _allows_replica_reads(view_func)
+        )
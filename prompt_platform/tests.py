@@ -0,0 +1,233 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.http import HttpResponse
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+
+from prompts.models import Category, Prompt
+
+from . import metrics
+from .pagination import EstimatedCountPaginator, estimate_count
+from .profiling import RequestProfile
+from .replicas import ReplicaRouter, _use_replicas, stick_to_primary
+
+User = get_user_model()
+
+
+class MetricsViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            username='staff', email='staff@example.com', password='password', is_staff=True
+        )
+        cls.user = User.objects.create_user(username='user', email='user@example.com', password='password')
+
+    def scrape(self, **headers):
+        return self.client.get(reverse('metrics'), **headers).status_code
+
+    def test_anonymous_and_regular_users_are_refused_without_a_token(self):
+        self.assertEqual(self.scrape(), 403)
+        self.client.force_login(self.user)
+        self.assertEqual(self.scrape(), 403)
+
+    def test_staff_can_read_metrics(self):
+        self.client.force_login(self.staff)
+        self.assertEqual(self.scrape(), 200)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_bearer_token_is_accepted_once_set(self):
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer scrape-token'), 200)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer wrong'), 403)
+        self.assertEqual(self.scrape(HTTP_AUTHORIZATION='Bearer '), 403)
+
+
+class MultiprocessMetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.enterContext(override_settings(PROMETHEUS_MULTIPROC_DIR=self.directory))
+        exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+        exited.wait()
+        self.dead_pid = exited.pid
+
+    def write_worker(self, pid, started, hits, age=0):
+        path = os.path.join(self.directory, f'metrics-{pid}-{started}.json')
+        with open(path, 'w') as f:
+            json.dump([['cache_requests_total', ['merge-test', 'hit'], hits]], f)
+        if age:
+            os.utime(path, (os.path.getmtime(path) - age,) * 2)
+        return path
+
+    def hits(self):
+        values, _, flush_age = metrics.collect()
+        return values.get(('cache_requests_total', ('merge-test', 'hit')), 0), flush_age
+
+    def test_workers_are_merged_and_dead_ones_archived(self):
+        metrics.record_cache_lookup('merge-test', True)
+        own, _ = self.hits()
+        dead = self.write_worker(self.dead_pid, 1, 2, age=3600)
+        # The same PID reused by a later process keeps its own file
+        self.write_worker(self.dead_pid, 2, 5, age=3600)
+        self.write_worker(os.getppid(), 1, 3)
+
+        total, flush_age = self.hits()
+        self.assertEqual(total, own + 10)
+        # The exited worker's old files don't count as a stalled flush
+        self.assertLess(flush_age, 60)
+
+        metrics.mark_process_dead(self.dead_pid)
+
+        self.assertFalse(os.path.exists(dead))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, metrics.DEAD_WORKERS_FILE)))
+        self.assertEqual(self.hits()[0], own + 10)
+
+        # A second exit adds to the archive rather than replacing it
+        self.write_worker(self.dead_pid, 3, 4)
+        metrics.mark_process_dead(self.dead_pid)
+        self.assertEqual(self.hits()[0], own + 14)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_COOKIE='use_primary', REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='reader', email='reader@example.com', password='password')
+        category = Category.objects.create(name='Writing', slug='writing')
+        cls.prompt = Prompt.objects.create(
+            title='Cover letter', description='d', content='c', author=cls.user, category=category, status='published',
+        )
+
+    def setUp(self):
+        # The "replica" is the test database under a second alias, so it sees the test's rows
+        connections['replica1'] = connections['default']
+        self.addCleanup(delattr, connections._connections, 'replica1')
+        self.routed = []
+        db_for_read = ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            self.routed.append((model._meta.app_label, alias))
+            return alias
+
+        self.enterContext(mock.patch.object(ReplicaRouter, 'db_for_read', record))
+
+    def aliases(self, app_label=None):
+        return {alias for label, alias in self.routed if app_label in (None, label)}
+
+    def test_replica_reads_view_reads_from_the_replica(self):
+        response = self.client.get(reverse('prompts:prompt_list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('replica1', self.aliases('prompts'))
+        self.assertNotIn('use_primary', response.cookies)
+        self.assertFalse(_use_replicas.get())
+
+    def test_sessions_stay_on_the_primary(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('prompts:prompt_list'))
+
+        self.assertEqual(self.aliases('sessions'), {None})
+
+    def test_post_sets_the_sticky_cookie(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('prompts:toggle_favorite', args=[self.prompt.slug]))
+
+        cookie = response.cookies['use_primary']
+        self.assertEqual((cookie.value, cookie['max-age']), ('1', 10))
+
+    def test_stick_to_primary_sets_the_cookie_on_a_get(self):
+        def get(view, request, *args, **kwargs):
+            stick_to_primary(request)
+            return HttpResponse()
+
+        with mock.patch('prompts.views.PromptListView.get', get):
+            response = self.client.get(reverse('prompts:prompt_list'))
+
+        self.assertIn('use_primary', response.cookies)
+
+    def test_sticky_cookie_reads_from_the_primary(self):
+        self.client.cookies['use_primary'] = '1'
+        self.client.get(reverse('prompts:prompt_list'))
+
+        self.assertEqual(self.aliases(), {None})
+
+    async def test_async_requests_reset_replica_reads(self):
+        response = await AsyncClient().get(reverse('prompts:prompt_list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('replica1', self.aliases('prompts'))
+        self.assertFalse(_use_replicas.get())
+        self.assertIsNone(ReplicaRouter().db_for_read(Prompt))
+
+
+class EstimatedCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author', email='author@example.com', password='password')
+        category = Category.objects.create(name='Writing', slug='writing')
+        prompts = Prompt.objects.bulk_create([
+            Prompt(
+                title=f'Letter {index}', slug=f'letter-{index}', description='d', content='c', author=author,
+                category=category, status='published' if index % 2 else 'draft',
+            )
+            for index in range(6)
+        ])
+        # A gap in the ids makes the SQLite estimate (highest pk) differ from the real count
+        Prompt.objects.filter(pk=prompts[0].pk).delete()
+        cls.highest_pk = prompts[-1].pk
+
+    def test_sqlite_estimates_unfiltered_tables_from_the_highest_pk(self):
+        self.assertEqual(estimate_count(Prompt.objects.all()), self.highest_pk)
+        self.assertGreater(self.highest_pk, Prompt.objects.count())
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=1)
+    def test_estimate_is_used_at_the_threshold(self):
+        self.assertEqual(EstimatedCountPaginator(Prompt.objects.all(), 2).count, self.highest_pk)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=100000)
+    def test_small_tables_are_counted_exactly(self):
+        self.assertEqual(EstimatedCountPaginator(Prompt.objects.all(), 2).count, 5)
+
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=0)
+    def test_filtered_querysets_on_sqlite_are_counted_exactly(self):
+        published = Prompt.objects.filter(status='published')
+
+        self.assertIsNone(estimate_count(published))
+        self.assertIsNone(estimate_count(Prompt.objects.distinct()))
+        self.assertEqual(EstimatedCountPaginator(published, 2).count, 3)
+
+
+class RequestProfileTests(TestCase):
+    def profile(self, *params):
+        profile = RequestProfile()
+        with connections['default'].execute_wrapper(profile):
+            for email in params:
+                list(User.objects.filter(email=email))
+        request = mock.Mock(method='GET', path='/', resolver_match=None)
+        return profile.summary(request, HttpResponse(), 0.1)
+
+    @override_settings(DEBUG=False)
+    def test_params_are_left_out_unless_debug(self):
+        summary = self.profile('secret@example.com', 'secret@example.com', 'other@example.com')
+
+        self.assertNotIn('secret@example.com', json.dumps(summary))
+        self.assertNotIn('params', summary['slowest_queries'][0])
+        self.assertEqual(summary['similar_queries'][0]['count'], 3)
+        self.assertEqual(len(summary['duplicate_queries']), 1)
+        self.assertEqual(summary['duplicate_queries'][0]['count'], 2)
+
+    @override_settings(DEBUG=True)
+    def test_params_are_recorded_under_debug(self):
+        summary = self.profile('secret@example.com', 'secret@example.com')
+
+        self.assertIn('secret@example.com', summary['duplicate_queries'][0]['params'])
+        self.assertIn('secret@example.com', summary['slowest_queries'][0]['params'])
@@ -6,7 +6,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .metrics import metrics_view
+from .profiling import profiling_report
+
 urlpatterns = [
+    path('metrics', metrics_view, name='metrics'),
+    path('admin/profiling/', profiling_report, name='profiling_report'),
     path('admin/', admin.site.urls),
     path('accounts/', include('allauth.urls')),
     path('', include('prompts.urls')),
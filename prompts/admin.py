@@ -1,5 +1,16 @@
+from decimal import Decimal
+
 from django.contrib import admin
-from .models import Category, Tag, Prompt, Review, PromptDownload, PromptPurchase, UserFavorite, PromptAnalytics
+from django.db.models import (
+    BooleanField, Case, Count, Exists, ExpressionWrapper, F, FloatField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+
+from prompt_platform.pagination import EstimatedCountPaginator
+from .queries import with_rating_stats
+from .models import (
+    BulkJob, Category, Tag, Prompt, Review, PromptDownload, PromptPurchase, UserFavorite, PromptAnalytics,
+)
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -9,6 +20,28 @@ class CategoryAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     readonly_fields = ['prompt_count', 'total_earnings']
 
+    def get_queryset(self, request):
+        # Per-category totals as correlated subqueries; joining both would multiply the rows
+        active_prompts = Prompt.objects.filter(category=OuterRef('pk'), is_active=True).order_by().values('category')
+        earnings = PromptPurchase.objects.filter(
+            prompt__category=OuterRef('pk'),
+            prompt__is_active=True,
+            prompt__price_type='paid',
+            payment_status='completed',
+        ).order_by().values('prompt__category')
+        return super().get_queryset(request).annotate(
+            active_prompt_count=Coalesce(Subquery(active_prompts.annotate(total=Count('pk')).values('total')), 0),
+            earnings=Coalesce(Subquery(earnings.annotate(total=Sum('amount')).values('total')), Value(Decimal('0'))),
+        )
+
+    @admin.display(description='Prompt count', ordering='active_prompt_count')
+    def prompt_count(self, obj):
+        return obj.active_prompt_count
+
+    @admin.display(description='Total earnings', ordering='earnings')
+    def total_earnings(self, obj):
+        return obj.earnings
+
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
     list_display = ['name', 'slug', 'usage_count', 'created_at']
@@ -32,8 +65,8 @@ class PromptAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
     readonly_fields = [
         'views', 'downloads', 'purchases', 'favorites', 'average_rating',
-        'total_ratings', 'total_engagement', 'conversion_rate', 'total_earnings',
-        'is_featured', 'is_trending'
+        'total_ratings', 'total_engagement', 'engagement_score', 'conversion_rate', 'total_earnings',
+        'is_featured', 'is_trending', 'created_at', 'updated_at'
     ]
     filter_horizontal = ['tags']
     fieldsets = (
@@ -53,7 +86,9 @@ class PromptAdmin(admin.ModelAdmin):
             'fields': ('meta_title', 'meta_description', 'keywords')
         }),
         ('Analytics', {
-            'fields': ('views', 'downloads', 'purchases', 'favorites', 'average_rating', 'total_ratings'),
+            'fields': (
+                'views', 'downloads', 'purchases', 'favorites', 'average_rating', 'total_ratings', 'engagement_score'
+            ),
             'classes': ('collapse',)
         }),
         ('Timestamps', {
@@ -62,8 +97,37 @@ class PromptAdmin(admin.ModelAdmin):
         }),
     )
 
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('author', 'category').prefetch_related('tags')
+        queryset = super().get_queryset(request).select_related('author', 'category')
+        return with_rating_stats(queryset).annotate(
+            engagement=F('views') + F('downloads') + F('purchases') + F('favorites'),
+            conversion=Case(
+                When(views=0, then=Value(0.0)),
+                default=ExpressionWrapper(
+                    (F('downloads') + F('purchases')) * 100.0 / F('views'), output_field=FloatField()
+                ),
+                output_field=FloatField(),
+            ),
+        )
+
+    @admin.display(description='Average rating', ordering='avg_rating')
+    def average_rating(self, obj):
+        return round(obj.avg_rating, 1)
+
+    @admin.display(description='Total ratings', ordering='rating_count')
+    def total_ratings(self, obj):
+        return obj.rating_count
+
+    @admin.display(description='Total engagement', ordering='engagement')
+    def total_engagement(self, obj):
+        return obj.engagement
+
+    @admin.display(description='Conversion rate', ordering='conversion')
+    def conversion_rate(self, obj):
+        return round(obj.conversion, 2)
 
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
@@ -71,9 +135,18 @@ class ReviewAdmin(admin.ModelAdmin):
     list_filter = ['rating', 'is_verified_purchase', 'created_at']
     search_fields = ['prompt__title', 'user__username', 'title', 'comment']
     readonly_fields = ['is_verified', 'helpful_votes']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('prompt', 'user')
+        purchased = PromptPurchase.objects.filter(prompt=OuterRef('prompt'), user=OuterRef('user'))
+        return super().get_queryset(request).select_related('prompt', 'user').annotate(
+            verified=ExpressionWrapper(Q(is_verified_purchase=True) | Q(Exists(purchased)), output_field=BooleanField()),
+        )
+
+    @admin.display(description='Is verified', boolean=True, ordering='verified')
+    def is_verified(self, obj):
+        return obj.verified
 
 @admin.register(PromptDownload)
 class PromptDownloadAdmin(admin.ModelAdmin):
@@ -81,6 +154,8 @@ class PromptDownloadAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['prompt__title', 'user__username', 'ip_address']
     readonly_fields = ['created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('prompt', 'user')
@@ -94,6 +169,8 @@ class PromptPurchaseAdmin(admin.ModelAdmin):
     list_filter = ['payment_status', 'created_at']
     search_fields = ['prompt__title', 'user__username', 'stripe_payment_intent_id', 'transaction_id']
     readonly_fields = ['transaction_id', 'is_successful', 'created_at', 'updated_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('prompt', 'user')
@@ -104,6 +181,8 @@ class UserFavoriteAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['user__username', 'prompt__title']
     readonly_fields = ['created_at']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('user', 'prompt')
@@ -115,6 +194,17 @@ class PromptAnalyticsAdmin(admin.ModelAdmin):
     search_fields = ['prompt__title']
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'date'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('prompt') 
+
+@admin.register(BulkJob)
+class BulkJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'user', 'action', 'status', 'processed', 'total', 'affected', 'created_at']
+    list_filter = ['status', 'action']
+    readonly_fields = ['created_at', 'updated_at']
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('prompt') 
\ No newline at end of file
+        return super().get_queryset(request).select_related('user')
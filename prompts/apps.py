@@ -3,4 +3,19 @@ from django.apps import AppConfig
 
 class PromptsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'prompts' 
\ No newline at end of file
+    name = 'prompts'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import m2m_changed, post_delete, post_save
+
+        from . import cache
+        from .models import Category, Prompt, Tag
+
+        # Keep the object cache in step with writes
+        for name, signal in (('save', post_save), ('delete', post_delete)):
+            signal.connect(cache.prompt_changed, sender=Prompt, dispatch_uid=f'prompts.cache.prompt_{name}')
+            signal.connect(cache.category_changed, sender=Category, dispatch_uid=f'prompts.cache.category_{name}')
+            signal.connect(cache.tag_changed, sender=Tag, dispatch_uid=f'prompts.cache.tag_{name}')
+        post_save.connect(cache.author_changed, sender=settings.AUTH_USER_MODEL, dispatch_uid='prompts.cache.author')
+        m2m_changed.connect(cache.prompt_tags_changed, sender=Prompt.tags.through, dispatch_uid='prompts.cache.prompt_tags') 
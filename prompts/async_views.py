@@ -0,0 +1,167 @@
+"""
+Async versions of the read-only catalog views, served under ASGI.
+
+``prompts.urls`` routes to these instead of their sync counterparts in
+``prompts.views`` when ``ASYNC_VIEWS`` is on, which ``prompt_platform.asgi``
+does by default. Queries use the async ORM, and independent ones are
+awaited together with ``asyncio.gather``. Django runs a request's queries
+one after another on its database connection either way; what changes is
+that an ASGI worker serves other requests while this one waits on the
+database, instead of holding a thread for it.
+"""
+import asyncio
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import get_category_by_slug, get_prompt_by_slug, get_tag_by_slug
+from .models import PUBLISHED, Prompt
+from .tasks import record_view
+from .views import cached_or_404
+from prompt_platform import background
+from prompt_platform.metrics import SEARCH_LATENCY
+from prompt_platform.query_budget import query_budget
+from prompt_platform.replicas import replica_reads
+
+
+def _authenticated_user(request):
+    # Evaluates the lazy request.user, which queries the session and user tables
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+async def _paginate(queryset, per_page, page_number):
+    """``Paginator.get_page`` with the count and the page's rows fetched asynchronously."""
+    paginator = Paginator(queryset, per_page)
+    paginator.count = await queryset.acount()
+    page = paginator.get_page(page_number)
+    page.object_list = [obj async for obj in page.object_list]
+    return page
+
+
+async def _usage_statistics(prompt, days=30):
+    """``Prompt.get_usage_statistics``, with both counts in flight at once."""
+    end_date = timezone.now()
+    start_date = end_date - timedelta(days=days)
+    downloads, purchases = await asyncio.gather(
+        prompt.promptdownload_set.filter(created_at__range=(start_date, end_date)).acount(),
+        prompt.promptpurchase_set.filter(created_at__range=(start_date, end_date)).acount(),
+    )
+    return {'downloads': downloads, 'purchases': purchases, 'total': downloads + purchases}
+
+
+async def _list(queryset):
+    return [obj async for obj in queryset]
+
+
+@query_budget(14)
+@replica_reads
+async def prompt_detail(request, slug):
+    prompt = await sync_to_async(cached_or_404)(get_prompt_by_slug, slug)
+    user = await sync_to_async(_authenticated_user)(request)
+
+    # Lists stay lazy, as in the sync view; the template evaluates them while rendering
+    context = {
+        'prompt': prompt,
+        'object': prompt,
+        'reviews': prompt.reviews.select_related('user').order_by('-created_at')[:10],
+        'related_prompts': prompt.get_related_prompts(),
+        'analytics': prompt.analytics.order_by('-date')[:7],
+    }
+    lookups = {'usage_stats': _usage_statistics(prompt, days=30)}
+    if user is not None:
+        lookups.update({
+            'user_review': prompt.reviews.filter(user=user).afirst(),
+            'has_downloaded': prompt.promptdownload_set.filter(user=user).aexists(),
+            'has_purchased': prompt.promptpurchase_set.filter(user=user, payment_status='completed').aexists(),
+            'is_favorited': prompt.user_favorites.filter(user=user).aexists(),
+        })
+    values = await asyncio.gather(sync_to_async(background.enqueue)(record_view, prompt.pk), *lookups.values())
+
+    context.update(zip(lookups, values[1:]))
+    return await sync_to_async(render)(request, 'prompts/prompt_detail.html', context)
+
+
+@query_budget(4)
+@replica_reads
+async def category_detail(request, slug):
+    prompts = Prompt.objects.filter(
+        PUBLISHED, category__slug=slug, category__is_active=True
+    ).select_related('author').prefetch_related('tags').order_by('-created_at')
+    category, page_obj = await asyncio.gather(
+        sync_to_async(cached_or_404)(get_category_by_slug, slug),
+        _paginate(prompts, 12, request.GET.get('page')),
+    )
+
+    context = {
+        'category': category,
+        'prompts': page_obj,
+        'page_obj': page_obj,
+    }
+    return await sync_to_async(render)(request, 'prompts/category_detail.html', context)
+
+
+@query_budget(4)
+@replica_reads
+async def tag_detail(request, slug):
+    prompts = Prompt.objects.filter(
+        PUBLISHED, tags__slug=slug
+    ).select_related('author', 'category').prefetch_related('tags').order_by('-created_at')
+    tag, page_obj = await asyncio.gather(
+        sync_to_async(cached_or_404)(get_tag_by_slug, slug),
+        _paginate(prompts, 12, request.GET.get('page')),
+    )
+
+    context = {
+        'tag': tag,
+        'prompts': page_obj,
+        'page_obj': page_obj,
+    }
+    return await sync_to_async(render)(request, 'prompts/tag_detail.html', context)
+
+
+@query_budget(2)
+@replica_reads
+async def api_search(request):
+    """API endpoint for AJAX search."""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Invalid request method'}, status=400)
+
+    query = request.GET.get('q', '')
+    if len(query) < 2:
+        return JsonResponse({'results': []})
+
+    prompts = Prompt.objects.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(tags__name__icontains=query),
+        PUBLISHED,
+    ).select_related('category').distinct()[:10]
+    with SEARCH_LATENCY.time(endpoint='api_search'):
+        prompts = await _list(prompts)
+
+    results = [
+        {
+            'id': prompt.id,
+            'title': prompt.title,
+            'description': prompt.description[:100] + '...' if len(prompt.description) > 100 else prompt.description,
+            'url': reverse('prompts:prompt_detail', kwargs={'slug': prompt.slug}),
+            'price_type': prompt.price_type,
+            'price': str(prompt.price),
+            'category': prompt.category.name if prompt.category else '',
+            'views': prompt.views,
+            'downloads': prompt.downloads,
+        }
+        for prompt in prompts
+    ]
+    return JsonResponse({'results': results})
+
+
+# csrf_exempt() would wrap the coroutine in a sync function before Django 5.0
+api_search.csrf_exempt = True
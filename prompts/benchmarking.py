@@ -0,0 +1,452 @@
+"""
+Benchmark harness for the prompt marketplace's hot paths.
+
+Targets are exercised in-process through the Django test client (timing,
+query counts) or over HTTP against a running server with a concurrent load
+generator (latency percentiles, throughput). Results are plain dicts so the
+``benchmark`` command can emit them as JSON and compare runs.
+
+``DatabaseLoad`` drives the database directly with concurrent readers and
+writers, for comparing database profiles (``benchmark_db``).
+``running_server`` starts a WSGI or ASGI server for the HTTP load generator
+(``benchmark_servers``).
+"""
+import http.client
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, close_old_connections, connection, connections, transaction
+from django.db.models import Count, F
+from django.middleware.csrf import CSRF_ALLOWED_CHARS, CSRF_SECRET_LENGTH
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from prompt_platform import background
+from .models import Prompt, Tag
+
+User = get_user_model()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(latencies, elapsed=None):
+    """Latency summary in milliseconds, plus throughput when ``elapsed`` is known."""
+    if not latencies:
+        return {'count': 0}
+    summary = {
+        'count': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'min_ms': round(min(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies) * 1000, 3),
+    }
+    if elapsed:
+        summary['throughput_rps'] = round(len(latencies) / elapsed, 2)
+    return summary
+
+
+class Target:
+    """A single benchmarked request and the status code it should get."""
+
+    def __init__(self, name, path, method='GET', user=None, status=200):
+        self.name = name
+        self.path = path
+        self.method = method
+        self.user = user
+        self.status = status
+
+
+def check_statuses(target, statuses, errors=0):
+    """
+    Result fields flagging a target whose responses weren't all ``target.status``.
+
+    A failed target's timings are those of error pages (or of nothing), so
+    they are reported but must not be compared.
+    """
+    unexpected = {str(code): count for code, count in sorted(statuses.items()) if code != target.status}
+    return {
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+        'failed': bool(unexpected or errors),
+    }
+
+
+def failed_targets(results):
+    """``(label, target, statuses)`` for every failed target in a result set keyed by run label."""
+    return [
+        (label, name, stats.get('statuses', {}))
+        for label, targets in results.items()
+        for name, stats in targets.items()
+        if stats.get('failed')
+    ]
+
+
+def benchmark_fixtures():
+    """Pick representative rows from the seeded database."""
+    prompt = Prompt.objects.filter(status='published', is_active=True).order_by('-views').first()
+    if prompt is None:
+        raise ValueError('No published prompts found; seed the database first (generate_sample_data --scale).')
+
+    creator_id = Prompt.objects.values('author').annotate(
+        total=Count('id')
+    ).order_by('-total').values_list('author', flat=True).first()
+    creator = User.objects.get(pk=creator_id)
+    buyer = User.objects.exclude(pk=prompt.author_id).order_by('pk').first() or creator
+    tag = prompt.tags.order_by('pk').first() or Tag.objects.order_by('pk').first()
+    if tag is None:
+        raise ValueError('No tags found; seed the database first (generate_sample_data --scale).')
+    return {'prompt': prompt, 'creator': creator, 'buyer': buyer, 'tag': tag}
+
+
+def default_targets(fixtures):
+    prompt = fixtures['prompt']
+    creator = fixtures['creator']
+    query = prompt.title.split()[0]
+    return [
+        Target('prompt_list', reverse('prompts:prompt_list')),
+        Target('prompt_list_popular', reverse('prompts:prompt_list') + '?sort_by=popular'),
+        Target('prompt_detail', reverse('prompts:prompt_detail', kwargs={'slug': prompt.slug})),
+        Target('category_detail', reverse('prompts:category_detail', kwargs={'slug': prompt.category.slug})),
+        Target('tag_detail', reverse('prompts:tag_detail', kwargs={'slug': fixtures['tag'].slug})),
+        Target('search_prompts', reverse('prompts:search_prompts') + f'?q={query}'),
+        Target('api_search', reverse('prompts:api_search') + f'?q={query}'),
+        Target('user_dashboard', reverse('prompts:user_dashboard'), user=creator),
+        Target('analytics_dashboard', reverse('prompts:analytics_dashboard'), user=creator),
+        Target('export_prompts', reverse('prompts:export_prompts') + '?format=ndjson', user=creator),
+        Target(
+            'toggle_favorite',
+            reverse('prompts:toggle_favorite', kwargs={'slug': prompt.slug}),
+            method='POST',
+            user=fixtures['buyer'],
+        ),
+    ]
+
+
+def server_name():
+    """A host name the request will pass ``ALLOWED_HOSTS`` validation with."""
+    for host in settings.ALLOWED_HOSTS:
+        if host and '*' not in host:
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def _consume(response):
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+
+
+def run_client_benchmark(targets, iterations=20, warmup=2):
+    """Measure each target in-process with the Django test client."""
+    results = {}
+    clients = {}
+    for target in targets:
+        client = clients.get(target.user)
+        if client is None:
+            client = Client(raise_request_exception=False, SERVER_NAME=server_name())
+            if target.user is not None:
+                client.force_login(target.user)
+            clients[target.user] = client
+
+        request = client.post if target.method == 'POST' else client.get
+        for _ in range(warmup):
+            _consume(request(target.path))
+
+        latencies = []
+        query_counts = []
+        statuses = {}
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = request(target.path)
+                _consume(response)
+                latencies.append(time.perf_counter() - started)
+            query_counts.append(len(queries))
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        results[target.name] = dict(
+            summarize(latencies, sum(latencies)),
+            queries_min=min(query_counts),
+            queries_max=max(query_counts),
+            **check_statuses(target, statuses),
+        )
+    return results
+
+
+def session_cookies(user):
+    """Session and CSRF cookies that authenticate ``user`` against a server sharing this database."""
+    cookies = {}
+    if user is not None:
+        client = Client()
+        client.force_login(user)
+        cookies['sessionid'] = client.cookies['sessionid'].value
+    cookies['csrftoken'] = get_random_string(CSRF_SECRET_LENGTH, allowed_chars=CSRF_ALLOWED_CHARS)
+    return cookies
+
+
+class HttpLoadGenerator:
+    """
+    Closed-loop concurrent HTTP load against a running server.
+
+    Each worker thread keeps one persistent connection and issues requests
+    back to back until the shared request budget is exhausted.
+    """
+
+    def __init__(self, base_url, concurrency=8, timeout=30):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme or 'http'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def run(self, target, requests, cookies=None):
+        headers = {'Connection': 'keep-alive'}
+        if cookies:
+            headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in cookies.items())
+            if target.method == 'POST':
+                headers['X-CSRFToken'] = cookies['csrftoken']
+                headers['Referer'] = f'{self.scheme}://{self.host}'
+
+        remaining = [requests]
+        lock = threading.Lock()
+        latencies = []
+        statuses = {}
+        errors = []
+
+        def worker():
+            conn = self.connect()
+            local_latencies = []
+            local_statuses = {}
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            break
+                        remaining[0] -= 1
+                    started = time.perf_counter()
+                    try:
+                        conn.request(target.method, self.prefix + target.path, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                    except (OSError, http.client.HTTPException) as e:
+                        errors.append(str(e))
+                        conn.close()
+                        conn = self.connect()
+                        continue
+                    local_latencies.append(time.perf_counter() - started)
+                    local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+            finally:
+                conn.close()
+                with lock:
+                    latencies.extend(local_latencies)
+                    for status, count in local_statuses.items():
+                        statuses[status] = statuses.get(status, 0) + count
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for _ in range(self.concurrency):
+                executor.submit(worker)
+        elapsed = time.perf_counter() - started
+
+        return dict(
+            summarize(latencies, elapsed),
+            concurrency=self.concurrency,
+            errors=len(errors),
+            **check_statuses(target, statuses, len(errors)),
+        )
+
+
+def run_http_benchmark(targets, base_url, requests=200, concurrency=8):
+    generator = HttpLoadGenerator(base_url, concurrency=concurrency)
+    cookies_by_user = {}
+    results = {}
+    for target in targets:
+        if target.user not in cookies_by_user:
+            cookies_by_user[target.user] = session_cookies(target.user)
+        results[target.name] = generator.run(target, requests, cookies_by_user[target.user])
+    return results
+
+
+def compare_results(baseline, current, metric='p95_ms', threshold=0.2):
+    """
+    Compare two result sets keyed by run label and target name.
+
+    Returns a list of ``(label, target, before, after, change)`` tuples for
+    targets whose ``metric`` grew by more than ``threshold`` (a fraction).
+    Targets that failed in either run are skipped.
+    """
+    regressions = []
+    for label, targets in current.items():
+        for name, stats in targets.items():
+            previous = baseline.get(label, {}).get(name, {})
+            if stats.get('failed') or previous.get('failed'):
+                continue
+            before = previous.get(metric)
+            after = stats.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change > threshold:
+                regressions.append((label, name, before, after, change))
+    return regressions
+
+
+@contextmanager
+def scratch_database(prefix='benchmark'):
+    """A throwaway test database; on SQLite a file, so worker threads share it."""
+    test_settings = connection.settings_dict['TEST']
+    old_name = connection.settings_dict['NAME']
+    old_test_name = test_settings.get('NAME')
+    if connection.vendor == 'sqlite' and not old_test_name:
+        test_settings['NAME'] = os.path.join(tempfile.gettempdir(), f'{prefix}-{os.getpid()}.sqlite3')
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        # Let background jobs (e.g. webhook drains) finish before their database goes away
+        background.shutdown()
+        connections.close_all()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_server(command, port, env=None, timeout=30):
+    """Start a server process and yield once it accepts connections on ``port``; stop it afterwards."""
+    process = subprocess.Popen(command, env={**os.environ, **(env or {})})
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'Server exited with status {process.returncode} before serving')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'Server did not listen on port {port} within {timeout}s')
+                time.sleep(0.2)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+@contextmanager
+def database_profile(overrides):
+    """Open new connections to the default database with ``overrides`` applied to its settings."""
+    settings_dict = connection.settings_dict
+    missing = object()
+    old = {key: settings_dict.get(key, missing) for key in overrides}
+    connections.close_all()
+    settings_dict.update(overrides)
+    try:
+        yield
+    finally:
+        connections.close_all()
+        for key, value in old.items():
+            if value is missing:
+                settings_dict.pop(key, None)
+            else:
+                settings_dict[key] = value
+
+
+class DatabaseLoad:
+    """
+    Concurrent catalog reads and counter writes against the default database.
+
+    Each operation runs like a request: connections are released before and
+    after it by ``close_old_connections``, so ``CONN_MAX_AGE`` matters as it
+    does in the app.
+    """
+
+    def __init__(self, prompt_ids, write_ratio=0.2, seed=0):
+        self.prompt_ids = prompt_ids
+        self.write_ratio = write_ratio
+        self.seed = seed
+
+    def read(self, rng):
+        # A detail page and a listing page
+        Prompt.objects.select_related('author', 'category').get(pk=rng.choice(self.prompt_ids))
+        list(
+            Prompt.objects.filter(status='published', is_active=True)
+            .select_related('author', 'category').order_by('-created_at')[:12]
+        )
+
+    def write(self, rng):
+        # What increment_views and friends do
+        with transaction.atomic():
+            Prompt.objects.filter(pk=rng.choice(self.prompt_ids)).update(views=F('views') + 1)
+
+    def worker(self, index, deadline):
+        rng = random.Random(self.seed * 1000 + index)
+        latencies = {'read': [], 'write': []}
+        errors = Counter()
+        while time.perf_counter() < deadline:
+            close_old_connections()
+            kind = 'write' if rng.random() < self.write_ratio else 'read'
+            started = time.perf_counter()
+            try:
+                getattr(self, kind)(rng)
+            except OperationalError:
+                # e.g. "database is locked" once the busy timeout runs out
+                errors[kind] += 1
+            else:
+                latencies[kind].append(time.perf_counter() - started)
+            close_old_connections()
+        connections.close_all()
+        return latencies, errors
+
+    def run(self, workers, duration):
+        """Run ``workers`` threads for ``duration`` seconds; returns read and write summaries."""
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda index: self.worker(index, deadline), range(workers)))
+        elapsed = time.perf_counter() - started
+
+        summary = {}
+        for kind in ('read', 'write'):
+            latencies = [latency for worker_latencies, _ in results for latency in worker_latencies[kind]]
+            summary[kind] = summarize(latencies, elapsed)
+            summary[kind]['errors'] = sum(errors[kind] for _, errors in results)
+        return summary
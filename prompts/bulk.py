@@ -0,0 +1,145 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, CharField, F, TextField, Value, When
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+
+from prompt_platform import background
+
+from .cache import invalidate_on_commit
+from .models import BulkJob, Prompt
+from .tagging import release_prompt_tags
+
+# Finished jobs are kept this long for polling, then pruned when the user starts another
+JOB_RETENTION = timedelta(days=1)
+
+
+def derived_field_updates(now, status=None):
+    """
+    Set-based equivalent of ``Prompt.populate_derived_fields`` for ``update()``.
+
+    ``status`` is the status being written by the same UPDATE, if any. Slugs
+    are never empty for saved prompts, so only the SEO and publishing fields
+    need filling in.
+    """
+    if status is None:
+        published_at = Case(
+            When(status='published', then=Coalesce('published_at', Value(now))),
+            default=F('published_at'),
+        )
+    elif status == 'published':
+        published_at = Coalesce('published_at', Value(now))
+    else:
+        published_at = F('published_at')
+
+    return {
+        'meta_title': Case(
+            When(meta_title='', then=Substr('title', 1, 60)),
+            default=F('meta_title'),
+            output_field=CharField(),
+        ),
+        'meta_description': Case(
+            When(meta_description='', then=Substr('description', 1, 160)),
+            default=F('meta_description'),
+            output_field=TextField(),
+        ),
+        'published_at': published_at,
+        'updated_at': now,
+    }
+
+
+def apply_bulk_action(queryset, action, new_category=None, new_price=None):
+    """Apply ``action`` to ``queryset`` as a single UPDATE or DELETE and return the affected count."""
+    if action == 'delete':
+        with transaction.atomic():
+            release_prompt_tags(queryset)
+            return queryset.delete()[1].get(Prompt._meta.label, 0)
+
+    if action == 'publish':
+        changes = {'status': 'published'}
+    elif action == 'unpublish':
+        changes = {'status': 'draft'}
+    elif action == 'change_category':
+        changes = {'category': new_category}
+    elif action == 'change_price':
+        changes = {'price': new_price, 'price_type': 'paid' if new_price > 0 else 'free'}
+    else:
+        raise ValueError(f'Unknown bulk action: {action}')
+
+    updated = queryset.update(**changes, **derived_field_updates(timezone.now(), changes.get('status')))
+    # update() sends no post_save
+    invalidate_on_commit(Prompt)
+    return updated
+
+
+def create_job(author, action, total):
+    """A queued ``BulkJob`` for ``run_bulk_action`` to report progress on."""
+    return BulkJob.objects.create(user=author, action=action, total=total)
+
+
+def get_job(job_id, user):
+    """Progress of ``user``'s job ``job_id`` as a dict, or None."""
+    return BulkJob.objects.filter(pk=job_id, user=user).values(
+        'action', 'status', 'total', 'processed', 'affected', 'error'
+    ).first()
+
+
+def _save_job(job_id, job):
+    BulkJob.objects.filter(pk=job_id).update(
+        status=job['status'], processed=job['processed'], affected=job['affected'], error=job['error'],
+        updated_at=timezone.now(),
+    )
+
+
+def run_bulk_action(author, action, prompt_ids, new_category=None, new_price=None, job_id=None):
+    """
+    Run ``action`` over ``author``'s prompts in ``prompt_ids``, chunk by chunk.
+
+    Prompts owned by other users are silently ignored. When ``job_id`` (a
+    ``create_job`` id) is given, progress is recorded on the job after every
+    chunk for ``get_job`` polling.
+    """
+    chunk_size = settings.BULK_ACTION_CHUNK_SIZE
+    job = {
+        'action': action,
+        'status': 'running',
+        'total': len(prompt_ids),
+        'processed': 0,
+        'affected': 0,
+        'error': '',
+    }
+    try:
+        for start in range(0, len(prompt_ids), chunk_size):
+            chunk = prompt_ids[start:start + chunk_size]
+            queryset = Prompt.objects.filter(author=author, pk__in=chunk)
+            job['affected'] += apply_bulk_action(queryset, action, new_category, new_price)
+            job['processed'] += len(chunk)
+            if job_id:
+                _save_job(job_id, job)
+        job['status'] = 'completed'
+    except Exception as e:
+        job['status'] = 'failed'
+        job['error'] = str(e)
+        raise
+    finally:
+        if job_id:
+            _save_job(job_id, job)
+    return job
+
+
+def start_bulk_action(author, action, prompt_ids, new_category=None, new_price=None):
+    """Queue ``run_bulk_action`` as a background task and return the job id to poll."""
+    BulkJob.objects.filter(user=author, updated_at__lt=timezone.now() - JOB_RETENTION).delete()
+    job_id = create_job(author, action, len(prompt_ids)).pk
+    # Imported here: tasks imports this module
+    from .tasks import bulk_action
+
+    background.enqueue(
+        bulk_action, author.pk, action, list(prompt_ids),
+        category_id=new_category.pk if new_category is not None else None,
+        price=str(new_price) if new_price is not None else None,
+        job_id=str(job_id),
+    )
+    return job_id
@@ -0,0 +1,291 @@
+"""
+Read-through object cache for prompts, categories and tags.
+
+Lookups go through two tiers: an LRU dict in each process
+(``OBJECT_CACHE_LOCAL_SIZE`` entries, each kept ``OBJECT_CACHE_LOCAL_TTL``
+seconds) and the shared Django cache (Redis when ``CACHE_URL`` is set) for
+``OBJECT_CACHE_TIMEOUT`` seconds. Rows are stored as tuples of field values
+rather than pickled model instances and rebuilt with ``Model.from_db``.
+Objects are stored under their id; slugs map to ids.
+
+Every key embeds a version stamp for its model, kept in the shared cache.
+``post_save``, ``post_delete`` and ``m2m_changed`` bump the stamp once the
+transaction commits, which orphans every entry for the model at once;
+prompts embed their author, category and tags, so changes to those bump
+the prompt stamp too. Writes that bypass signals (``update()``,
+``bulk_create()``) call ``invalidate`` themselves. Other processes see a
+new stamp within ``OBJECT_CACHE_LOCAL_TTL`` seconds. Counters updated with
+``F()`` (views, downloads, ...) don't bump it, so cached prompts may show
+them up to ``OBJECT_CACHE_TIMEOUT`` seconds old.
+
+With ``OBJECT_CACHE_TIMEOUT = 0`` (the default without ``CACHE_URL``) the
+shared tier is skipped: a per-process LocMem cache would keep entries for
+the full timeout and never see another worker's version bumps, so each
+process only keeps entries for ``OBJECT_CACHE_LOCAL_TTL`` seconds.
+
+Hits and misses per tier are counted in ``cache_requests_total``
+(``cache="objects_local"`` and ``cache="objects_shared"``).
+"""
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router, transaction
+from django.db.models import Count, Q
+
+from prompt_platform.metrics import record_cache_lookup
+
+from .models import PUBLISHED, Category, Prompt, Tag
+
+User = get_user_model()
+
+
+def _attnames(model, exclude=()):
+    return [field.attname for field in model._meta.concrete_fields if field.name not in exclude]
+
+
+PROMPT_FIELDS = _attnames(Prompt)
+CATEGORY_FIELDS = _attnames(Category)
+TAG_FIELDS = _attnames(Tag)
+# The password hash stays out of the cache; it loads on access like a deferred field
+AUTHOR_FIELDS = _attnames(User, exclude={'password'})
+
+# Entries written by code with different fields must not be read back
+SCHEMA = format(zlib.crc32(repr((PROMPT_FIELDS, CATEGORY_FIELDS, TAG_FIELDS, AUTHOR_FIELDS)).encode()), 'x')
+
+
+class LocalCache:
+    """A thread-safe LRU dict whose entries expire ``ttl`` seconds after being set."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_cache = LocalCache(settings.OBJECT_CACHE_LOCAL_SIZE, settings.OBJECT_CACHE_LOCAL_TTL)
+
+
+def _version_key(model):
+    return f'objects:{SCHEMA}:{model._meta.label_lower}:version'
+
+
+def _version(model):
+    key = _version_key(model)
+    version = local_cache.get(key)
+    if version is None:
+        # Stamps start from the clock, so one lost from the cache never brings back old entries
+        version = cache.get_or_set(key, time.time_ns, None)
+        local_cache.set(key, version)
+    return version
+
+
+def _key(model, kind, value, depends_on=()):
+    versions = '.'.join(str(_version(m)) for m in (model, *depends_on))
+    return f'objects:{SCHEMA}:{model._meta.label_lower}:{versions}:{kind}:{value}'
+
+
+def invalidate(model):
+    """Orphan every cached entry for ``model`` now."""
+    key = _version_key(model)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+    local_cache.set(key, version)
+
+
+def invalidate_on_commit(*models):
+    """``invalidate`` ``models`` once the current transaction commits, or now outside one."""
+    for model in models:
+        transaction.on_commit(partial(invalidate, model))
+
+
+def clear():
+    """Orphan every entry, e.g. to measure with a cold cache."""
+    for model in (Prompt, Category, Tag):
+        invalidate(model)
+    local_cache.clear()
+
+
+def _get(key):
+    value = local_cache.get(key)
+    record_cache_lookup('objects_local', value is not None)
+    if value is None and settings.OBJECT_CACHE_TIMEOUT:
+        value = cache.get(key)
+        record_cache_lookup('objects_shared', value is not None)
+        if value is not None:
+            local_cache.set(key, value)
+    return value
+
+
+def _set(key, value):
+    if settings.OBJECT_CACHE_TIMEOUT:
+        cache.set(key, value, settings.OBJECT_CACHE_TIMEOUT)
+    local_cache.set(key, value)
+
+
+def _pack(obj, fields):
+    return tuple(getattr(obj, name) for name in fields)
+
+
+def _unpack(model, fields, values):
+    return model.from_db(router.db_for_read(model), fields, values)
+
+
+def _pack_prompt(prompt):
+    return (
+        _pack(prompt, PROMPT_FIELDS),
+        _pack(prompt.author, AUTHOR_FIELDS),
+        _pack(prompt.category, CATEGORY_FIELDS),
+        [_pack(tag, TAG_FIELDS) for tag in prompt.tags.all()],
+    )
+
+
+def _unpack_prompt(data):
+    prompt_values, author_values, category_values, tag_rows = data
+    prompt = _unpack(Prompt, PROMPT_FIELDS, prompt_values)
+    Prompt.author.field.set_cached_value(prompt, _unpack(User, AUTHOR_FIELDS, author_values))
+    Prompt.category.field.set_cached_value(prompt, _unpack(Category, CATEGORY_FIELDS, category_values))
+    # As prefetch_related('tags') leaves it
+    tags = prompt.tags.all()
+    tags._result_cache = [_unpack(Tag, TAG_FIELDS, values) for values in tag_rows]
+    tags._prefetch_done = True
+    prompt._prefetched_objects_cache = {'tags': tags}
+    return prompt
+
+
+def _lookup(model, slug, load, pack, unpack):
+    slug_key = _key(model, 'slug', slug)
+    pk = _get(slug_key)
+    data = None if pk is None else _get(_key(model, 'id', pk))
+    if data is not None:
+        return unpack(data)
+
+    obj = load(slug)
+    _set(_key(model, 'id', obj.pk), pack(obj))
+    _set(slug_key, obj.pk)
+    return obj
+
+
+def get_prompt_by_slug(slug):
+    """The published prompt ``slug`` with its author, category and tags; raises ``Prompt.DoesNotExist``."""
+    return _lookup(
+        Prompt, slug,
+        lambda slug: Prompt.objects.filter(PUBLISHED).select_related(
+            'author', 'category'
+        ).prefetch_related('tags').get(slug=slug),
+        _pack_prompt,
+        _unpack_prompt,
+    )
+
+
+def get_category_by_slug(slug):
+    """The active category ``slug``; raises ``Category.DoesNotExist``."""
+    return _lookup(
+        Category, slug,
+        lambda slug: Category.objects.get(slug=slug, is_active=True),
+        partial(_pack, fields=CATEGORY_FIELDS),
+        partial(_unpack, Category, CATEGORY_FIELDS),
+    )
+
+
+def get_tag_by_slug(slug):
+    """The tag ``slug``; raises ``Tag.DoesNotExist``."""
+    return _lookup(
+        Tag, slug,
+        lambda slug: Tag.objects.get(slug=slug),
+        partial(_pack, fields=TAG_FIELDS),
+        partial(_unpack, Tag, TAG_FIELDS),
+    )
+
+
+def _counted(model, fields, queryset, key):
+    """Rows of ``queryset`` annotated with ``published_count``, cached under ``key``."""
+    rows = _get(key)
+    if rows is None:
+        rows = [(_pack(obj, fields), obj.published_count) for obj in queryset]
+        _set(key, rows)
+    objects = []
+    for values, published_count in rows:
+        obj = _unpack(model, fields, values)
+        obj.published_count = published_count
+        objects.append(obj)
+    return objects
+
+
+def _published_count():
+    return Count('prompts', filter=Q(prompts__status='published', prompts__is_active=True))
+
+
+def get_top_categories(limit=10):
+    """
+    Active categories with the most published prompts, each with
+    ``published_count`` (``Category.prompt_count`` counts drafts too).
+    """
+    queryset = Category.objects.filter(is_active=True).annotate(
+        published_count=_published_count()
+    ).order_by('-published_count')[:limit]
+    return _counted(Category, CATEGORY_FIELDS, queryset, _key(Category, 'top', limit, depends_on=(Prompt,)))
+
+
+def get_popular_tags(limit=20):
+    """Tags on the most published prompts, each with ``published_count``."""
+    queryset = Tag.objects.annotate(
+        published_count=_published_count()
+    ).filter(published_count__gt=0).order_by('-published_count')[:limit]
+    return _counted(Tag, TAG_FIELDS, queryset, _key(Tag, 'popular', limit, depends_on=(Prompt,)))
+
+
+def prompt_changed(sender, **kwargs):
+    invalidate_on_commit(Prompt)
+
+
+def category_changed(sender, **kwargs):
+    invalidate_on_commit(Category, Prompt)
+
+
+def tag_changed(sender, **kwargs):
+    invalidate_on_commit(Tag, Prompt)
+
+
+def prompt_tags_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_on_commit(Prompt)
+
+
+def author_changed(sender, created=False, update_fields=None, **kwargs):
+    # New users have no prompts yet, and every login saves last_login, which cached prompts don't show
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}):
+        return
+    invalidate_on_commit(Prompt)
@@ -0,0 +1,63 @@
+"""
+Stored engagement scores for the "popular" sort.
+
+``Prompt.engagement_score`` is the weighted sum of a prompt's counters
+(``ENGAGEMENT_WEIGHTS``). The ``increment_*`` methods add the counter's
+weight in the same UPDATE that bumps the counter, so sorting by popularity
+reads an index instead of computing a sum for every row.
+
+``refresh_engagement_scores`` is the periodic job. Without a half-life it
+recomputes scores from the counters, repairing drift and applying changed
+weights. With ``ENGAGEMENT_HALF_LIFE_DAYS`` set it instead decays every
+score by the time since the last run (``ENGAGEMENT_REFRESH_HOURS``), so
+recent activity outweighs old.
+"""
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Max, Min, Value
+
+from .models import Prompt
+
+COUNTERS = ('views', 'downloads', 'purchases', 'favorites')
+
+
+def score_expression(weights=None):
+    """SQL for a prompt's undecayed score from its counters."""
+    weights = weights or settings.ENGAGEMENT_WEIGHTS
+    total = sum((F(counter) * Value(float(weights[counter])) for counter in COUNTERS), Value(0.0))
+    return ExpressionWrapper(total, output_field=FloatField())
+
+
+def decay_factor(hours, half_life_days=None):
+    """How much a score shrinks over ``hours``; 1.0 without a half-life."""
+    if half_life_days is None:
+        half_life_days = settings.ENGAGEMENT_HALF_LIFE_DAYS
+    if not half_life_days:
+        return 1.0
+    return 0.5 ** (hours / (half_life_days * 24))
+
+
+def _pk_batches(queryset, batch_size):
+    bounds = queryset.aggregate(low=Min('pk'), high=Max('pk'))
+    if bounds['low'] is None:
+        return
+    for start in range(bounds['low'], bounds['high'] + 1, batch_size):
+        yield queryset.filter(pk__gte=start, pk__lt=start + batch_size)
+
+
+def rebuild_scores(queryset=None, batch_size=5000):
+    """Recompute scores from counters, one UPDATE per ``batch_size`` primary keys."""
+    queryset = Prompt.objects.all() if queryset is None else queryset
+    expression = score_expression()
+    return sum(batch.update(engagement_score=expression) for batch in _pk_batches(queryset, batch_size))
+
+
+def decay_scores(hours, half_life_days=None, batch_size=5000):
+    """Decay every non-zero score by ``hours`` of its half-life."""
+    factor = decay_factor(hours, half_life_days)
+    if factor == 1.0:
+        return 0
+    queryset = Prompt.objects.filter(engagement_score__gt=0)
+    return sum(
+        batch.update(engagement_score=F('engagement_score') * factor)
+        for batch in _pk_batches(queryset, batch_size)
+    )
@@ -0,0 +1,127 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = {
+    'json': ('application/json', 'json'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+# Rows fetched per database round trip and bytes buffered per streamed chunk
+EXPORT_CHUNK_SIZE = 500
+STREAM_BUFFER_SIZE = 64 * 1024
+
+PROMPT_EXPORT_FIELDS = [
+    'title', 'description', 'content', 'category', 'price_type', 'price',
+    'status', 'created_at', 'views', 'downloads', 'purchases', 'earnings',
+]
+
+
+class _Echo:
+    """File-like object whose ``write`` returns the value, for use with csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def _dumps(row):
+    return json.dumps(row, cls=DjangoJSONEncoder)
+
+
+def iter_json_array(rows):
+    """Yield ``rows`` as the pieces of a single JSON array."""
+    yield '['
+    first = True
+    for row in rows:
+        yield _dumps(row) if first else ',' + _dumps(row)
+        first = False
+    yield ']'
+
+
+def iter_ndjson(rows):
+    """Yield ``rows`` as newline-delimited JSON."""
+    for row in rows:
+        yield _dumps(row) + '\n'
+
+
+def iter_csv(rows, fields):
+    """Yield ``rows`` as CSV lines with a header row."""
+    writer = csv.DictWriter(_Echo(), fieldnames=fields, extrasaction='ignore')
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_encoded(pieces, buffer_size=STREAM_BUFFER_SIZE):
+    """Encode string pieces and coalesce them into chunks of roughly ``buffer_size`` bytes."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        data = piece.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            yield b''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def iter_gzip(chunks):
+    """Compress a byte stream incrementally into the gzip format."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def streaming_export_response(rows, fields, export_format, filename, compress=False):
+    """
+    Build a ``StreamingHttpResponse`` that serializes ``rows`` lazily.
+
+    ``rows`` should be an iterator (e.g. ``QuerySet.iterator()`` mapped to
+    dicts) so memory use stays constant regardless of the number of rows.
+    """
+    content_type, extension = EXPORT_FORMATS[export_format]
+    if export_format == 'csv':
+        pieces = iter_csv(rows, fields)
+    elif export_format == 'ndjson':
+        pieces = iter_ndjson(rows)
+    else:
+        pieces = iter_json_array(rows)
+
+    chunks = iter_encoded(pieces)
+    filename = f'{filename}.{extension}'
+    if compress:
+        chunks = iter_gzip(chunks)
+        content_type = 'application/gzip'
+        filename += '.gz'
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def prompt_export_row(prompt):
+    """Serialize a prompt (with ``category`` selected) into an export row."""
+    return {
+        'title': prompt.title,
+        'description': prompt.description,
+        'content': prompt.content,
+        'category': prompt.category.name,
+        'price_type': prompt.price_type,
+        'price': float(prompt.price),
+        'status': prompt.status,
+        'created_at': prompt.created_at.isoformat(),
+        'views': prompt.views,
+        'downloads': prompt.downloads,
+        'purchases': prompt.purchases,
+        'earnings': float(prompt.total_earnings),
+    }
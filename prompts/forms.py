@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
@@ -6,9 +7,109 @@ from django.db.models import Q
 import re
 
 from .models import Prompt, Category, Tag, Review
+from .tagging import set_prompt_tags
 
 User = get_user_model()
 
+INAPPROPRIATE_TITLE_WORDS = ['spam', 'scam', 'fake', 'test']
+PROMPT_INSTRUCTION_KEYWORDS = ['you are', 'act as', 'role', 'task', 'generate', 'create']
+
+
+def validate_prompt_title(title):
+    """Validate prompt title length and content (uniqueness is checked separately)."""
+    if len(title) < 10:
+        raise forms.ValidationError("Title must be at least 10 characters long.")
+    
+    if len(title) > 200:
+        raise forms.ValidationError("Title must be no more than 200 characters.")
+    
+    if any(word in title.lower() for word in INAPPROPRIATE_TITLE_WORDS):
+        raise forms.ValidationError("Title contains inappropriate content.")
+    
+    return title
+
+
+def validate_prompt_description(description):
+    """Validate prompt description length."""
+    if len(description) < 50:
+        raise forms.ValidationError("Description must be at least 50 characters long.")
+    
+    if len(description) > 1000:
+        raise forms.ValidationError("Description must be no more than 1000 characters.")
+    
+    return description
+
+
+def validate_prompt_content(content):
+    """Validate prompt content length and structure."""
+    if len(content) < 20:
+        raise forms.ValidationError("Prompt content must be at least 20 characters long.")
+    
+    if len(content) > 10000:
+        raise forms.ValidationError("Prompt content must be no more than 10,000 characters.")
+    
+    # Check for common prompt patterns
+    if not any(keyword in content.lower() for keyword in PROMPT_INSTRUCTION_KEYWORDS):
+        raise forms.ValidationError("Prompt content should include clear instructions or role definitions.")
+    
+    return content
+
+
+def validate_prompt_price(price, price_type):
+    """Validate price based on price type."""
+    if price_type == 'paid':
+        if price <= 0:
+            raise forms.ValidationError("Paid prompts must have a price greater than 0.")
+        if price > 1000:
+            raise forms.ValidationError("Price cannot exceed $1,000.")
+    else:
+        if price != 0:
+            raise forms.ValidationError("Free prompts must have a price of 0.")
+    
+    return price
+
+
+def validate_meta_title(meta_title):
+    """Validate meta title length."""
+    if meta_title and len(meta_title) > 60:
+        raise forms.ValidationError("Meta title must be no more than 60 characters.")
+    return meta_title
+
+
+def validate_meta_description(meta_description):
+    """Validate meta description length."""
+    if meta_description and len(meta_description) > 160:
+        raise forms.ValidationError("Meta description must be no more than 160 characters.")
+    return meta_description
+
+
+def parse_tag_names(tags_input):
+    """Split a comma-separated string (or list) of tags and validate each name."""
+    if not tags_input:
+        return []
+    
+    if isinstance(tags_input, str):
+        tags_input = tags_input.split(',')
+    tag_names = [str(tag).strip() for tag in tags_input if str(tag).strip()]
+    
+    # Validate each tag
+    cleaned_tags = []
+    for tag_name in tag_names:
+        if len(tag_name) < 2:
+            raise forms.ValidationError(f"Tag '{tag_name}' is too short (minimum 2 characters).")
+        if len(tag_name) > 30:
+            raise forms.ValidationError(f"Tag '{tag_name}' is too long (maximum 30 characters).")
+        if not re.match(r'^[a-zA-Z0-9\s\-_]+$', tag_name):
+            raise forms.ValidationError(f"Tag '{tag_name}' contains invalid characters.")
+        cleaned_tags.append(tag_name)
+    
+    # Limit number of tags
+    if len(cleaned_tags) > 10:
+        raise forms.ValidationError("You can add a maximum of 10 tags.")
+    
+    return cleaned_tags
+
+
 class PromptForm(forms.ModelForm):
     """Enhanced form for creating and editing prompts."""
     
@@ -121,10 +222,9 @@ class PromptForm(forms.ModelForm):
         # Set initial values for custom fields
         if self.instance.pk:
             # Tags
-            if self.instance.tags.exists():
-                self.fields['tags_input'].initial = ', '.join(
-                    self.instance.tags.values_list('name', flat=True)
-                )
+            tag_names = list(self.instance.tags.values_list('name', flat=True))
+            if tag_names:
+                self.fields['tags_input'].initial = ', '.join(tag_names)
             
             # AI models
             if self.instance.ai_model_compatibility:
@@ -140,20 +240,7 @@ class PromptForm(forms.ModelForm):
 
     def clean_title(self):
         """Validate title and ensure uniqueness."""
-        title = self.cleaned_data['title']
-        
-        # Check for minimum length
-        if len(title) < 10:
-            raise forms.ValidationError("Title must be at least 10 characters long.")
-        
-        # Check for maximum length
-        if len(title) > 200:
-            raise forms.ValidationError("Title must be no more than 200 characters.")
-        
-        # Check for inappropriate content
-        inappropriate_words = ['spam', 'scam', 'fake', 'test']
-        if any(word in title.lower() for word in inappropriate_words):
-            raise forms.ValidationError("Title contains inappropriate content.")
+        title = validate_prompt_title(self.cleaned_data['title'])
         
         # Check for uniqueness (excluding current instance)
         slug = slugify(title)
@@ -168,87 +255,27 @@ class PromptForm(forms.ModelForm):
 
     def clean_description(self):
         """Validate description."""
-        description = self.cleaned_data['description']
-        
-        if len(description) < 50:
-            raise forms.ValidationError("Description must be at least 50 characters long.")
-        
-        if len(description) > 1000:
-            raise forms.ValidationError("Description must be no more than 1000 characters.")
-        
-        return description
+        return validate_prompt_description(self.cleaned_data['description'])
 
     def clean_content(self):
         """Validate prompt content."""
-        content = self.cleaned_data['content']
-        
-        if len(content) < 20:
-            raise forms.ValidationError("Prompt content must be at least 20 characters long.")
-        
-        if len(content) > 10000:
-            raise forms.ValidationError("Prompt content must be no more than 10,000 characters.")
-        
-        # Check for common prompt patterns
-        if not any(keyword in content.lower() for keyword in ['you are', 'act as', 'role', 'task', 'generate', 'create']):
-            raise forms.ValidationError("Prompt content should include clear instructions or role definitions.")
-        
-        return content
+        return validate_prompt_content(self.cleaned_data['content'])
 
     def clean_price(self):
         """Validate price based on price type."""
-        price = self.cleaned_data['price']
-        price_type = self.cleaned_data.get('price_type')
-        
-        if price_type == 'paid':
-            if price <= 0:
-                raise forms.ValidationError("Paid prompts must have a price greater than 0.")
-            if price > 1000:
-                raise forms.ValidationError("Price cannot exceed $1,000.")
-        else:
-            if price != 0:
-                raise forms.ValidationError("Free prompts must have a price of 0.")
-        
-        return price
+        return validate_prompt_price(self.cleaned_data['price'], self.cleaned_data.get('price_type'))
 
     def clean_meta_title(self):
         """Validate meta title length."""
-        meta_title = self.cleaned_data['meta_title']
-        if meta_title and len(meta_title) > 60:
-            raise forms.ValidationError("Meta title must be no more than 60 characters.")
-        return meta_title
+        return validate_meta_title(self.cleaned_data['meta_title'])
 
     def clean_meta_description(self):
         """Validate meta description length."""
-        meta_description = self.cleaned_data['meta_description']
-        if meta_description and len(meta_description) > 160:
-            raise forms.ValidationError("Meta description must be no more than 160 characters.")
-        return meta_description
+        return validate_meta_description(self.cleaned_data['meta_description'])
 
     def clean_tags_input(self):
         """Process and validate tags input."""
-        tags_input = self.cleaned_data['tags_input']
-        if not tags_input:
-            return []
-        
-        # Split by comma and clean
-        tag_names = [tag.strip() for tag in tags_input.split(',') if tag.strip()]
-        
-        # Validate each tag
-        cleaned_tags = []
-        for tag_name in tag_names:
-            if len(tag_name) < 2:
-                raise forms.ValidationError(f"Tag '{tag_name}' is too short (minimum 2 characters).")
-            if len(tag_name) > 30:
-                raise forms.ValidationError(f"Tag '{tag_name}' is too long (maximum 30 characters).")
-            if not re.match(r'^[a-zA-Z0-9\s\-_]+$', tag_name):
-                raise forms.ValidationError(f"Tag '{tag_name}' contains invalid characters.")
-            cleaned_tags.append(tag_name)
-        
-        # Limit number of tags
-        if len(cleaned_tags) > 10:
-            raise forms.ValidationError("You can add a maximum of 10 tags.")
-        
-        return cleaned_tags
+        return parse_tag_names(self.cleaned_data['tags_input'])
 
     def clean_ai_models(self):
         """Process AI models input."""
@@ -272,20 +299,6 @@ class PromptForm(forms.ModelForm):
         """Save the prompt with processed custom fields."""
         prompt = super().save(commit=False)
         
-        # Process tags
-        tag_names = self.cleaned_data.get('tags_input', [])
-        if commit:
-            prompt.save()
-            
-            # Clear existing tags and add new ones
-            prompt.tags.clear()
-            for tag_name in tag_names:
-                tag, created = Tag.objects.get_or_create(
-                    name=tag_name,
-                    defaults={'slug': slugify(tag_name)}
-                )
-                prompt.tags.add(tag)
-        
         # Process other custom fields
         prompt.ai_model_compatibility = self.cleaned_data.get('ai_models', [])
         prompt.use_cases = self.cleaned_data.get('use_cases_input', [])
@@ -293,9 +306,15 @@ class PromptForm(forms.ModelForm):
         
         if commit:
             prompt.save()
+            self.save_m2m()
         
         return prompt
 
+    def _save_m2m(self):
+        """Save M2M data, syncing tags through the bulk tag service."""
+        super()._save_m2m()
+        set_prompt_tags(self.instance, self.cleaned_data.get('tags_input', []))
+
 class ReviewForm(forms.ModelForm):
     """Form for adding reviews to prompts."""
     
@@ -540,8 +559,11 @@ class BulkPromptForm(forms.Form):
         if action == 'change_category' and not cleaned_data.get('new_category'):
             raise forms.ValidationError("Please select a new category.")
         
-        if action == 'change_price' and cleaned_data.get('new_price') is None:
-            raise forms.ValidationError("Please enter a new price.")
+        if action == 'change_price':
+            new_price = cleaned_data.get('new_price')
+            if new_price is None:
+                raise forms.ValidationError("Please enter a new price.")
+            validate_prompt_price(new_price, 'paid' if new_price > 0 else 'free')
         
         return cleaned_data
     
@@ -556,9 +578,9 @@ class PromptImportForm(forms.Form):
     json_file = forms.FileField(
         widget=forms.FileInput(attrs={
             'class': 'form-control',
-            'accept': '.json'
+            'accept': '.json,.ndjson,.jsonl'
         }),
-        help_text="Upload a JSON file containing prompts to import"
+        help_text="Upload a JSON array or NDJSON file containing prompts to import"
     )
     
     overwrite_existing = forms.BooleanField(
@@ -569,20 +591,20 @@ class PromptImportForm(forms.Form):
     )
     
     def clean_json_file(self):
-        """Validate JSON file."""
+        """Validate the uploaded file without loading it into memory."""
         json_file = self.cleaned_data['json_file']
         
-        if not json_file.name.endswith('.json'):
+        if not json_file.name.endswith(('.json', '.ndjson', '.jsonl')):
             raise forms.ValidationError("Please upload a JSON file.")
         
-        if json_file.size > 5 * 1024 * 1024:  # 5MB limit
-            raise forms.ValidationError("File size must be less than 5MB.")
+        if json_file.size > settings.PROMPT_IMPORT_MAX_UPLOAD_SIZE:
+            max_mb = settings.PROMPT_IMPORT_MAX_UPLOAD_SIZE // (1024 * 1024)
+            raise forms.ValidationError(f"File size must be less than {max_mb}MB.")
         
-        try:
-            import json
-            json.load(json_file)
-            json_file.seek(0)  # Reset file pointer
-        except json.JSONDecodeError:
+        # Rows are parsed incrementally by the importer; only sniff the first byte here
+        head = json_file.read(1024).lstrip(b'\xef\xbb\xbf \t\r\n')
+        json_file.seek(0)  # Reset file pointer
+        if not head.startswith((b'[', b'{')):
             raise forms.ValidationError("Invalid JSON file.")
         
-        return json_file 
\ No newline at end of file
+        return json_file
@@ -0,0 +1,294 @@
+import codecs
+import json
+from decimal import Decimal, InvalidOperation
+
+from django import forms
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .cache import invalidate_on_commit
+from .forms import (
+    parse_tag_names, validate_meta_description, validate_meta_title, validate_prompt_content,
+    validate_prompt_description, validate_prompt_price, validate_prompt_title,
+)
+from .models import Category, Prompt
+from .tagging import set_tags_for_prompts
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Validated row fields copied onto Prompt instances
+ROW_FIELDS = [
+    'title', 'description', 'content', 'preview_content', 'price_type', 'price', 'status',
+    'difficulty_level', 'estimated_tokens', 'ai_model_compatibility', 'use_cases', 'keywords',
+    'meta_title', 'meta_description',
+]
+
+# Fields written when an existing prompt is overwritten by an import row
+UPDATE_FIELDS = ROW_FIELDS + ['category', 'published_at', 'updated_at']
+
+
+def _string_list(value, separator):
+    """Normalize a list or ``separator``-delimited string into at most 10 stripped strings."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(separator)
+    elif not isinstance(value, list):
+        value = [value]
+    return [str(item).strip() for item in value if str(item).strip()][:10]
+
+
+class PromptImportError(ValueError):
+    """Raised when the uploaded file is not a JSON array or stream of objects."""
+
+
+def iter_json_records(fileobj, chunk_size=READ_CHUNK_SIZE):
+    """
+    Incrementally decode JSON objects from ``fileobj``.
+
+    Accepts either a top-level JSON array or a stream of objects such as
+    NDJSON. Only one chunk plus the record being decoded is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = fileobj.read(chunk_size)
+        if isinstance(chunk, bytes):
+            chunk = text_decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def next_char():
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer) or eof:
+                return buffer[pos] if pos < len(buffer) else ''
+            read_more()
+
+    in_array = next_char() == '['
+    if in_array:
+        pos += 1
+
+    expect_separator = False
+    while True:
+        char = next_char()
+        if not char:
+            if in_array:
+                raise PromptImportError("Unexpected end of file: unterminated JSON array.")
+            return
+        if in_array:
+            if char == ']':
+                return
+            if expect_separator:
+                if char != ',':
+                    raise PromptImportError("Invalid JSON: expected ',' between records.")
+                pos += 1
+                expect_separator = False
+                continue
+
+        try:
+            record, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise PromptImportError("Invalid JSON file.")
+            read_more()
+            continue
+        if end == len(buffer) and not eof:
+            # The value may continue in the next chunk (e.g. a trailing number)
+            read_more()
+            continue
+
+        pos = end
+        expect_separator = in_array
+        yield record
+
+
+class ImportResult:
+    """Outcome of an import run: counts plus a per-row error report."""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+        self.fatal_error = ''
+
+    @property
+    def total_rows(self):
+        return self.created + self.updated + len(self.errors)
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'errors': self.errors,
+            'fatal_error': self.fatal_error,
+        }
+
+
+class PromptImporter:
+    """
+    Bulk import prompts for ``author``.
+
+    Rows are validated with the same rules as ``PromptForm``; categories and
+    tags are resolved with one lookup per batch (tags via
+    ``prompts.tagging``), new prompts are inserted
+    with ``bulk_create`` and, when ``overwrite_existing`` is set, the
+    author's prompts with the same title are updated with ``bulk_update``.
+    """
+
+    def __init__(self, author, overwrite_existing=False, batch_size=None):
+        self.author = author
+        self.overwrite_existing = overwrite_existing
+        self.batch_size = batch_size or settings.PROMPT_IMPORT_BATCH_SIZE
+        self.result = ImportResult()
+
+    def run(self, fileobj):
+        batch = []
+        try:
+            for row_number, record in enumerate(iter_json_records(fileobj), start=1):
+                batch.append((row_number, record))
+                if len(batch) >= self.batch_size:
+                    self.import_batch(batch)
+                    batch = []
+            if batch:
+                self.import_batch(batch)
+        except PromptImportError as e:
+            self.result.fatal_error = str(e)
+        return self.result
+
+    def clean_row(self, record):
+        """Validate a raw record, returning ``(cleaned_data, errors)``."""
+        if not isinstance(record, dict):
+            return None, {'__all__': ["Each record must be a JSON object."]}
+
+        cleaned = {}
+        errors = {}
+
+        def check(field, validator, *args):
+            try:
+                cleaned[field] = validator(*args)
+            except forms.ValidationError as e:
+                errors[field] = e.messages
+
+        required = {
+            'title': validate_prompt_title,
+            'description': validate_prompt_description,
+            'content': validate_prompt_content,
+            'category': str,
+        }
+        for field, validator in required.items():
+            value = str(record.get(field) or '').strip()
+            if value:
+                check(field, validator, value)
+            else:
+                errors[field] = ["This field is required."]
+        cleaned['preview_content'] = str(record.get('preview_content') or '')
+
+        price_type = str(record.get('price_type') or 'free')
+        if price_type not in dict(Prompt.PRICE_TYPES):
+            errors['price_type'] = [f"Invalid price type '{price_type}'."]
+        cleaned['price_type'] = price_type
+        try:
+            price = Decimal(str(record.get('price') or 0)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            errors['price'] = ["Enter a number."]
+        else:
+            check('price', validate_prompt_price, price, price_type)
+
+        status = str(record.get('status') or 'draft')
+        if status not in dict(Prompt.STATUS_CHOICES):
+            errors['status'] = [f"Invalid status '{status}'."]
+        cleaned['status'] = status
+        difficulty_level = str(record.get('difficulty_level') or 'intermediate')
+        if difficulty_level not in dict(Prompt.DIFFICULTY_LEVELS):
+            errors['difficulty_level'] = [f"Invalid difficulty level '{difficulty_level}'."]
+        cleaned['difficulty_level'] = difficulty_level
+        try:
+            cleaned['estimated_tokens'] = max(int(record.get('estimated_tokens') or 0), 0)
+        except (TypeError, ValueError):
+            errors['estimated_tokens'] = ["Enter a whole number."]
+
+        check('tags', parse_tag_names, record.get('tags'))
+        check('meta_title', validate_meta_title, str(record.get('meta_title') or ''))
+        check('meta_description', validate_meta_description, str(record.get('meta_description') or ''))
+        cleaned['ai_model_compatibility'] = _string_list(record.get('ai_model_compatibility') or record.get('ai_models'), ',')
+        cleaned['use_cases'] = _string_list(record.get('use_cases'), '\n')
+        cleaned['keywords'] = str(record.get('keywords') or '')
+
+        if 'title' in cleaned:
+            cleaned['slug'] = slugify(cleaned['title'])
+            if not cleaned['slug']:
+                errors['title'] = ["Title must contain letters or numbers."]
+
+        return cleaned, errors
+
+    def import_batch(self, batch):
+        rows = []
+        seen_slugs = set()
+        for row_number, record in batch:
+            cleaned, errors = self.clean_row(record)
+            if not errors and cleaned['slug'] in seen_slugs:
+                errors = {'title': ["Duplicate title within the import file."]}
+            if errors:
+                self.result.add_error(row_number, errors)
+                continue
+            seen_slugs.add(cleaned['slug'])
+            rows.append((row_number, cleaned))
+        if not rows:
+            return
+
+        categories = {
+            category.name: category
+            for category in Category.objects.filter(name__in={cleaned['category'] for _, cleaned in rows})
+        }
+        existing = {
+            prompt.slug: prompt
+            for prompt in Prompt.objects.filter(slug__in=seen_slugs).only('id', 'slug', 'author_id', 'published_at')
+        }
+
+        now = timezone.now()
+        to_create = []
+        to_update = []
+        for row_number, cleaned in rows:
+            category = categories.get(cleaned['category'])
+            if category is None:
+                self.result.add_error(row_number, {'category': [f"Unknown category '{cleaned['category']}'."]})
+                continue
+
+            current = existing.get(cleaned['slug'])
+            if current is not None and (not self.overwrite_existing or current.author_id != self.author.pk):
+                self.result.add_error(row_number, {'title': ["A prompt with this title already exists."]})
+                continue
+
+            prompt = current if current is not None else Prompt(author=self.author, slug=cleaned['slug'])
+            for field in ROW_FIELDS:
+                setattr(prompt, field, cleaned[field])
+            prompt.category = category
+            prompt.updated_at = now
+            prompt.populate_derived_fields()
+            (to_update if current is not None else to_create).append((prompt, cleaned['tags']))
+
+        with transaction.atomic():
+            if to_create:
+                Prompt.objects.bulk_create([prompt for prompt, _ in to_create], batch_size=self.batch_size)
+            if to_update:
+                Prompt.objects.bulk_update([prompt for prompt, _ in to_update], UPDATE_FIELDS, batch_size=self.batch_size)
+            set_tags_for_prompts({prompt.pk: tag_names for prompt, tag_names in to_create + to_update})
+            invalidate_on_commit(Prompt)
+
+        self.result.created += len(to_create)
+        self.result.updated += len(to_update)
@@ -0,0 +1,181 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from prompts.benchmarking import (
+    benchmark_fixtures, compare_results, default_targets, failed_targets, run_client_benchmark, run_http_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the marketplace hot paths and emit JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=str,
+            default='',
+            help='Comma-separated catalog sizes; each is seeded into a fresh test database'
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=20,
+            help='Measured requests per target (test client mode)'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=2,
+            help='Unmeasured warm-up requests per target'
+        )
+        parser.add_argument(
+            '--targets',
+            type=str,
+            default='',
+            help='Comma-separated subset of targets to run'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed used when seeding --sizes databases'
+        )
+
+        # HTTP load generator
+        parser.add_argument(
+            '--url',
+            type=str,
+            default='',
+            help='Base URL of a running server sharing this database; enables HTTP load mode'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per target (HTTP load mode)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=8,
+            help='Concurrent connections (HTTP load mode)'
+        )
+
+        # Output
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='',
+            help='Write JSON results to this file instead of stdout'
+        )
+        parser.add_argument(
+            '--compare',
+            type=str,
+            default='',
+            help='Baseline JSON results to compare against'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='Fractional p95 increase reported as a regression'
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        if sizes and options['url']:
+            raise CommandError('--sizes seeds throwaway databases a server cannot see; use --url without --sizes.')
+
+        if sizes:
+            results = {}
+            for size in sizes:
+                results[f'prompts={size}'] = self.benchmark_size(size, options)
+        else:
+            label = 'http' if options['url'] else 'client'
+            results = {label: self.run_targets(options)}
+
+        report = {
+            'vendor': connection.vendor,
+            'options': {
+                key: options[key]
+                for key in ('iterations', 'warmup', 'requests', 'concurrency', 'url', 'seed')
+            },
+            'results': results,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+        else:
+            self.stdout.write(payload)
+
+        failures = failed_targets(results)
+        for label, name, statuses in failures:
+            self.stderr.write(self.style.ERROR(f'{label} {name}: unexpected responses {statuses}'))
+        if options['compare']:
+            self.report_regressions(results, options)
+        if failures:
+            raise CommandError(f'{len(failures)} target(s) failed; their timings are not valid')
+
+    def benchmark_size(self, size, options):
+        """Seed a fresh test database with ``size`` prompts and benchmark it."""
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stderr.write(f'Seeding {size} prompts...')
+            call_command(
+                'generate_sample_data',
+                scale=True,
+                prompts=size,
+                users=max(20, size // 20),
+                reviews=size * 2,
+                downloads=size * 5,
+                purchases=size,
+                favorites=size,
+                analytics_days=7,
+                seed=options['seed'],
+                stdout=self.stderr,
+            )
+            return self.run_targets(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_targets(self, options):
+        try:
+            fixtures = benchmark_fixtures()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        targets = default_targets(fixtures)
+        if options['targets']:
+            wanted = {name.strip() for name in options['targets'].split(',')}
+            unknown = wanted - {target.name for target in targets}
+            if unknown:
+                raise CommandError(f'Unknown targets: {", ".join(sorted(unknown))}')
+            targets = [target for target in targets if target.name in wanted]
+
+        if options['url']:
+            return run_http_benchmark(
+                targets, options['url'],
+                requests=options['requests'],
+                concurrency=options['concurrency'],
+            )
+        return run_client_benchmark(targets, iterations=options['iterations'], warmup=options['warmup'])
+
+    def report_regressions(self, results, options):
+        with open(options['compare']) as f:
+            baseline = json.load(f)['results']
+
+        regressions = compare_results(baseline, results, threshold=options['threshold'])
+        if not regressions:
+            self.stderr.write(self.style.SUCCESS('No p95 regressions against baseline'))
+            return
+        for label, name, before, after, change in regressions:
+            self.stderr.write(self.style.WARNING(
+                f'{label} {name}: p95 {before:.1f}ms -> {after:.1f}ms (+{change:.0%})'
+            ))
+        raise CommandError(f'{len(regressions)} target(s) regressed beyond {options["threshold"]:.0%}')
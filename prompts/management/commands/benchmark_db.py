@@ -0,0 +1,123 @@
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from prompt_platform.database import BASELINE_OVERRIDES
+from prompts.benchmarking import DatabaseLoad, database_profile, scratch_database
+from prompts.models import Prompt
+
+PROFILES = ('tuned', 'baseline')
+
+
+class Command(BaseCommand):
+    help = 'Compare the tuned database profile with stock settings under concurrent reads and writes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=str,
+            default='1,2,4,8',
+            help='Comma-separated numbers of concurrent worker threads'
+        )
+        parser.add_argument(
+            '--duration',
+            type=float,
+            default=5.0,
+            help='Seconds to run each profile at each worker count'
+        )
+        parser.add_argument(
+            '--write-ratio',
+            type=float,
+            default=0.2,
+            help='Fraction of operations that are counter updates rather than catalog reads'
+        )
+        parser.add_argument(
+            '--prompts',
+            type=int,
+            default=2000,
+            help='Prompts seeded into the scratch database'
+        )
+        parser.add_argument(
+            '--profiles',
+            type=str,
+            default=','.join(PROFILES),
+            help='Comma-separated profiles to run: tuned (the configured settings), baseline (stock settings)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the sample data and the operation mix'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='',
+            help='Write JSON results to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        workers = [int(count) for count in options['workers'].split(',') if count.strip()]
+        profiles = [name.strip() for name in options['profiles'].split(',') if name.strip()]
+        unknown = set(profiles) - set(PROFILES)
+        if unknown:
+            raise CommandError(f'Unknown profiles: {", ".join(sorted(unknown))}')
+        if not 0 <= options['write_ratio'] <= 1:
+            raise CommandError('--write-ratio must be between 0 and 1.')
+
+        results = {}
+        with scratch_database('benchmark-db'):
+            self.seed(options)
+            load = DatabaseLoad(
+                list(Prompt.objects.values_list('pk', flat=True)),
+                write_ratio=options['write_ratio'],
+                seed=options['seed'],
+            )
+            for profile in profiles:
+                overrides = BASELINE_OVERRIDES.get(connection.vendor, {}) if profile == 'baseline' else {}
+                results[profile] = {}
+                with database_profile(overrides):
+                    for count in workers:
+                        summary = load.run(count, options['duration'])
+                        results[profile][f'workers={count}'] = summary
+                        self.stderr.write(
+                            f'{profile} workers={count}: '
+                            f'{summary["read"].get("throughput_rps", 0)} reads/s, '
+                            f'{summary["write"].get("throughput_rps", 0)} writes/s, '
+                            f'{summary["read"]["errors"] + summary["write"]["errors"]} errors'
+                        )
+
+        report = {
+            'vendor': connection.vendor,
+            'options': {
+                key: options[key]
+                for key in ('duration', 'write_ratio', 'prompts', 'seed')
+            },
+            'results': results,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+        else:
+            self.stdout.write(payload)
+
+    def seed(self, options):
+        size = options['prompts']
+        self.stderr.write(f'Seeding {size} prompts...')
+        call_command(
+            'generate_sample_data',
+            scale=True,
+            prompts=size,
+            users=max(20, size // 20),
+            reviews=size,
+            downloads=size,
+            purchases=size // 2,
+            favorites=size // 2,
+            analytics_days=1,
+            seed=options['seed'],
+            stdout=self.stderr,
+        )
@@ -0,0 +1,184 @@
+import json
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from prompts.benchmarking import (
+    benchmark_fixtures, default_targets, failed_targets, free_port, run_http_benchmark, running_server,
+    scratch_database,
+)
+
+SERVERS = ('gunicorn', 'uvicorn')
+DEFAULT_TARGETS = 'prompt_list,prompt_detail,category_detail,tag_detail,api_search'
+
+
+class Command(BaseCommand):
+    help = 'Compare gunicorn (sync views) with uvicorn (async views) under concurrent HTTP load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--servers',
+            type=str,
+            default=','.join(SERVERS),
+            help='Comma-separated servers to run: gunicorn (WSGI, gthread workers), uvicorn (ASGI)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Worker processes per server'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=4,
+            help='Threads per gunicorn worker'
+        )
+        parser.add_argument(
+            '--targets',
+            type=str,
+            default=DEFAULT_TARGETS,
+            help='Comma-separated targets to run'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=500,
+            help='Requests per target'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Concurrent connections'
+        )
+        parser.add_argument(
+            '--prompts',
+            type=int,
+            default=2000,
+            help='Prompts seeded into the scratch database'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the sample data'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='',
+            help='Write JSON results to this file instead of stdout'
+        )
+
+    def handle(self, *args, **options):
+        servers = [name.strip() for name in options['servers'].split(',') if name.strip()]
+        unknown = set(servers) - set(SERVERS)
+        if unknown:
+            raise CommandError(f'Unknown servers: {", ".join(sorted(unknown))}')
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_servers seeds a scratch SQLite database; run it with a sqlite DATABASE_URL.')
+
+        results = {}
+        with scratch_database('benchmark-servers'):
+            self.seed(options)
+            targets = self.select_targets(options)
+            # The servers are separate processes; point them at the scratch database
+            env = {
+                'DATABASE_URL': f'sqlite:///{connection.settings_dict["NAME"]}',
+                'DATABASE_REPLICA_URLS': '',
+                'DEBUG': 'False',
+            }
+            for server in servers:
+                port = free_port()
+                self.stderr.write(f'Starting {server} on port {port}...')
+                # Each server gets the views it runs best: sync under WSGI, async under ASGI
+                server_env = dict(env, ASYNC_VIEWS=str(server == 'uvicorn'))
+                try:
+                    with running_server(self.command(server, port, options), port, env=server_env) as base_url:
+                        results[server] = run_http_benchmark(
+                            targets, base_url,
+                            requests=options['requests'],
+                            concurrency=options['concurrency'],
+                        )
+                except RuntimeError as e:
+                    raise CommandError(f'{server}: {e}')
+                for name, summary in results[server].items():
+                    self.stderr.write(
+                        f'{server} {name}: {summary.get("throughput_rps", 0)} req/s, '
+                        f'p95 {summary.get("p95_ms", 0)}ms, {summary["errors"]} errors'
+                        + (f', FAILED {summary["statuses"]}' if summary['failed'] else '')
+                    )
+
+        report = {
+            'vendor': connection.vendor,
+            'options': {
+                key: options[key]
+                for key in ('workers', 'threads', 'requests', 'concurrency', 'prompts', 'seed')
+            },
+            'results': results,
+        }
+        payload = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(payload + '\n')
+            self.stdout.write(self.style.SUCCESS(f'Wrote results to {options["output"]}'))
+        else:
+            self.stdout.write(payload)
+
+        failures = failed_targets(results)
+        if failures:
+            names = ', '.join(f'{server} {name}' for server, name, _ in failures)
+            raise CommandError(f'{len(failures)} target(s) failed and are not comparable: {names}')
+
+    def command(self, server, port, options):
+        workers = str(options['workers'])
+        if server == 'gunicorn':
+            return [
+                sys.executable, '-m', 'gunicorn', 'prompt_platform.wsgi:application',
+                '--bind', f'127.0.0.1:{port}',
+                '--workers', workers,
+                '--worker-class', 'gthread',
+                '--threads', str(options['threads']),
+                '--log-level', 'warning',
+            ]
+        return [
+            sys.executable, '-m', 'uvicorn', 'prompt_platform.asgi:application',
+            '--host', '127.0.0.1',
+            '--port', str(port),
+            '--workers', workers,
+            '--log-level', 'warning',
+            '--no-access-log',
+        ]
+
+    def select_targets(self, options):
+        try:
+            fixtures = benchmark_fixtures()
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        targets = default_targets(fixtures)
+        wanted = {name.strip() for name in options['targets'].split(',') if name.strip()}
+        unknown = wanted - {target.name for target in targets}
+        if unknown:
+            raise CommandError(f'Unknown targets: {", ".join(sorted(unknown))}')
+        return [target for target in targets if target.name in wanted]
+
+    def seed(self, options):
+        size = options['prompts']
+        self.stderr.write(f'Seeding {size} prompts...')
+        call_command(
+            'generate_sample_data',
+            scale=True,
+            prompts=size,
+            users=max(20, size // 20),
+            reviews=size,
+            downloads=size,
+            purchases=size // 2,
+            favorites=size // 2,
+            analytics_days=1,
+            seed=options['seed'],
+            stdout=self.stderr,
+        )
@@ -7,6 +7,7 @@ import random
 from datetime import timedelta
 
 from prompts.models import Category, Tag, Prompt, Review, PromptDownload, PromptPurchase, UserFavorite, PromptAnalytics
+from prompts.sampledata import PROMPT_TEMPLATES, REVIEW_TEMPLATES, ScaleDataGenerator
 
 User = get_user_model()
 
@@ -32,10 +33,71 @@ class Command(BaseCommand):
             default=200,
             help='Number of reviews to create'
         )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Random seed for reproducible data'
+        )
+        
+        # Scale mode (load testing)
+        parser.add_argument(
+            '--scale',
+            action='store_true',
+            help='Seed large volumes with bulk inserts and Zipf-skewed activity'
+        )
+        parser.add_argument(
+            '--downloads',
+            type=int,
+            default=1000,
+            help='Number of downloads to create (scale mode)'
+        )
+        parser.add_argument(
+            '--purchases',
+            type=int,
+            default=500,
+            help='Number of purchases to create (scale mode)'
+        )
+        parser.add_argument(
+            '--favorites',
+            type=int,
+            default=500,
+            help='Number of favorites to create (scale mode)'
+        )
+        parser.add_argument(
+            '--analytics-days',
+            type=int,
+            default=30,
+            help='Days of analytics rows per prompt (scale mode)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per bulk insert (scale mode)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes producing rows in parallel (scale mode)'
+        )
+        parser.add_argument(
+            '--zipf',
+            type=float,
+            default=1.1,
+            help='Zipf exponent for creator, category, tag and prompt popularity (scale mode)'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write('Generating sample data...')
         
+        if options['scale']:
+            return self.handle_scale(options)
+        
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+        
         with transaction.atomic():
             self.create_categories()
             self.create_tags()
@@ -54,6 +116,30 @@ class Command(BaseCommand):
             )
         )
 
+    def handle_scale(self, options):
+        """Seed a large catalog for load testing."""
+        with transaction.atomic():
+            self.create_categories()
+            self.create_tags()
+        
+        generator = ScaleDataGenerator(
+            users=options['users'],
+            prompts=options['prompts'],
+            reviews=options['reviews'],
+            downloads=options['downloads'],
+            purchases=options['purchases'],
+            favorites=options['favorites'],
+            analytics_days=options['analytics_days'],
+            seed=options['seed'] or 0,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            zipf_exponent=options['zipf'],
+            stdout=self.stdout,
+        )
+        generator.run()
+        
+        self.stdout.write(self.style.SUCCESS('Successfully generated load-test data'))
+
     def create_categories(self):
         """Create sample categories."""
         categories_data = [
@@ -178,48 +264,7 @@ class Command(BaseCommand):
         tags = list(Tag.objects.all())
         prompts = []
         
-        prompt_templates = [
-            {
-                'title': 'Professional Email Writer',
-                'description': 'Generate professional, well-structured emails for business communication',
-                'content': 'You are a professional email writer. Write a {tone} email about {topic}. Include a clear subject line, proper greeting, body with key points, and professional closing.',
-                'preview_content': 'Subject: Follow-up on Project Discussion\n\nDear [Name],\n\nI hope this email finds you well. I wanted to follow up on our recent discussion regarding the project timeline...',
-                'price_type': 'free',
-                'difficulty_level': 'beginner'
-            },
-            {
-                'title': 'SEO Content Optimizer',
-                'description': 'Optimize your content for search engines with targeted keywords and structure',
-                'content': 'You are an SEO expert. Analyze and optimize the following content for the keyword "{keyword}". Provide suggestions for title, meta description, headings, and content improvements.',
-                'preview_content': 'Optimized Title: [Keyword-Rich Title]\nMeta Description: [Compelling 160-character description]\n\nH1: [Main Keyword]\nH2: [Related Keywords]\n\nContent optimization suggestions...',
-                'price_type': 'paid',
-                'difficulty_level': 'intermediate'
-            },
-            {
-                'title': 'Code Review Assistant',
-                'description': 'Get detailed code reviews and improvement suggestions for your programming projects',
-                'content': 'You are a senior software engineer conducting a code review. Review the following {language} code for:\n1. Code quality and best practices\n2. Performance optimizations\n3. Security vulnerabilities\n4. Readability and maintainability\n\nProvide specific suggestions and examples.',
-                'preview_content': 'Code Review Report:\n\n✅ Strengths:\n- Good variable naming\n- Proper error handling\n\n⚠️ Areas for Improvement:\n- Consider using async/await\n- Add input validation\n- Implement proper logging',
-                'price_type': 'paid',
-                'difficulty_level': 'advanced'
-            },
-            {
-                'title': 'Social Media Content Creator',
-                'description': 'Create engaging social media posts for various platforms and audiences',
-                'content': 'You are a social media content creator. Create {platform} content about {topic} that is engaging, shareable, and optimized for the platform. Include hashtags and call-to-action.',
-                'preview_content': '🚀 Exciting news! We just launched our new feature that will revolutionize how you work.\n\n✨ Key benefits:\n• 10x faster performance\n• Intuitive interface\n• 24/7 support\n\nTry it now: [link]\n\n#innovation #productivity #tech',
-                'price_type': 'free',
-                'difficulty_level': 'beginner'
-            },
-            {
-                'title': 'Business Plan Generator',
-                'description': 'Generate comprehensive business plans with market analysis and financial projections',
-                'content': 'You are a business consultant. Create a detailed business plan for {business_type} including:\n1. Executive Summary\n2. Market Analysis\n3. Competitive Analysis\n4. Marketing Strategy\n5. Financial Projections\n6. Risk Assessment',
-                'preview_content': 'Executive Summary:\n\n[Business Name] is a [business type] that will [value proposition]. We target [target market] and expect to generate $[revenue] in year one.\n\nMarket Analysis:\nThe [industry] market is valued at $[market_size]...',
-                'price_type': 'paid',
-                'difficulty_level': 'expert'
-            }
-        ]
+        prompt_templates = PROMPT_TEMPLATES
         
         for i in range(num_prompts):
             template = random.choice(prompt_templates)
@@ -269,28 +314,7 @@ class Command(BaseCommand):
 
     def create_reviews(self, num_reviews, prompts, users):
         """Create sample reviews."""
-        review_templates = [
-            {
-                'title': 'Excellent prompt!',
-                'comment': 'This prompt exceeded my expectations. Very well structured and produces high-quality results.'
-            },
-            {
-                'title': 'Great for beginners',
-                'comment': 'Perfect for someone just starting out. Clear instructions and easy to follow.'
-            },
-            {
-                'title': 'Highly recommended',
-                'comment': 'I use this prompt regularly and it consistently delivers great results.'
-            },
-            {
-                'title': 'Good value for money',
-                'comment': 'Worth every penny. The quality of output is much better than free alternatives.'
-            },
-            {
-                'title': 'Could be improved',
-                'comment': 'Good concept but could use more specific examples and better formatting.'
-            }
-        ]
+        review_templates = REVIEW_TEMPLATES
         
         for i in range(num_reviews):
             prompt = random.choice(prompts)
@@ -359,7 +383,7 @@ class Command(BaseCommand):
                             defaults={
                                 'amount': prompt.price,
                                 'payment_status': 'completed',
-                                'stripe_payment_intent_id': f'pi_{random.randint(100000, 999999)}',
+                                'stripe_payment_intent_id': f'pi_sample_{prompt.pk}_{user.pk}',
                                 'ip_address': f'192.168.1.{random.randint(1, 255)}',
                                 'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                                 'created_at': timezone.now() - timedelta(days=i, hours=random.randint(0, 23))
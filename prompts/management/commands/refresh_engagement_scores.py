@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from prompts.engagement import decay_scores, rebuild_scores
+
+
+class Command(BaseCommand):
+    help = 'Decay engagement scores, or recompute them from the counters when no half-life is set'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Recompute scores from the counters even with a half-life set (e.g. after changing weights)'
+        )
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=None,
+            help='Hours of decay to apply (defaults to ENGAGEMENT_REFRESH_HOURS, the interval this job runs at)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Prompts per UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild'] or not settings.ENGAGEMENT_HALF_LIFE_DAYS:
+            updated = rebuild_scores(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Recomputed engagement scores of {updated} prompts'))
+            return
+
+        hours = options['hours'] if options['hours'] is not None else settings.ENGAGEMENT_REFRESH_HOURS
+        updated = decay_scores(hours, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Decayed engagement scores of {updated} prompts by {hours:g} hours '
+            f'(half-life {settings.ENGAGEMENT_HALF_LIFE_DAYS:g} days)'
+        ))
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from prompt_platform.replicas import PRIMARY
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database to the SQLite replicas, for trying replicas out locally'
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured; set DATABASE_REPLICA_URLS.')
+
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite' or any(connections[alias].vendor != 'sqlite' for alias in settings.DATABASE_REPLICAS):
+            raise CommandError('Only SQLite databases can be copied; PostgreSQL replicas follow the primary by replication.')
+
+        primary.ensure_connection()
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # SQLite's online backup: a consistent copy while the primary stays in use
+            primary.connection.backup(replica.connection)
+            self.stdout.write(self.style.SUCCESS(f'Copied {PRIMARY} to {alias} ({replica.settings_dict["NAME"]})'))
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 11:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='promptpurchase',
+            index=models.Index(fields=['prompt', 'payment_status', 'created_at'], name='purchase_prompt_status_idx'),
+        ),
+    ]
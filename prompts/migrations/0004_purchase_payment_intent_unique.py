@@ -0,0 +1,59 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:26
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models.functions import Greatest
+
+
+def dedupe_payment_intents(apps, schema_editor):
+    """
+    Make ``stripe_payment_intent_id`` unique before the constraint goes on.
+
+    For each duplicated id, the completed (else the earliest) purchase keeps
+    it. Copies for the same buyer and prompt were the redirect and the
+    webhook both recording one payment, so they are deleted and the prompt's
+    counter gives back their purchases; rows for anything else only
+    collided on a made-up id and lose it.
+    """
+    PromptPurchase = apps.get_model('prompts', 'PromptPurchase')
+    Prompt = apps.get_model('prompts', 'Prompt')
+
+    duplicated = PromptPurchase.objects.exclude(stripe_payment_intent_id='').values(
+        'stripe_payment_intent_id'
+    ).annotate(copies=models.Count('id')).filter(copies__gt=1).values_list('stripe_payment_intent_id', flat=True)
+
+    to_delete = []
+    to_blank = []
+    uncounted = Counter()
+    for intent_id in list(duplicated):
+        keeper, *others = PromptPurchase.objects.filter(stripe_payment_intent_id=intent_id).order_by(
+            models.Case(models.When(payment_status='completed', then=0), default=1), 'created_at', 'pk'
+        )
+        for purchase in others:
+            if (purchase.prompt_id, purchase.user_id) == (keeper.prompt_id, keeper.user_id):
+                to_delete.append(purchase.pk)
+                if purchase.payment_status == 'completed':
+                    uncounted[purchase.prompt_id] += 1
+            else:
+                to_blank.append(purchase.pk)
+
+    PromptPurchase.objects.filter(pk__in=to_delete).delete()
+    PromptPurchase.objects.filter(pk__in=to_blank).update(stripe_payment_intent_id='')
+    for prompt_id, count in uncounted.items():
+        Prompt.objects.filter(pk=prompt_id).update(purchases=Greatest(models.F('purchases') - count, 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0003_purchase_earnings_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_payment_intents, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='promptpurchase',
+            constraint=models.UniqueConstraint(condition=models.Q(('stripe_payment_intent_id', ''), _negated=True), fields=('stripe_payment_intent_id',), name='unique_purchase_payment_intent'),
+        ),
+    ]
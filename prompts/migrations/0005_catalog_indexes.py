@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:50
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0004_purchase_payment_intent_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'published')), fields=['-created_at'], name='prompt_published_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'published')), fields=['price'], name='prompt_published_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(models.OrderBy(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(models.F('views'), '+', models.F('downloads')), '+', models.F('purchases')), descending=True), condition=models.Q(('is_active', True), ('status', 'published')), name='prompt_published_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'published')), fields=['category', '-created_at'], name='prompt_published_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(fields=['author', '-created_at'], name='prompt_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promptdownload',
+            index=models.Index(fields=['prompt', 'created_at'], name='download_prompt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promptdownload',
+            index=models.Index(fields=['user', '-created_at'], name='download_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='promptpurchase',
+            index=models.Index(fields=['user', 'payment_status', 'created_at'], name='purchase_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['prompt', '-created_at'], name='review_prompt_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userfavorite',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-19 12:52
+
+from django.db import migrations, models
+
+
+# ENGAGEMENT_WEIGHTS as they stood when this migration was written; migrations
+# must not depend on live settings. Scores for other weights come from
+# ``refresh_engagement_scores --rebuild``.
+WEIGHTS = {'views': 1.0, 'downloads': 1.0, 'purchases': 1.0, 'favorites': 1.0}
+
+
+def populate_engagement_score(apps, schema_editor):
+    Prompt = apps.get_model('prompts', 'Prompt')
+    Prompt.objects.update(engagement_score=models.ExpressionWrapper(
+        models.F('views') * WEIGHTS['views']
+        + models.F('downloads') * WEIGHTS['downloads']
+        + models.F('purchases') * WEIGHTS['purchases']
+        + models.F('favorites') * WEIGHTS['favorites'],
+        output_field=models.FloatField(),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0005_catalog_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prompt',
+            name='prompt_published_popular_idx',
+        ),
+        migrations.AddField(
+            model_name='prompt',
+            name='engagement_score',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.RunPython(populate_engagement_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='prompt',
+            index=models.Index(condition=models.Q(('is_active', True), ('status', 'published')), fields=['-engagement_score'], name='prompt_published_popular_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def recount_tag_usage(apps, schema_editor):
+    # usage_count is now kept by deltas; start them from the actual through rows
+    Prompt = apps.get_model('prompts', 'Prompt')
+    Tag = apps.get_model('prompts', 'Tag')
+    uses = Prompt.tags.through.objects.filter(
+        tag_id=models.OuterRef('pk')
+    ).order_by().values('tag_id').annotate(total=models.Count('id')).values('total')
+    Tag.objects.update(usage_count=Coalesce(models.Subquery(uses), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prompts', '0007_bulkjob'),
+    ]
+
+    operations = [
+        migrations.RunPython(recount_tag_usage, migrations.RunPython.noop),
+    ]
@@ -1,15 +1,20 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
 from django.urls import reverse
-from django.db.models import Avg, Count, Sum
+from django.db.models import Avg, Count, F, Sum
 from django.utils import timezone
+from django.utils.functional import cached_property
 from datetime import timedelta
 import uuid
 
 User = get_user_model()
 
+# What the public catalog shows
+PUBLISHED = models.Q(status='published', is_active=True)
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
     slug = models.SlugField(max_length=100, unique=True)
@@ -41,11 +46,13 @@ class Category(models.Model):
 
     @property
     def total_earnings(self):
-        return self.prompts.filter(
-            is_active=True, 
-            price_type='paid'
+        return PromptPurchase.objects.filter(
+            prompt__category=self,
+            prompt__is_active=True,
+            prompt__price_type='paid',
+            payment_status='completed'
         ).aggregate(
-            total=Sum('purchases__amount')
+            total=Sum('amount')
         )['total'] or 0
 
 class Tag(models.Model):
@@ -118,6 +125,8 @@ class Prompt(models.Model):
     downloads = models.PositiveIntegerField(default=0)
     purchases = models.PositiveIntegerField(default=0)
     favorites = models.PositiveIntegerField(default=0)
+    # Weighted, optionally decayed, sum of the counters; see prompts.engagement
+    engagement_score = models.FloatField(default=0.0)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -131,11 +140,26 @@ class Prompt(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # The catalog only ever lists published, active prompts; partial indexes
+            # over just those rows serve each of its sort orders
+            models.Index(fields=['-created_at'], name='prompt_published_created_idx', condition=PUBLISHED),
+            models.Index(fields=['price'], name='prompt_published_price_idx', condition=PUBLISHED),
+            models.Index(fields=['-engagement_score'], name='prompt_published_popular_idx', condition=PUBLISHED),
+            models.Index(fields=['category', '-created_at'], name='prompt_published_cat_idx', condition=PUBLISHED),
+            # A creator's own prompts, newest first (dashboards)
+            models.Index(fields=['author', '-created_at'], name='prompt_author_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
     def save(self, *args, **kwargs):
+        self.populate_derived_fields()
+        super().save(*args, **kwargs)
+
+    def populate_derived_fields(self):
+        """Fill slug, SEO and publishing fields; also used by bulk writes that bypass save()"""
         if not self.slug:
             self.slug = slugify(self.title)
         
@@ -149,31 +173,50 @@ class Prompt(models.Model):
         if self.status == 'published' and not self.published_at:
             self.published_at = timezone.now()
         
-        super().save(*args, **kwargs)
+        # New prompts may come with counters (imports, sample data); afterwards the
+        # increment_* methods keep the score in step
+        if self._state.adding:
+            weights = settings.ENGAGEMENT_WEIGHTS
+            self.engagement_score = sum(
+                getattr(self, counter) * weights[counter]
+                for counter in ('views', 'downloads', 'purchases', 'favorites')
+            )
 
     def get_absolute_url(self):
         return reverse('prompts:prompt_detail', kwargs={'slug': self.slug})
 
+    # Counters are bumped with UPDATE ... SET n = n + 1 so concurrent requests don't lose
+    # increments; the same UPDATE adds the counter's weight to engagement_score, and the
+    # in-memory values are advanced to match
+    @classmethod
+    def bump_counter(cls, pk, counter, delta, **filters):
+        weight = settings.ENGAGEMENT_WEIGHTS[counter] * delta
+        return cls.objects.filter(pk=pk, **filters).update(**{
+            counter: F(counter) + delta,
+            'engagement_score': F('engagement_score') + weight,
+        })
+
+    def _bump(self, counter, delta, **filters):
+        updated = Prompt.bump_counter(self.pk, counter, delta, **filters)
+        if updated:
+            setattr(self, counter, max(getattr(self, counter) + delta, 0))
+            self.engagement_score += settings.ENGAGEMENT_WEIGHTS[counter] * delta
+        return updated
+
     def increment_views(self):
-        self.views += 1
-        self.save(update_fields=['views'])
+        self._bump('views', 1)
 
     def increment_downloads(self):
-        self.downloads += 1
-        self.save(update_fields=['downloads'])
+        self._bump('downloads', 1)
 
     def increment_purchases(self):
-        self.purchases += 1
-        self.save(update_fields=['purchases'])
+        self._bump('purchases', 1)
 
     def increment_favorites(self):
-        self.favorites += 1
-        self.save(update_fields=['favorites'])
+        self._bump('favorites', 1)
 
     def decrement_favorites(self):
-        if self.favorites > 0:
-            self.favorites -= 1
-            self.save(update_fields=['favorites'])
+        self._bump('favorites', -1, favorites__gt=0)
 
     @property
     def total_engagement(self):
@@ -187,16 +230,21 @@ class Prompt(models.Model):
             return 0
         return ((self.downloads + self.purchases) / self.views) * 100
 
+    @cached_property
+    def rating_stats(self):
+        """Average rating and number of reviews, fetched once per instance"""
+        return self.reviews.aggregate(average=Avg('rating'), total=Count('pk'))
+
     @property
     def average_rating(self):
         """Average rating from reviews"""
-        avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
+        avg = self.rating_stats['average']
         return round(avg, 1) if avg else 0
 
     @property
     def total_ratings(self):
         """Total number of reviews"""
-        return self.reviews.count()
+        return self.rating_stats['total']
 
     @property
     def total_earnings(self):
@@ -232,7 +280,7 @@ class Prompt(models.Model):
             tags__in=self.tags.all(),
             status='published',
             is_active=True
-        ).exclude(id=self.id).distinct()[:limit]
+        ).exclude(id=self.id).select_related('author').distinct()[:limit]
 
     def get_usage_statistics(self, days=30):
         """Get usage statistics for the last N days"""
@@ -267,6 +315,9 @@ class Review(models.Model):
     class Meta:
         unique_together = ['prompt', 'user']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['prompt', '-created_at'], name='review_prompt_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s review of {self.prompt.title}"
@@ -290,6 +341,11 @@ class PromptDownload(models.Model):
     class Meta:
         unique_together = ['prompt', 'user']
         ordering = ['-created_at']
+        indexes = [
+            # Recent downloads per prompt (trending, analytics) and per user (dashboard)
+            models.Index(fields=['prompt', 'created_at'], name='download_prompt_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='download_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} downloaded {self.prompt.title}"
@@ -321,6 +377,20 @@ class PromptPurchase(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Backs month/day-bounded earnings queries (see prompts.queries)
+            models.Index(fields=['prompt', 'payment_status', 'created_at'], name='purchase_prompt_status_idx'),
+            # A buyer's completed purchases, newest first, and "has this user bought it" checks
+            models.Index(fields=['user', 'payment_status', 'created_at'], name='purchase_user_status_idx'),
+        ]
+        constraints = [
+            # One purchase per Stripe payment, however many times it is finalized
+            models.UniqueConstraint(
+                fields=['stripe_payment_intent_id'],
+                condition=~models.Q(stripe_payment_intent_id=''),
+                name='unique_purchase_payment_intent',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user.username} purchased {self.prompt.title} for ${self.amount}"
@@ -348,6 +418,9 @@ class UserFavorite(models.Model):
     class Meta:
         unique_together = ['user', 'prompt']
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} favorited {self.prompt.title}"
@@ -378,6 +451,21 @@ class PromptAnalytics(models.Model):
     def __str__(self):
         return f"Analytics for {self.prompt.title} on {self.date}"
 
+    @classmethod
+    def add_views(cls, prompt_id, count=1, date=None):
+        """Add ``count`` views to the prompt's row for ``date`` (today), creating it if needed"""
+        if date is None:
+            date = timezone.localdate()
+        rows = cls.objects.filter(prompt_id=prompt_id, date=date)
+        if rows.update(views=F('views') + count, updated_at=timezone.now()):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(prompt_id=prompt_id, date=date, views=count)
+        except IntegrityError:
+            # Another view created the row first
+            rows.update(views=F('views') + count, updated_at=timezone.now())
+
     @classmethod
     def update_daily_analytics(cls, prompt, date=None):
         """Update daily analytics for a prompt"""
@@ -415,4 +503,30 @@ class PromptAnalytics(models.Model):
         ).aggregate(total=Sum('amount'))['total'] or 0.00
         
         analytics.save()
-        return analytics 
\ No newline at end of file
+        return analytics 
+
+class BulkJob(models.Model):
+    """Progress of a bulk action running in the background (see ``prompts.bulk``)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bulk_jobs')
+    action = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    affected = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.action} for {self.user} ({self.status})"
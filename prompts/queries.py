@@ -0,0 +1,87 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Avg, Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import PromptPurchase, Review
+
+
+def day_start(date, tz=None):
+    """Return the aware datetime at which ``date`` begins in ``tz``."""
+    tz = tz or timezone.get_current_timezone()
+    return timezone.make_aware(datetime.combine(date, time.min), tz)
+
+
+def month_range(moment=None, tz=None):
+    """
+    Return the half-open ``[month_start, next_month_start)`` range of the
+    month containing ``moment``, evaluated in ``tz`` (the active timezone by
+    default). Filtering on ``created_at__gte``/``created_at__lt`` keeps the
+    lookup sargable, unlike ``created_at__month``.
+    """
+    tz = tz or timezone.get_current_timezone()
+    local_date = timezone.localtime(moment or timezone.now(), tz).date()
+    first_day = local_date.replace(day=1)
+    next_first_day = (first_day + timedelta(days=32)).replace(day=1)
+    return day_start(first_day, tz), day_start(next_first_day, tz)
+
+
+def date_range(start_date, end_date, tz=None):
+    """Return the half-open datetime range covering ``[start_date, end_date)``."""
+    return day_start(start_date, tz), day_start(end_date, tz)
+
+
+def completed_purchases(author, start=None, end=None):
+    """Completed purchases of ``author``'s prompts, optionally bounded to ``[start, end)``."""
+    purchases = PromptPurchase.objects.filter(
+        prompt__author=author,
+        payment_status='completed'
+    )
+    if start is not None:
+        purchases = purchases.filter(created_at__gte=start)
+    if end is not None:
+        purchases = purchases.filter(created_at__lt=end)
+    return purchases
+
+
+def creator_earnings(author, start=None, end=None):
+    """Total completed purchase revenue for ``author``'s prompts within ``[start, end)``."""
+    return completed_purchases(author, start, end).aggregate(
+        total=Sum('amount')
+    )['total'] or 0
+
+
+def monthly_earnings(author, moment=None, tz=None):
+    """Earnings for the month containing ``moment`` in ``tz``."""
+    return creator_earnings(author, *month_range(moment, tz))
+
+
+def daily_totals(queryset, start, end, tz=None, **aggregates):
+    """
+    Group ``queryset`` rows created within ``[start, end)`` by local day.
+
+    Returns a dict mapping each date to its aggregate values, computed with a
+    single grouped query instead of one query per day.
+    """
+    tz = tz or timezone.get_current_timezone()
+    aggregates = aggregates or {'count': Count('id')}
+    rows = queryset.filter(
+        created_at__gte=start,
+        created_at__lt=end
+    ).annotate(
+        day=TruncDate('created_at', tzinfo=tz)
+    ).order_by().values('day').annotate(**aggregates)
+    return {row.pop('day'): row for row in rows}
+
+
+def with_rating_stats(queryset):
+    """
+    Annotate prompts with ``avg_rating`` and ``rating_count``, as correlated
+    subqueries so they can be combined with joins on other relations.
+    """
+    ratings = Review.objects.filter(prompt=OuterRef('pk')).order_by().values('prompt')
+    return queryset.annotate(
+        avg_rating=Coalesce(Subquery(ratings.annotate(avg=Avg('rating')).values('avg')), Value(0.0)),
+        rating_count=Coalesce(Subquery(ratings.annotate(total=Count('pk')).values('total')), 0),
+    )
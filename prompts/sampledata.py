@@ -0,0 +1,493 @@
+"""
+Sample and load-test data generation.
+
+``ScaleDataGenerator`` seeds large catalogs with ``bulk_create`` batches.
+Popularity follows a Zipf distribution (a few creators and prompts get most
+of the activity), (prompt, user) pairs are unique by construction, and all
+randomness derives from a single seed so runs are reproducible. Row
+production can be spread over worker processes while the parent inserts.
+"""
+import itertools
+import multiprocessing
+import random
+import time
+from bisect import bisect
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .cache import invalidate_on_commit
+from .engagement import rebuild_scores
+from .models import (
+    Category, Prompt, PromptAnalytics, PromptDownload, PromptPurchase, Review, Tag, UserFavorite,
+)
+
+User = get_user_model()
+
+PROMPT_TEMPLATES = [
+    {
+        'title': 'Professional Email Writer',
+        'description': 'Generate professional, well-structured emails for business communication',
+        'content': 'You are a professional email writer. Write a {tone} email about {topic}. Include a clear subject line, proper greeting, body with key points, and professional closing.',
+        'preview_content': 'Subject: Follow-up on Project Discussion\n\nDear [Name],\n\nI hope this email finds you well. I wanted to follow up on our recent discussion regarding the project timeline...',
+        'price_type': 'free',
+        'difficulty_level': 'beginner'
+    },
+    {
+        'title': 'SEO Content Optimizer',
+        'description': 'Optimize your content for search engines with targeted keywords and structure',
+        'content': 'You are an SEO expert. Analyze and optimize the following content for the keyword "{keyword}". Provide suggestions for title, meta description, headings, and content improvements.',
+        'preview_content': 'Optimized Title: [Keyword-Rich Title]\nMeta Description: [Compelling 160-character description]\n\nH1: [Main Keyword]\nH2: [Related Keywords]\n\nContent optimization suggestions...',
+        'price_type': 'paid',
+        'difficulty_level': 'intermediate'
+    },
+    {
+        'title': 'Code Review Assistant',
+        'description': 'Get detailed code reviews and improvement suggestions for your programming projects',
+        'content': 'You are a senior software engineer conducting a code review. Review the following {language} code for:\n1. Code quality and best practices\n2. Performance optimizations\n3. Security vulnerabilities\n4. Readability and maintainability\n\nProvide specific suggestions and examples.',
+        'preview_content': 'Code Review Report:\n\n✅ Strengths:\n- Good variable naming\n- Proper error handling\n\n⚠️ Areas for Improvement:\n- Consider using async/await\n- Add input validation\n- Implement proper logging',
+        'price_type': 'paid',
+        'difficulty_level': 'advanced'
+    },
+    {
+        'title': 'Social Media Content Creator',
+        'description': 'Create engaging social media posts for various platforms and audiences',
+        'content': 'You are a social media content creator. Create {platform} content about {topic} that is engaging, shareable, and optimized for the platform. Include hashtags and call-to-action.',
+        'preview_content': '🚀 Exciting news! We just launched our new feature that will revolutionize how you work.\n\n✨ Key benefits:\n• 10x faster performance\n• Intuitive interface\n• 24/7 support\n\nTry it now: [link]\n\n#innovation #productivity #tech',
+        'price_type': 'free',
+        'difficulty_level': 'beginner'
+    },
+    {
+        'title': 'Business Plan Generator',
+        'description': 'Generate comprehensive business plans with market analysis and financial projections',
+        'content': 'You are a business consultant. Create a detailed business plan for {business_type} including:\n1. Executive Summary\n2. Market Analysis\n3. Competitive Analysis\n4. Marketing Strategy\n5. Financial Projections\n6. Risk Assessment',
+        'preview_content': 'Executive Summary:\n\n[Business Name] is a [business type] that will [value proposition]. We target [target market] and expect to generate $[revenue] in year one.\n\nMarket Analysis:\nThe [industry] market is valued at $[market_size]...',
+        'price_type': 'paid',
+        'difficulty_level': 'expert'
+    }
+]
+
+REVIEW_TEMPLATES = [
+    {
+        'title': 'Excellent prompt!',
+        'comment': 'This prompt exceeded my expectations. Very well structured and produces high-quality results.'
+    },
+    {
+        'title': 'Great for beginners',
+        'comment': 'Perfect for someone just starting out. Clear instructions and easy to follow.'
+    },
+    {
+        'title': 'Highly recommended',
+        'comment': 'I use this prompt regularly and it consistently delivers great results.'
+    },
+    {
+        'title': 'Good value for money',
+        'comment': 'Worth every penny. The quality of output is much better than free alternatives.'
+    },
+    {
+        'title': 'Could be improved',
+        'comment': 'Good concept but could use more specific examples and better formatting.'
+    }
+]
+
+DIFFICULTY_LEVELS = [level for level, _ in Prompt.DIFFICULTY_LEVELS]
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+DAY_SECONDS = 24 * 60 * 60
+
+# Per-process generation context, installed by _init_worker (or directly when running inline)
+_context = {}
+
+
+def zipf_cum_weights(n, exponent):
+    """Cumulative Zipf weights for ranks 1..n, for use with ``random.choices``."""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def allocate(total, n, exponent, cap, rng):
+    """
+    Split ``total`` events over ``n`` items with Zipf-skewed popularity.
+
+    Popularity ranks are shuffled so they are not correlated with row order,
+    and each item receives at most ``cap`` events.
+    """
+    if n == 0 or total <= 0:
+        return [0] * n
+    weights = [1.0 / (rank ** exponent) for rank in range(1, n + 1)]
+    rng.shuffle(weights)
+    scale = total / sum(weights)
+    counts = []
+    for weight in weights:
+        expected = weight * scale
+        count = int(expected) + (rng.random() < expected - int(expected))
+        counts.append(min(count, cap))
+    return counts
+
+
+def _init_worker(context):
+    _context.clear()
+    _context.update(context)
+
+
+def _chunk_rng(kind, start):
+    return random.Random(f"{_context['seed']}:{kind}:{start}")
+
+
+def _produce_prompts(start, end):
+    rng = _chunk_rng('prompts', start)
+    user_weights = _context['user_cum_weights']
+    category_weights = _context['category_cum_weights']
+    tag_weights = _context['tag_cum_weights']
+    n_users = len(user_weights)
+    rows = []
+    for i in range(start, end):
+        template_index = rng.randrange(len(PROMPT_TEMPLATES))
+        paid = PROMPT_TEMPLATES[template_index]['price_type'] == 'paid'
+        n_tags = rng.randint(2, 6)
+        tag_indexes = {bisect(tag_weights, rng.random() * tag_weights[-1]) for _ in range(n_tags)}
+        rows.append((
+            i,
+            template_index,
+            min(bisect(user_weights, rng.random() * user_weights[-1]), n_users - 1),
+            min(bisect(category_weights, rng.random() * category_weights[-1]), len(category_weights) - 1),
+            rng.randint(1, 50) if paid else 0,
+            rng.choice(DIFFICULTY_LEVELS),
+            rng.randint(100, 2000),
+            int(rng.paretovariate(1.2) * 20),
+            rng.randint(0, 365 * DAY_SECONDS),
+            sorted(min(index, len(tag_weights) - 1) for index in tag_indexes),
+        ))
+    return rows
+
+
+def _produce_pairs(kind, start, end):
+    """Rows of (prompt_index, user_index, age_seconds, extra) with unique users per prompt."""
+    rng = _chunk_rng(kind, start)
+    counts = _context[f'{kind}_counts']
+    prompt_ages = _context['prompt_ages']
+    n_users = _context['n_users']
+    rows = []
+    for i in range(start, end):
+        if not counts[i]:
+            continue
+        max_age = min(prompt_ages[i], _context['activity_days'] * DAY_SECONDS)
+        for user_index in rng.sample(range(n_users), counts[i]):
+            rows.append((i, user_index, rng.randint(0, max_age), rng.random()))
+    return rows
+
+
+def _produce_analytics(start, end):
+    rng = _chunk_rng('analytics', start)
+    rows = []
+    for i in range(start, end):
+        popularity = rng.paretovariate(1.5)
+        for day in range(_context['analytics_days']):
+            views = int(rng.random() * 20 * popularity)
+            downloads = int(views * rng.random() * 0.3)
+            purchases = int(downloads * rng.random() * 0.2)
+            rows.append((i, day, views, downloads, purchases))
+    return rows
+
+
+def _produce(task):
+    kind, start, end = task
+    if kind == 'prompts':
+        return _produce_prompts(start, end)
+    if kind == 'analytics':
+        return _produce_analytics(start, end)
+    return _produce_pairs(kind, start, end)
+
+
+@contextmanager
+def preserve_timestamps(*models):
+    """Let bulk inserts keep explicit ``auto_now``/``auto_now_add`` values."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class ScaleDataGenerator:
+    """Seed a large, realistic catalog with bulk inserts for load testing."""
+
+    def __init__(self, users, prompts, reviews, downloads, purchases, favorites,
+                 analytics_days=30, activity_days=90, seed=0, batch_size=2000,
+                 workers=1, zipf_exponent=1.1, stdout=None):
+        self.n_users = users
+        self.n_prompts = prompts
+        self.totals = {
+            'reviews': reviews,
+            'downloads': downloads,
+            'purchases': purchases,
+            'favorites': favorites,
+        }
+        self.analytics_days = analytics_days
+        self.activity_days = activity_days
+        self.seed = seed
+        self.batch_size = batch_size
+        self.workers = workers
+        self.zipf_exponent = zipf_exponent
+        self.stdout = stdout
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.stats = {}
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def run(self):
+        with preserve_timestamps(Prompt, Review, PromptDownload, PromptPurchase, UserFavorite, PromptAnalytics):
+            self.categories = list(Category.objects.filter(is_active=True).values_list('id', flat=True))
+            self.tags = list(Tag.objects.values_list('id', flat=True))
+            if not self.categories or not self.tags:
+                raise ValueError('Create categories and tags before seeding at scale.')
+
+            self.user_ids = self.create_users()
+            self.create_prompts()
+            self.create_activity()
+            self.create_analytics()
+            self.sync_counters()
+        # Rows were bulk inserted without signals
+        invalidate_on_commit(Prompt)
+        return self.stats
+
+    def produce(self, kind, total, context, chunk_size=None):
+        """Yield row chunks for ``kind``, generated inline or by a process pool."""
+        chunk_size = chunk_size or self.batch_size
+        tasks = [(kind, start, min(start + chunk_size, total)) for start in range(0, total, chunk_size)]
+        context = dict(context, seed=self.seed)
+        if self.workers <= 1:
+            _init_worker(context)
+            for task in tasks:
+                yield _produce(task)
+            return
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(context,)) as pool:
+            yield from pool.imap(_produce, tasks)
+
+    def insert(self, model, objects):
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def timed(self, label, count, started):
+        elapsed = time.monotonic() - started
+        self.stats[label] = {'rows': count, 'seconds': round(elapsed, 2)}
+        self.log(f'Created {count} {label} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.0f} rows/s)')
+
+    def create_users(self):
+        started = time.monotonic()
+        prefix = f'load{self.seed}_{User.objects.count()}_'
+        password = make_password('password123')
+        for start in range(0, self.n_users, self.batch_size):
+            self.insert(User, [
+                User(
+                    username=f'{prefix}{i}',
+                    email=f'{prefix}{i}@example.com',
+                    password=password,
+                    first_name=f'Load{i}',
+                    last_name='Test',
+                )
+                for i in range(start, min(start + self.batch_size, self.n_users))
+            ])
+        user_ids = list(User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True))
+        self.timed('users', len(user_ids), started)
+        return user_ids
+
+    def create_prompts(self):
+        started = time.monotonic()
+        context = {
+            'user_cum_weights': zipf_cum_weights(len(self.user_ids), self.zipf_exponent),
+            'category_cum_weights': zipf_cum_weights(len(self.categories), self.zipf_exponent),
+            'tag_cum_weights': zipf_cum_weights(len(self.tags), self.zipf_exponent),
+        }
+        run_tag = f'{self.seed}-{Prompt.objects.count()}'
+        self.prompt_ids = []
+        self.prompt_prices = []
+        self.prompt_ages = []
+        PromptTag = Prompt.tags.through
+
+        for rows in self.produce('prompts', self.n_prompts, context):
+            prompts = []
+            for i, template_index, author_index, category_index, price, difficulty, tokens, views, age, _ in rows:
+                template = PROMPT_TEMPLATES[template_index]
+                created_at = self.now - timedelta(seconds=age)
+                prompt = Prompt(
+                    title=f"{template['title']} #{run_tag}-{i + 1}",
+                    description=template['description'],
+                    content=template['content'],
+                    preview_content=template['preview_content'],
+                    author_id=self.user_ids[author_index],
+                    category_id=self.categories[category_index],
+                    price_type=template['price_type'],
+                    price=Decimal(price),
+                    difficulty_level=difficulty,
+                    status='published',
+                    is_active=True,
+                    estimated_tokens=tokens,
+                    ai_model_compatibility=['GPT-4', 'Claude', 'Gemini'],
+                    use_cases=['Content creation', 'Business', 'Marketing'],
+                    views=views,
+                    created_at=created_at,
+                    updated_at=created_at,
+                    published_at=created_at,
+                )
+                prompt.populate_derived_fields()
+                prompts.append(prompt)
+            with transaction.atomic():
+                Prompt.objects.bulk_create(prompts, batch_size=self.batch_size)
+                PromptTag.objects.bulk_create([
+                    PromptTag(prompt_id=prompt.pk, tag_id=self.tags[tag_index])
+                    for prompt, row in zip(prompts, rows)
+                    for tag_index in row[-1]
+                ], batch_size=self.batch_size)
+            self.prompt_ids.extend(prompt.pk for prompt in prompts)
+            self.prompt_prices.extend(row[4] for row in rows)
+            self.prompt_ages.extend(row[8] for row in rows)
+        self.timed('prompts', len(self.prompt_ids), started)
+
+    def create_activity(self):
+        n_prompts = len(self.prompt_ids)
+        cap = len(self.user_ids)
+        context = {
+            'prompt_ages': self.prompt_ages,
+            'n_users': len(self.user_ids),
+            'activity_days': self.activity_days,
+        }
+        for kind, total in self.totals.items():
+            counts = allocate(total, n_prompts, self.zipf_exponent, cap, self.rng)
+            if kind == 'purchases':
+                counts = [count if price else 0 for count, price in zip(counts, self.prompt_prices)]
+            context[f'{kind}_counts'] = counts
+
+        builders = {
+            'reviews': self.build_review,
+            'downloads': self.build_download,
+            'purchases': self.build_purchase,
+            'favorites': self.build_favorite,
+        }
+        models = {
+            'reviews': Review,
+            'downloads': PromptDownload,
+            'purchases': PromptPurchase,
+            'favorites': UserFavorite,
+        }
+        for kind, build in builders.items():
+            started = time.monotonic()
+            count = 0
+            for rows in self.produce(kind, n_prompts, context):
+                objects = [build(*row) for row in rows]
+                self.insert(models[kind], objects)
+                count += len(objects)
+            self.timed(kind, count, started)
+
+    def build_review(self, i, user_index, age, roll):
+        template = REVIEW_TEMPLATES[int(roll * len(REVIEW_TEMPLATES))]
+        created_at = self.now - timedelta(seconds=age)
+        return Review(
+            prompt_id=self.prompt_ids[i],
+            user_id=self.user_ids[user_index],
+            rating=5 if roll > 0.5 else 4 if roll > 0.2 else 3,
+            title=template['title'],
+            comment=template['comment'],
+            is_verified_purchase=roll > 0.5,
+            helpful_votes=int(roll * 10),
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+    def build_download(self, i, user_index, age, roll):
+        return PromptDownload(
+            prompt_id=self.prompt_ids[i],
+            user_id=self.user_ids[user_index],
+            ip_address=f'192.168.1.{int(roll * 254) + 1}',
+            user_agent=USER_AGENT,
+            created_at=self.now - timedelta(seconds=age),
+        )
+
+    def build_purchase(self, i, user_index, age, roll):
+        created_at = self.now - timedelta(seconds=age)
+        return PromptPurchase(
+            prompt_id=self.prompt_ids[i],
+            user_id=self.user_ids[user_index],
+            amount=Decimal(self.prompt_prices[i]),
+            payment_status='completed' if roll > 0.05 else 'refunded',
+            stripe_payment_intent_id=f'pi_load_{self.seed}_{self.prompt_ids[i]}_{self.user_ids[user_index]}',
+            ip_address=f'192.168.1.{int(roll * 254) + 1}',
+            user_agent=USER_AGENT,
+            created_at=created_at,
+            updated_at=created_at,
+        )
+
+    def build_favorite(self, i, user_index, age, roll):
+        return UserFavorite(
+            prompt_id=self.prompt_ids[i],
+            user_id=self.user_ids[user_index],
+            created_at=self.now - timedelta(seconds=age),
+        )
+
+    def create_analytics(self):
+        if not self.analytics_days:
+            return
+        started = time.monotonic()
+        today = self.now.date()
+        count = 0
+        # Each prompt yields one row per day, so shrink chunks to keep batches bounded
+        chunk_size = max(1, self.batch_size // self.analytics_days)
+        for rows in self.produce('analytics', len(self.prompt_ids), {'analytics_days': self.analytics_days}, chunk_size):
+            objects = [
+                PromptAnalytics(
+                    prompt_id=self.prompt_ids[i],
+                    date=today - timedelta(days=day),
+                    views=views,
+                    downloads=downloads,
+                    purchases=purchases,
+                    revenue=Decimal(purchases * self.prompt_prices[i]),
+                    created_at=self.now,
+                    updated_at=self.now,
+                )
+                for i, day, views, downloads, purchases in rows
+            ]
+            self.insert(PromptAnalytics, objects)
+            count += len(objects)
+        self.timed('analytics rows', count, started)
+
+    def sync_counters(self):
+        """Align denormalized counters with the inserted rows using set-based UPDATEs."""
+        started = time.monotonic()
+
+        def count_of(model, **filters):
+            return Coalesce(Subquery(
+                model.objects.filter(prompt=OuterRef('pk'), **filters).order_by().values('prompt').annotate(
+                    total=Count('pk')
+                ).values('total'),
+                output_field=IntegerField(),
+            ), Value(0))
+
+        if self.prompt_ids:
+            Prompt.objects.filter(pk__gte=self.prompt_ids[0], pk__lte=self.prompt_ids[-1]).update(
+                downloads=count_of(PromptDownload),
+                purchases=count_of(PromptPurchase, payment_status='completed'),
+                favorites=count_of(UserFavorite),
+            )
+            rebuild_scores(Prompt.objects.filter(pk__gte=self.prompt_ids[0], pk__lte=self.prompt_ids[-1]))
+        Tag.objects.update(usage_count=Coalesce(Subquery(
+            Prompt.tags.through.objects.filter(tag=OuterRef('pk')).order_by().values('tag').annotate(
+                total=Count('pk')
+            ).values('total'),
+            output_field=IntegerField(),
+        ), Value(0)))
+        self.timed('counter updates', len(self.prompt_ids), started)
@@ -0,0 +1,119 @@
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils.text import slugify
+
+from .cache import invalidate_on_commit
+from .models import Prompt, Tag
+
+PromptTag = Prompt.tags.through
+
+
+def resolve_tags(names):
+    """
+    Return a ``{slug: Tag}`` mapping for ``names``, creating missing tags.
+
+    Tags are matched on slug, the unique key that differently-cased names
+    share. Costs one SELECT, plus one INSERT and one SELECT when some tags
+    are new.
+    """
+    names_by_slug = {}
+    for name in names:
+        slug = slugify(name)
+        if slug:
+            names_by_slug.setdefault(slug, name)
+    if not names_by_slug:
+        return {}
+
+    tags = {tag.slug: tag for tag in Tag.objects.filter(slug__in=names_by_slug)}
+    missing = [slug for slug in names_by_slug if slug not in tags]
+    if missing:
+        Tag.objects.bulk_create(
+            [Tag(name=names_by_slug[slug], slug=slug) for slug in missing],
+            ignore_conflicts=True
+        )
+        tags.update({tag.slug: tag for tag in Tag.objects.filter(slug__in=missing)})
+    return tags
+
+
+def _apply_usage_deltas(deltas):
+    """Adjust ``Tag.usage_count`` by ``{tag_id: delta}``, one UPDATE per distinct delta."""
+    tag_ids_by_delta = defaultdict(list)
+    for tag_id, delta in deltas.items():
+        if delta:
+            tag_ids_by_delta[delta].append(tag_id)
+
+    for delta, tag_ids in tag_ids_by_delta.items():
+        tags = Tag.objects.filter(pk__in=tag_ids)
+        if delta > 0:
+            tags.update(usage_count=F('usage_count') + delta)
+        else:
+            # Never drive the counter below zero
+            tags.filter(usage_count__gte=-delta).update(usage_count=F('usage_count') + delta)
+            tags.filter(usage_count__lt=-delta).update(usage_count=0)
+    if tag_ids_by_delta:
+        # Cached tags carry usage_count; update() sends no post_save
+        invalidate_on_commit(Tag)
+
+
+def set_tags_for_prompts(tag_names_by_prompt):
+    """
+    Make each prompt's tags match ``{prompt_id: [tag names]}``.
+
+    Tag lookups, M2M changes and ``usage_count`` updates are done in bulk,
+    so the query count does not depend on the number of prompts or tags.
+    The M2M set is diffed rather than cleared, leaving unchanged rows alone.
+    """
+    if not tag_names_by_prompt:
+        return
+
+    with transaction.atomic():
+        tags = resolve_tags(name for names in tag_names_by_prompt.values() for name in names)
+        wanted = {
+            prompt_id: {tags[slugify(name)].pk for name in names if slugify(name) in tags}
+            for prompt_id, names in tag_names_by_prompt.items()
+        }
+
+        current = defaultdict(set)
+        current_rows = {}
+        for row_id, prompt_id, tag_id in PromptTag.objects.filter(
+            prompt_id__in=wanted
+        ).values_list('id', 'prompt_id', 'tag_id'):
+            current[prompt_id].add(tag_id)
+            current_rows[prompt_id, tag_id] = row_id
+
+        deltas = Counter()
+        removed_rows = []
+        added_rows = []
+        for prompt_id, tag_ids in wanted.items():
+            for tag_id in current[prompt_id] - tag_ids:
+                removed_rows.append(current_rows[prompt_id, tag_id])
+                deltas[tag_id] -= 1
+            for tag_id in tag_ids - current[prompt_id]:
+                added_rows.append(PromptTag(prompt_id=prompt_id, tag_id=tag_id))
+                deltas[tag_id] += 1
+
+        if removed_rows:
+            PromptTag.objects.filter(pk__in=removed_rows).delete()
+        if added_rows:
+            PromptTag.objects.bulk_create(added_rows, ignore_conflicts=True)
+        _apply_usage_deltas(deltas)
+        # Cached prompts carry their tags; the through rows above send no m2m_changed
+        invalidate_on_commit(Prompt)
+
+
+def set_prompt_tags(prompt, names):
+    """Make ``prompt``'s tags match ``names`` in a constant number of queries."""
+    set_tags_for_prompts({prompt.pk: names})
+
+
+def release_prompt_tags(prompts):
+    """Decrement ``usage_count`` for the tags of ``prompts`` (a queryset) before they are deleted."""
+    deltas = {
+        row['tag_id']: -row['uses']
+        for row in PromptTag.objects.filter(
+            prompt__in=prompts
+        ).values('tag_id').annotate(uses=Count('id')).order_by()
+    }
+    _apply_usage_deltas(deltas)
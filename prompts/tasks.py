@@ -0,0 +1,106 @@
+"""
+Background tasks for the prompts app.
+
+Enqueue them with ``prompt_platform.background.enqueue``; arguments must be
+JSON-serializable, so tasks take ids rather than model instances.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from celery import shared_task
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .bulk import run_bulk_action
+from .models import Category, Prompt, PromptAnalytics, PromptDownload, PromptPurchase
+from .queries import day_start
+
+
+@shared_task
+def record_view(prompt_id):
+    """Count a view of the prompt on its counter and on today's analytics row."""
+    if Prompt.bump_counter(prompt_id, 'views', 1):
+        PromptAnalytics.add_views(prompt_id)
+
+
+@shared_task
+def bulk_action(author_id, action, prompt_ids, category_id=None, price=None, job_id=None):
+    """``run_bulk_action`` for ``bulk.start_bulk_action``; ``price`` is a decimal string."""
+    author = get_user_model().objects.get(pk=author_id)
+    category = Category.objects.get(pk=category_id) if category_id is not None else None
+    price = Decimal(price) if price is not None else None
+    run_bulk_action(author, action, prompt_ids, category, price, job_id=job_id)
+
+
+@shared_task
+def rollup_analytics(days=2):
+    """
+    Recompute downloads, purchases and revenue on the daily analytics rows
+    for the last ``days`` days, from the download and purchase tables. Days
+    are those of the current timezone (``TIME_ZONE``), like ``date_range``
+    and the dashboards that read these rows.
+
+    Views are counted as they happen by ``record_view`` and left alone.
+    The window starts at midnight, so the oldest day is recounted in full;
+    rows in the window whose downloads and purchases have gone (deleted or
+    refunded) are zeroed. Rows for days without activity are not created.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.localdate(timezone=tz) - timedelta(days=days)
+    since = day_start(start, tz)
+    rows = {}
+    downloads = PromptDownload.objects.filter(created_at__gte=since).annotate(
+        date=TruncDate('created_at', tzinfo=tz)
+    ).values('prompt_id', 'date').annotate(total=Count('id')).order_by()
+    for row in downloads:
+        rows[row['prompt_id'], row['date']] = {'downloads': row['total']}
+
+    purchases = PromptPurchase.objects.filter(
+        created_at__gte=since, payment_status='completed'
+    ).annotate(
+        date=TruncDate('created_at', tzinfo=tz)
+    ).values('prompt_id', 'date').annotate(total=Count('id'), revenue=Sum('amount')).order_by()
+    for row in purchases:
+        rows.setdefault((row['prompt_id'], row['date']), {}).update(
+            purchases=row['total'], revenue=row['revenue'],
+        )
+
+    stale = [
+        pk for pk, prompt_id, date in PromptAnalytics.objects.filter(
+            Q(downloads__gt=0) | Q(purchases__gt=0) | Q(revenue__gt=0), date__gte=start,
+        ).values_list('pk', 'prompt_id', 'date')
+        if (prompt_id, date) not in rows
+    ]
+    if stale:
+        PromptAnalytics.objects.filter(pk__in=stale).update(
+            downloads=0, purchases=0, revenue=0, updated_at=timezone.now(),
+        )
+
+    now = timezone.now()
+    PromptAnalytics.objects.bulk_create(
+        [
+            PromptAnalytics(
+                prompt_id=prompt_id,
+                date=date,
+                downloads=counts.get('downloads', 0),
+                purchases=counts.get('purchases', 0),
+                revenue=counts.get('revenue', 0),
+                updated_at=now,
+            )
+            for (prompt_id, date), counts in rows.items()
+        ],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['prompt', 'date'],
+        update_fields=['downloads', 'purchases', 'revenue', 'updated_at'],
+    )
+    return len(rows)
+
+
+@shared_task
+def refresh_engagement_scores():
+    """Run ``refresh_engagement_scores``; scheduled every ``ENGAGEMENT_REFRESH_HOURS``."""
+    call_command('refresh_engagement_scores')
@@ -0,0 +1,602 @@
+import csv
+import gzip
+import importlib
+import json
+from contextlib import redirect_stdout
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from zoneinfo import ZoneInfo
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from . import async_views, cache
+from .bulk import get_job, start_bulk_action
+from .exports import PROMPT_EXPORT_FIELDS, iter_encoded
+from .importers import PromptImporter
+from .models import BulkJob, Category, Prompt, Tag, PromptAnalytics, PromptDownload, PromptPurchase
+from .queries import creator_earnings, daily_totals, date_range, day_start, month_range, monthly_earnings
+from .tagging import PromptTag, release_prompt_tags, set_prompt_tags, set_tags_for_prompts
+from .tasks import refresh_engagement_scores, rollup_analytics
+
+User = get_user_model()
+
+
+class PromptsTestCase(TestCase):
+    """A creator with a published paid prompt, and a buyer."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.creator = User.objects.create_user(
+            username='creator', email='creator@example.com', password='password', is_creator=True
+        )
+        cls.buyer = User.objects.create_user(username='buyer', email='buyer@example.com', password='password')
+        cls.category = Category.objects.create(name='Writing', slug='writing')
+        cls.prompt = Prompt.objects.create(
+            title='Cover letter',
+            description='Writes cover letters',
+            content='Write a cover letter',
+            author=cls.creator,
+            category=cls.category,
+            price_type='paid',
+            price=Decimal('10.00'),
+            status='published',
+        )
+
+
+@override_settings(TIME_ZONE='America/New_York')
+class RollupAnalyticsTests(PromptsTestCase):
+    def setUp(self):
+        self.first_day = timezone.localdate() - timedelta(days=2)
+        self.midnight = day_start(self.first_day)
+
+    def download_at(self, user, created_at):
+        download = PromptDownload.objects.create(prompt=self.prompt, user=user)
+        PromptDownload.objects.filter(pk=download.pk).update(created_at=created_at)
+
+    def test_first_day_of_window_is_counted_in_full(self):
+        self.download_at(self.buyer, self.midnight + timedelta(minutes=30))
+        self.download_at(self.creator, self.midnight - timedelta(minutes=30))
+
+        rollup_analytics()
+
+        row = PromptAnalytics.objects.get(prompt=self.prompt, date=self.first_day)
+        self.assertEqual(row.downloads, 1)
+        self.assertFalse(PromptAnalytics.objects.filter(date__lt=self.first_day).exists())
+
+    def test_days_follow_the_current_timezone(self):
+        # Late evening in New York is already the next day in UTC
+        self.download_at(self.buyer, timezone.make_aware(datetime.combine(self.first_day, time(23, 30))))
+
+        rollup_analytics()
+
+        self.assertEqual(
+            list(PromptAnalytics.objects.values_list('date', 'downloads')), [(self.first_day, 1)]
+        )
+
+    def test_rows_without_activity_are_zeroed(self):
+        purchase = PromptPurchase.objects.create(
+            prompt=self.prompt, user=self.buyer, amount=Decimal('10.00'), payment_status='completed'
+        )
+        PromptPurchase.objects.filter(pk=purchase.pk).update(created_at=self.midnight + timedelta(hours=1))
+        rollup_analytics()
+        row = PromptAnalytics.objects.get(prompt=self.prompt, date=self.first_day)
+        self.assertEqual((row.purchases, row.revenue), (1, Decimal('10.00')))
+
+        PromptPurchase.objects.filter(pk=purchase.pk).update(payment_status='refunded')
+        rollup_analytics()
+
+        row.refresh_from_db()
+        self.assertEqual((row.downloads, row.purchases, row.revenue), (0, 0, Decimal('0')))
+
+    def test_rows_before_the_window_are_left_alone(self):
+        old = PromptAnalytics.objects.create(
+            prompt=self.prompt, date=self.first_day - timedelta(days=1), downloads=5
+        )
+
+        rollup_analytics()
+
+        old.refresh_from_db()
+        self.assertEqual(old.downloads, 5)
+
+
+NEW_YORK = ZoneInfo('America/New_York')
+
+
+class QueriesTests(PromptsTestCase):
+    def purchase_at(self, created_at, amount='10.00', status='completed', prompt=None):
+        purchase = PromptPurchase.objects.create(
+            prompt=prompt or self.prompt, user=self.buyer, amount=Decimal(amount), payment_status=status
+        )
+        PromptPurchase.objects.filter(pk=purchase.pk).update(created_at=created_at)
+        return purchase
+
+    def test_month_range_rolls_december_over_into_january(self):
+        start, end = month_range(datetime(2025, 12, 31, 23, 59, tzinfo=dt_timezone.utc), dt_timezone.utc)
+
+        self.assertEqual(start, datetime(2025, 12, 1, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 1, 1, tzinfo=dt_timezone.utc))
+
+    def test_month_range_is_evaluated_in_the_given_timezone(self):
+        # Still February in New York
+        start, end = month_range(datetime(2026, 3, 1, 3, tzinfo=dt_timezone.utc), NEW_YORK)
+
+        self.assertEqual(start, datetime(2026, 2, 1, 5, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 3, 1, 5, tzinfo=dt_timezone.utc))
+
+    def test_date_range_bounds_are_aware_local_midnights(self):
+        start, end = date_range(datetime(2026, 7, 1).date(), datetime(2026, 7, 3).date(), NEW_YORK)
+
+        self.assertTrue(timezone.is_aware(start) and timezone.is_aware(end))
+        self.assertEqual(start, datetime(2026, 7, 1, 4, tzinfo=dt_timezone.utc))
+        self.assertEqual(end, datetime(2026, 7, 3, 4, tzinfo=dt_timezone.utc))
+
+    def test_creator_earnings_counts_completed_purchases_in_the_half_open_range(self):
+        start, end = month_range(datetime(2026, 5, 15, tzinfo=dt_timezone.utc), dt_timezone.utc)
+        other = Prompt.objects.create(
+            title='Other', description='d', content='c', author=self.buyer, category=self.category
+        )
+        self.purchase_at(start, '1.00')
+        self.purchase_at(end - timedelta(microseconds=1), '2.00')
+        self.purchase_at(end, '4.00')
+        self.purchase_at(start - timedelta(microseconds=1), '8.00')
+        self.purchase_at(start + timedelta(days=1), '16.00', status='refunded')
+        self.purchase_at(start + timedelta(days=1), '32.00', prompt=other)
+
+        self.assertEqual(creator_earnings(self.creator, start, end), Decimal('3.00'))
+        self.assertEqual(monthly_earnings(self.creator, start, dt_timezone.utc), Decimal('3.00'))
+        self.assertEqual(creator_earnings(self.creator, start), Decimal('7.00'))
+        self.assertEqual(creator_earnings(self.buyer, start, start), 0)
+
+    def test_daily_totals_groups_by_local_day(self):
+        self.purchase_at(datetime(2026, 7, 1, 3, tzinfo=dt_timezone.utc), '1.00')
+        self.purchase_at(datetime(2026, 7, 1, 12, tzinfo=dt_timezone.utc), '2.00')
+        self.purchase_at(datetime(2026, 7, 1, 20, tzinfo=dt_timezone.utc), '4.00')
+        day = datetime(2026, 7, 1).date()
+        purchases = PromptPurchase.objects.all()
+        days = (day - timedelta(days=1), day + timedelta(days=1))
+
+        utc = daily_totals(
+            purchases, *date_range(*days, dt_timezone.utc), tz=dt_timezone.utc, total=Sum('amount'), count=Count('id')
+        )
+        local = daily_totals(purchases, *date_range(*days, NEW_YORK), tz=NEW_YORK, total=Sum('amount'))
+
+        self.assertEqual(utc, {day: {'total': Decimal('7.00'), 'count': 3}})
+        self.assertEqual(local, {
+            day - timedelta(days=1): {'total': Decimal('1.00')},
+            day: {'total': Decimal('6.00')},
+        })
+
+
+class ExportTests(PromptsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.awkward = Prompt.objects.create(
+            title='Quotes, "commas"', description='Line one,\nline two', content='a,b\r\nc',
+            author=cls.creator, category=cls.category,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.creator)
+
+    def export(self, export_format, **params):
+        response = self.client.get(reverse('prompts:export_prompts'), {'format': export_format, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_json_export_is_one_array(self):
+        response, body = self.export('json')
+
+        rows = json.loads(body)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual([row['title'] for row in rows], ['Cover letter', 'Quotes, "commas"'])
+        self.assertEqual(set(rows[0]), set(PROMPT_EXPORT_FIELDS))
+        self.assertEqual(rows[0]['price'], 10.0)
+
+    def test_ndjson_export_has_one_row_per_line(self):
+        response, body = self.export('ndjson')
+
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([row['description'] for row in rows], ['Writes cover letters', 'Line one,\nline two'])
+
+    def test_csv_export_quotes_commas_and_newlines(self):
+        response, body = self.export('csv')
+
+        rows = list(csv.DictReader(StringIO(body.decode(), newline='')))
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1]['title'], 'Quotes, "commas"')
+        self.assertEqual(rows[1]['description'], 'Line one,\nline two')
+        self.assertEqual(rows[1]['content'], 'a,b\r\nc')
+
+    def test_gzip_export_decompresses_to_the_plain_export(self):
+        _, plain = self.export('ndjson')
+        response, body = self.export('ndjson', gzip='1')
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertTrue(response['Content-Disposition'].endswith('.ndjson.gz"'))
+        self.assertEqual(gzip.decompress(body), plain)
+
+    def test_unknown_format_is_rejected(self):
+        response = self.client.get(reverse('prompts:export_prompts'), {'format': 'xml'})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_pieces_are_coalesced_into_buffered_chunks(self):
+        chunks = list(iter_encoded(['ab', 'cd', 'é', 'f'], buffer_size=4))
+
+        self.assertEqual(chunks, [b'abcd', b'\xc3\xa9f'])
+
+
+@override_settings(ENGAGEMENT_WEIGHTS={'views': 0.5, 'downloads': 2.0, 'purchases': 4.0, 'favorites': 1.0})
+class EngagementScoreTests(PromptsTestCase):
+    def scores(self):
+        return Prompt.objects.filter(pk=self.prompt.pk).values('views', 'downloads', 'engagement_score').get()
+
+    def test_bump_counter_adds_the_weighted_delta(self):
+        self.assertEqual(Prompt.bump_counter(self.prompt.pk, 'downloads', 3), 1)
+        self.assertEqual(Prompt.bump_counter(self.prompt.pk, 'downloads', -1), 1)
+
+        self.assertEqual(self.scores(), {'views': 0, 'downloads': 2, 'engagement_score': 4.0})
+
+    def test_bump_counter_honours_filters(self):
+        self.assertEqual(Prompt.bump_counter(self.prompt.pk, 'views', 1, status='draft'), 0)
+
+        self.assertEqual(self.scores(), {'views': 0, 'downloads': 0, 'engagement_score': 0.0})
+
+    def test_increments_keep_the_instance_in_step(self):
+        self.prompt.increment_views()
+        self.prompt.increment_purchases()
+
+        self.assertEqual((self.prompt.views, self.prompt.purchases, self.prompt.engagement_score), (1, 1, 4.5))
+        self.assertEqual(self.scores()['engagement_score'], 4.5)
+
+    @override_settings(ENGAGEMENT_HALF_LIFE_DAYS=0)
+    def test_refresh_without_half_life_rebuilds_from_counters(self):
+        Prompt.objects.filter(pk=self.prompt.pk).update(views=4, downloads=1, engagement_score=99)
+
+        with redirect_stdout(StringIO()):
+            refresh_engagement_scores()
+
+        self.assertEqual(self.scores()['engagement_score'], 4.0)
+
+    @override_settings(ENGAGEMENT_HALF_LIFE_DAYS=1, ENGAGEMENT_REFRESH_HOURS=12)
+    def test_refresh_with_half_life_decays_scores(self):
+        Prompt.objects.filter(pk=self.prompt.pk).update(views=4, engagement_score=8)
+
+        with redirect_stdout(StringIO()):
+            refresh_engagement_scores()
+        self.assertAlmostEqual(self.scores()['engagement_score'], 8 * 0.5 ** 0.5)
+
+        call_command('refresh_engagement_scores', hours=36, stdout=StringIO())
+        self.assertAlmostEqual(self.scores()['engagement_score'], 2.0)
+
+        call_command('refresh_engagement_scores', rebuild=True, stdout=StringIO())
+        self.assertEqual(self.scores()['engagement_score'], 2.0)
+
+
+class ObjectCacheTests(PromptsTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_tag_usage_changes_invalidate_cached_tags(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            set_prompt_tags(self.prompt, ['letters'])
+        self.assertEqual(cache.get_tag_by_slug('letters').usage_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            set_prompt_tags(self.prompt, [])
+
+        self.assertEqual(cache.get_tag_by_slug('letters').usage_count, 0)
+
+
+class BulkJobTests(PromptsTestCase):
+    def test_background_job_progress_is_stored(self):
+        job_id = start_bulk_action(self.creator, 'unpublish', [self.prompt.pk])
+
+        self.assertEqual(get_job(job_id, self.creator), {
+            'action': 'unpublish', 'status': 'completed', 'total': 1, 'processed': 1, 'affected': 1, 'error': '',
+        })
+        self.assertIsNone(get_job(job_id, self.buyer))
+
+    def test_status_view_is_limited_to_the_owner(self):
+        job_id = start_bulk_action(self.creator, 'publish', [self.prompt.pk])
+        url = reverse('prompts:bulk_action_status', kwargs={'job_id': job_id})
+
+        self.client.force_login(self.buyer)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(self.creator)
+        self.assertEqual(self.client.get(url).json()['status'], 'completed')
+
+    def test_old_jobs_are_pruned(self):
+        old = BulkJob.objects.create(user=self.creator, action='publish', status='completed')
+        BulkJob.objects.filter(pk=old.pk).update(updated_at=timezone.now() - timedelta(days=2))
+
+        start_bulk_action(self.creator, 'publish', [self.prompt.pk])
+
+        self.assertFalse(BulkJob.objects.filter(pk=old.pk).exists())
+
+
+def import_row(title, **fields):
+    return {
+        'title': title,
+        'description': 'A prompt imported by the tests, long enough to pass validation.',
+        'content': 'You are a careful writer. Create a draft from the notes given.',
+        'category': 'Writing',
+        **fields,
+    }
+
+
+class PromptImporterTests(PromptsTestCase):
+    def run_import(self, records, ndjson=False, **kwargs):
+        if ndjson:
+            data = '\n'.join(json.dumps(record) for record in records)
+        else:
+            data = json.dumps(records)
+        return PromptImporter(self.creator, **kwargs).run(BytesIO(data.encode()))
+
+    def test_valid_rows_are_created_with_tags(self):
+        result = self.run_import([
+            import_row('Meeting notes summary', tags='notes, meetings'),
+            import_row('Release notes writer', tags=['notes'], price_type='paid', price='4.50'),
+        ], ndjson=True, batch_size=1)
+
+        self.assertEqual((result.created, result.updated, result.errors), (2, 0, []))
+        prompt = Prompt.objects.get(slug='release-notes-writer')
+        self.assertEqual((prompt.author, prompt.category, prompt.price), (self.creator, self.category, Decimal('4.50')))
+        self.assertEqual(prompt.meta_title, 'Release notes writer')
+        self.assertEqual(dict(Tag.objects.values_list('slug', 'usage_count')), {'notes': 2, 'meetings': 1})
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        result = self.run_import([
+            import_row('Meeting notes summary'),
+            import_row('Short'),
+            import_row('Priced free prompt', price='3'),
+            import_row('Unknown category prompt', category='Cooking'),
+            import_row('Meeting notes summary'),
+            'not an object',
+            import_row('Live prompt title', status='live'),
+        ])
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual(
+            {error['row']: sorted(error['errors']) for error in result.errors},
+            {2: ['title'], 3: ['price'], 4: ['category'], 5: ['title'], 6: ['__all__'], 7: ['status']},
+        )
+        errors = {error['row']: error['errors'] for error in result.errors}
+        self.assertEqual(errors[7]['status'], ["Invalid status 'live'."])
+        self.assertEqual(Prompt.objects.filter(author=self.creator).count(), 2)
+
+    def test_invalid_json_is_a_fatal_error(self):
+        result = PromptImporter(self.creator).run(BytesIO(b'[{"title": "Meeting notes summary"}'))
+
+        self.assertEqual(result.fatal_error, 'Unexpected end of file: unterminated JSON array.')
+        self.assertEqual(result.created, 0)
+
+    def test_existing_title_needs_overwrite(self):
+        self.run_import([import_row('Meeting notes summary', tags='notes')])
+
+        result = self.run_import([import_row('Meeting notes summary', status='published')])
+        self.assertEqual(result.errors, [{'row': 1, 'errors': {'title': ['A prompt with this title already exists.']}}])
+
+        result = self.run_import(
+            [import_row('Meeting notes summary', status='published', tags='meetings')], overwrite_existing=True
+        )
+        self.assertEqual((result.created, result.updated), (0, 1))
+        prompt = Prompt.objects.get(slug='meeting-notes-summary')
+        self.assertEqual(prompt.status, 'published')
+        self.assertIsNotNone(prompt.published_at)
+        self.assertEqual([tag.slug for tag in prompt.tags.all()], ['meetings'])
+        self.assertEqual(dict(Tag.objects.values_list('slug', 'usage_count')), {'notes': 0, 'meetings': 1})
+
+    def test_overwrite_leaves_other_authors_prompts_alone(self):
+        PromptImporter(self.buyer).run(BytesIO(json.dumps([import_row('Meeting notes summary')]).encode()))
+
+        result = self.run_import([import_row('Meeting notes summary', status='published')], overwrite_existing=True)
+
+        self.assertEqual(result.updated, 0)
+        self.assertEqual(len(result.errors), 1)
+        self.assertEqual(Prompt.objects.get(slug='meeting-notes-summary').author, self.buyer)
+
+
+class TaggingTests(PromptsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = Prompt.objects.create(
+            title='Meeting notes', description='Summarizes meetings', content='Summarize the meeting',
+            author=cls.creator, category=cls.category,
+        )
+
+    def usage(self):
+        return dict(Tag.objects.values_list('slug', 'usage_count'))
+
+    def test_usage_counts_follow_the_diff(self):
+        set_tags_for_prompts({self.prompt.pk: ['Writing', 'Jobs'], self.other.pk: ['writing', 'Notes']})
+        self.assertEqual(self.usage(), {'writing': 2, 'jobs': 1, 'notes': 1})
+
+        set_tags_for_prompts({self.prompt.pk: ['Writing'], self.other.pk: []})
+        self.assertEqual(self.usage(), {'writing': 1, 'jobs': 0, 'notes': 0})
+
+    def test_unchanged_tags_keep_their_rows(self):
+        set_prompt_tags(self.prompt, ['writing', 'jobs'])
+        kept = PromptTag.objects.get(prompt=self.prompt, tag__slug='writing').pk
+
+        set_prompt_tags(self.prompt, ['writing', 'letters'])
+
+        self.assertEqual(PromptTag.objects.get(prompt=self.prompt, tag__slug='writing').pk, kept)
+        self.assertEqual(sorted(tag.slug for tag in self.prompt.tags.all()), ['letters', 'writing'])
+        self.assertEqual(self.usage(), {'writing': 1, 'jobs': 0, 'letters': 1})
+
+    def test_query_count_does_not_grow_with_prompts_or_tags(self):
+        def count_queries(tag_names_by_prompt):
+            with CaptureQueriesContext(connection) as queries:
+                set_tags_for_prompts(tag_names_by_prompt)
+            return len(queries)
+
+        one = count_queries({self.prompt.pk: ['alpha']})
+        many = count_queries({self.prompt.pk: ['alpha', 'beta'], self.other.pk: ['gamma', 'delta', 'epsilon']})
+
+        self.assertEqual(one, many)
+
+    def test_released_tags_never_go_below_zero(self):
+        set_tags_for_prompts({self.prompt.pk: ['writing'], self.other.pk: ['writing', 'notes']})
+        Tag.objects.filter(slug='notes').update(usage_count=0)
+
+        release_prompt_tags(Prompt.objects.filter(pk=self.other.pk))
+
+        self.assertEqual(self.usage(), {'writing': 1, 'notes': 0})
+
+
+class PaymentIntentDedupeMigrationTests(TransactionTestCase):
+    migrate_from = [('prompts', '0003_purchase_earnings_index')]
+    migrate_to = [('prompts', '0004_purchase_payment_intent_unique')]
+
+    def setUp(self):
+        executor = MigrationExecutor(connection)
+        self.latest = executor.loader.graph.leaf_nodes()
+        executor.migrate(self.migrate_from)
+        self.apps = executor.loader.project_state(self.migrate_from).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.latest)
+
+    def test_duplicate_intents_are_merged_or_blanked(self):
+        User = self.apps.get_model('users', 'CustomUser')
+        Category = self.apps.get_model('prompts', 'Category')
+        Prompt = self.apps.get_model('prompts', 'Prompt')
+        PromptPurchase = self.apps.get_model('prompts', 'PromptPurchase')
+
+        creator = User.objects.create(username='creator', email='creator@example.com')
+        buyer = User.objects.create(username='buyer', email='buyer@example.com')
+        category = Category.objects.create(name='Writing', slug='writing')
+        prompt, other = (
+            Prompt.objects.create(
+                title=title, slug=title, description='d', content='c', preview_content='',
+                author=creator, category=category, price=Decimal('10.00'), purchases=purchases,
+            )
+            for title, purchases in (('first', 3), ('second', 1))
+        )
+
+        def purchase(prompt, user, intent_id, status='completed'):
+            return PromptPurchase.objects.create(
+                prompt=prompt, user=user, amount=Decimal('10.00'), payment_status=status,
+                stripe_payment_intent_id=intent_id,
+            )
+
+        # The redirect and the webhook both recorded pi_double
+        pending = purchase(prompt, buyer, 'pi_double', status='pending')
+        kept = purchase(prompt, buyer, 'pi_double')
+        copy = purchase(prompt, buyer, 'pi_double')
+        # Sample data reused a random id for an unrelated purchase
+        collided = purchase(other, creator, 'pi_double')
+        unrelated = [purchase(prompt, creator, ''), purchase(prompt, creator, '')]
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.migrate_to)
+        apps = executor.loader.project_state(self.migrate_to).apps
+        PromptPurchase = apps.get_model('prompts', 'PromptPurchase')
+        Prompt = apps.get_model('prompts', 'Prompt')
+
+        intents = dict(PromptPurchase.objects.values_list('pk', 'stripe_payment_intent_id'))
+        self.assertEqual(intents, {kept.pk: 'pi_double', collided.pk: '', **{row.pk: '' for row in unrelated}})
+        self.assertNotIn(pending.pk, intents)
+        self.assertNotIn(copy.pk, intents)
+        self.assertEqual(dict(Prompt.objects.values_list('slug', 'purchases')), {'first': 2, 'second': 1})
+
+
+def reload_urls():
+    from prompt_platform import urls as root_urls
+
+    from . import urls
+
+    importlib.reload(urls)
+    importlib.reload(root_urls)
+    clear_url_caches()
+
+
+class AsyncViewTests(PromptsTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.draft = Prompt.objects.create(
+            title='Draft letter', description='d', content='c', author=cls.creator, category=cls.category,
+            status='draft',
+        )
+        cls.hidden = Prompt.objects.create(
+            title='Hidden letter', description='d', content='c', author=cls.creator, category=cls.category,
+            status='published', is_active=False,
+        )
+        Prompt.objects.bulk_create([
+            Prompt(
+                title=f'Letter {index}', slug=f'letter-{index}', description='d', content='c',
+                author=cls.creator, category=cls.category, status='published',
+            )
+            for index in range(12)
+        ])
+
+    def setUp(self):
+        # Routes are picked when the urlconf is imported; put the sync ones back afterwards
+        self.addCleanup(reload_urls)
+        self.enterContext(override_settings(ASYNC_VIEWS=True))
+        reload_urls()
+        cache.clear()
+        self.client = AsyncClient()
+
+    async def test_routes_use_the_async_views(self):
+        match = resolve(reverse('prompts:prompt_detail', args=[self.prompt.slug]))
+        self.assertIs(match.func, async_views.prompt_detail)
+
+    async def test_prompt_detail_hides_unpublished_prompts(self):
+        response = await self.client.get(reverse('prompts:prompt_detail', args=[self.prompt.slug]))
+        self.assertEqual(response.status_code, 200)
+
+        for prompt in (self.draft, self.hidden):
+            response = await self.client.get(reverse('prompts:prompt_detail', args=[prompt.slug]))
+            self.assertEqual(response.status_code, 404)
+
+    async def test_category_pages_count_published_prompts(self):
+        url = reverse('prompts:category_detail', args=[self.category.slug])
+
+        first = await self.client.get(url)
+        last = await self.client.get(url, {'page': 99})
+
+        self.assertEqual(first.context['page_obj'].paginator.count, 13)
+        self.assertEqual(len(first.context['page_obj']), 12)
+        self.assertEqual((last.context['page_obj'].number, len(last.context['page_obj'])), (2, 1))
+
+    async def test_tag_pages_paginate(self):
+        await sync_to_async(set_prompt_tags)(self.prompt, ['letters'])
+        await sync_to_async(set_prompt_tags)(self.draft, ['letters'])
+
+        response = await self.client.get(reverse('prompts:tag_detail', args=['letters']))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [self.prompt])
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+
+    async def test_api_search_returns_published_prompts_only(self):
+        url = reverse('prompts:api_search')
+
+        found = await self.client.get(url, {'q': 'cover'})
+        draft = await self.client.get(url, {'q': 'draft'})
+        hidden = await self.client.get(url, {'q': 'hidden'})
+        capped = await self.client.get(url, {'q': 'letter'})
+
+        self.assertEqual([result['title'] for result in found.json()['results']], ['Cover letter'])
+        self.assertEqual(draft.json()['results'], [])
+        self.assertEqual(hidden.json()['results'], [])
+        self.assertEqual(len(capped.json()['results']), 10)
@@ -1,8 +1,21 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'prompts'
 
+# Under ASGI the read-only pages are served by their async versions
+if settings.ASYNC_VIEWS:
+    prompt_detail = async_views.prompt_detail
+    category_detail = async_views.category_detail
+    tag_detail = async_views.tag_detail
+    api_search = async_views.api_search
+else:
+    prompt_detail = views.PromptDetailView.as_view()
+    category_detail = views.category_detail
+    tag_detail = views.tag_detail
+    api_search = views.api_search
+
 urlpatterns = [
     # Main views
     path('', views.PromptListView.as_view(), name='prompt_list'),
@@ -10,19 +23,22 @@ urlpatterns = [
     
     # Search - must come before slug patterns
     path('search/', views.search_prompts, name='search_prompts'),
-    path('api/search/', views.api_search, name='api_search'),
+    path('api/search/', api_search, name='api_search'),
     
     # User dashboard and analytics
     path('dashboard/', views.user_dashboard, name='user_dashboard'),
     path('analytics/', views.analytics_dashboard, name='analytics_dashboard'),
     path('export/', views.export_prompts, name='export_prompts'),
+    path('import/', views.import_prompts, name='import_prompts'),
+    path('bulk/', views.bulk_prompt_action, name='bulk_prompt_action'),
+    path('bulk/<uuid:job_id>/', views.bulk_action_status, name='bulk_action_status'),
     
     # Browse by category and tags
-    path('category/<slug:slug>/', views.category_detail, name='category_detail'),
-    path('tag/<slug:slug>/', views.tag_detail, name='tag_detail'),
+    path('category/<slug:slug>/', category_detail, name='category_detail'),
+    path('tag/<slug:slug>/', tag_detail, name='tag_detail'),
     
     # Prompt detail and actions - must come after specific patterns
-    path('<slug:slug>/', views.PromptDetailView.as_view(), name='prompt_detail'),
+    path('<slug:slug>/', prompt_detail, name='prompt_detail'),
     path('<slug:slug>/edit/', views.PromptUpdateView.as_view(), name='prompt_update'),
     path('<slug:slug>/delete/', views.PromptDeleteView.as_view(), name='prompt_delete'),
     
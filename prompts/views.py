@@ -2,23 +2,49 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import Http404, JsonResponse, HttpResponseForbidden
+from django.core.exceptions import ObjectDoesNotExist
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from django.db.models import Q, Count, Avg, Sum, F
+from django.db.models import Q, Count, Avg, Sum
 from django.core.paginator import Paginator
 from django.utils import timezone
+from django.conf import settings
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.postgres.search import SearchVector, SearchQuery, SearchRank
 from django.db.models.functions import Coalesce
 from datetime import timedelta
+from functools import partial
 import json
 
 from .models import Prompt, Category, Tag, Review, PromptDownload, PromptPurchase, UserFavorite, PromptAnalytics
-from .forms import PromptForm, ReviewForm, SearchForm
+from .bulk import get_job, run_bulk_action, start_bulk_action
+from .cache import get_category_by_slug, get_popular_tags, get_prompt_by_slug, get_tag_by_slug, get_top_categories
+from .forms import BulkPromptForm, PromptForm, PromptImportForm, ReviewForm, SearchForm
+from .exports import (
+    EXPORT_CHUNK_SIZE, EXPORT_FORMATS, PROMPT_EXPORT_FIELDS, prompt_export_row, streaming_export_response
+)
+from .importers import PromptImporter
+from .tagging import release_prompt_tags
+from .queries import completed_purchases, daily_totals, date_range, monthly_earnings, with_rating_stats
+from .tasks import record_view
+from payments.ledger import creator_balance
 from payments.models import StripeAccount
-
+from prompt_platform import background
+from prompt_platform.metrics import SEARCH_LATENCY
+from prompt_platform.query_budget import query_budget
+from prompt_platform.replicas import replica_reads
+
+def cached_or_404(lookup, slug):
+    """``get_object_or_404`` for the ``prompts.cache`` lookups."""
+    try:
+        return lookup(slug)
+    except ObjectDoesNotExist:
+        raise Http404('No object matches the given query.')
+
+@query_budget(6)
+@replica_reads
 class PromptListView(ListView):
     model = Prompt
     template_name = 'prompts/prompt_list.html'
@@ -59,9 +85,7 @@ class PromptListView(ListView):
             elif sort_by == 'oldest':
                 queryset = queryset.order_by('created_at')
             elif sort_by == 'popular':
-                queryset = queryset.annotate(
-                    engagement_score=Coalesce(F('views') + F('downloads') + F('purchases'), 0)
-                ).order_by('-engagement_score')
+                queryset = queryset.order_by('-engagement_score')
             elif sort_by == 'rating':
                 queryset = queryset.annotate(
                     avg_rating=Coalesce(Avg('reviews__rating'), 0.0)
@@ -83,21 +107,18 @@ class PromptListView(ListView):
         # Add search form
         context['search_form'] = SearchForm(self.request.GET)
         
-        # Add categories
-        context['categories'] = Category.objects.filter(is_active=True).annotate(
-            prompt_count=Count('prompts', filter=Q(prompts__status='published', prompts__is_active=True))
-        ).order_by('-prompt_count')[:10]
+        # Add categories; templates call callables, so they are only looked up when shown
+        context['categories'] = partial(get_top_categories, 10)
         
         # Add featured prompts
         context['featured_prompts'] = Prompt.objects.filter(
             status='published',
             is_active=True
         ).annotate(
-            avg_rating=Coalesce(Avg('reviews__rating'), 0.0),
-            engagement_score=Coalesce(F('views') + F('downloads') + F('purchases'), 0)
+            avg_rating=Coalesce(Avg('reviews__rating'), 0.0)
         ).filter(
             avg_rating__gte=4.0
-        ).order_by('-engagement_score')[:6]
+        ).select_related('author', 'category').order_by('-engagement_score')[:6]
         
         # Add trending prompts
         week_ago = timezone.now() - timedelta(days=7)
@@ -107,32 +128,29 @@ class PromptListView(ListView):
             promptdownload_set__created_at__gte=week_ago
         ).annotate(
             recent_downloads=Count('promptdownload_set', filter=Q(promptdownload_set__created_at__gte=week_ago))
-        ).filter(recent_downloads__gte=5).order_by('-recent_downloads')[:6]
+        ).filter(recent_downloads__gte=5).select_related('author', 'category').order_by('-recent_downloads')[:6]
         
         # Add popular tags
-        context['popular_tags'] = Tag.objects.annotate(
-            prompt_count=Count('prompts', filter=Q(prompts__status='published', prompts__is_active=True))
-        ).filter(prompt_count__gt=0).order_by('-prompt_count')[:20]
+        context['popular_tags'] = partial(get_popular_tags, 20)
         
         return context
 
+@query_budget(14)
+@replica_reads
 class PromptDetailView(DetailView):
     model = Prompt
     template_name = 'prompts/prompt_detail.html'
     context_object_name = 'prompt'
 
-    def get_queryset(self):
-        return Prompt.objects.filter(
-            status='published',
-            is_active=True
-        ).select_related('author', 'category').prefetch_related('tags', 'reviews__user')
+    def get_object(self, queryset=None):
+        return cached_or_404(get_prompt_by_slug, self.kwargs['slug'])
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        prompt = self.get_object()
+        prompt = self.object
         
-        # Increment view count
-        prompt.increment_views()
+        # Count the view in the background
+        background.enqueue(record_view, prompt.pk)
         
         # Add reviews
         context['reviews'] = prompt.reviews.select_related('user').order_by('-created_at')[:10]
@@ -158,6 +176,7 @@ class PromptDetailView(DetailView):
         
         return context
 
+@query_budget(5)
 class PromptCreateView(LoginRequiredMixin, CreateView):
     model = Prompt
     form_class = PromptForm
@@ -175,6 +194,7 @@ class PromptCreateView(LoginRequiredMixin, CreateView):
         context['is_create'] = True
         return context
 
+@query_budget(9)
 class PromptUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     model = Prompt
     form_class = PromptForm
@@ -195,6 +215,7 @@ class PromptUpdateView(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
         context['is_edit'] = True
         return context
 
+@query_budget(5)
 class PromptDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Prompt
     template_name = 'prompts/prompt_confirm_delete.html'
@@ -204,10 +225,15 @@ class PromptDeleteView(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         prompt = self.get_object()
         return self.request.user == prompt.author
 
+    def form_valid(self, form):
+        release_prompt_tags(Prompt.objects.filter(pk=self.object.pk))
+        return super().form_valid(form)
+
     def delete(self, request, *args, **kwargs):
         messages.success(request, 'Prompt deleted successfully!')
         return super().delete(request, *args, **kwargs)
 
+@query_budget(4)
 @login_required
 def download_prompt(request, slug):
     prompt = get_object_or_404(Prompt, slug=slug, status='published', is_active=True)
@@ -232,6 +258,7 @@ def download_prompt(request, slug):
     messages.success(request, 'Prompt downloaded successfully!')
     return redirect('prompts:prompt_detail', slug=slug)
 
+@query_budget(4)
 @login_required
 def purchase_prompt(request, slug):
     prompt = get_object_or_404(Prompt, slug=slug, status='published', is_active=True)
@@ -251,6 +278,7 @@ def purchase_prompt(request, slug):
     # Redirect to checkout
     return redirect('payments:checkout', slug=slug)
 
+@query_budget(5)
 @login_required
 def add_review(request, slug):
     prompt = get_object_or_404(Prompt, slug=slug, status='published', is_active=True)
@@ -281,6 +309,7 @@ def add_review(request, slug):
         'prompt': prompt
     })
 
+@query_budget(8)
 @login_required
 @require_POST
 def toggle_favorite(request, slug):
@@ -303,6 +332,8 @@ def toggle_favorite(request, slug):
         'favorites_count': prompt.favorites
     })
 
+@query_budget(10)
+@replica_reads
 @login_required
 def user_dashboard(request):
     user = request.user
@@ -322,13 +353,9 @@ def user_dashboard(request):
     # User's favorites
     user_favorites = UserFavorite.objects.filter(user=user).select_related('prompt').order_by('-created_at')
     
-    # Analytics
-    total_earnings = user_prompts.filter(
-        price_type='paid',
-        promptpurchase_set__payment_status='completed'
-    ).aggregate(
-        total=Sum('promptpurchase_set__amount')
-    )['total'] or 0
+    # Analytics; lifetime earnings come from the ledger's running balance
+    balance = creator_balance(user)
+    total_earnings = balance.gross_total
     
     total_downloads = user_prompts.aggregate(
         total=Sum('downloads')
@@ -339,14 +366,7 @@ def user_dashboard(request):
     )['total'] or 0
     
     # Monthly earnings
-    current_month = timezone.now().month
-    monthly_earnings = user_prompts.filter(
-        price_type='paid',
-        promptpurchase_set__payment_status='completed',
-        promptpurchase_set__created_at__month=current_month
-    ).aggregate(
-        total=Sum('promptpurchase_set__amount')
-    )['total'] or 0
+    current_month_earnings = monthly_earnings(user)
     
     context = {
         'user_prompts': user_prompts,
@@ -354,15 +374,18 @@ def user_dashboard(request):
         'user_purchases': user_purchases,
         'user_favorites': user_favorites,
         'total_earnings': total_earnings,
+        'balance': balance,
         'total_downloads': total_downloads,
         'total_purchases': total_purchases,
-        'monthly_earnings': monthly_earnings,
+        'monthly_earnings': current_month_earnings,
     }
     
     return render(request, 'prompts/user_dashboard.html', context)
 
+@query_budget(4)
+@replica_reads
 def category_detail(request, slug):
-    category = get_object_or_404(Category, slug=slug, is_active=True)
+    category = cached_or_404(get_category_by_slug, slug)
     prompts = Prompt.objects.filter(
         category=category,
         status='published',
@@ -382,8 +405,10 @@ def category_detail(request, slug):
     
     return render(request, 'prompts/category_detail.html', context)
 
+@query_budget(4)
+@replica_reads
 def tag_detail(request, slug):
-    tag = get_object_or_404(Tag, slug=slug)
+    tag = cached_or_404(get_tag_by_slug, slug)
     prompts = Prompt.objects.filter(
         tags=tag,
         status='published',
@@ -403,6 +428,8 @@ def tag_detail(request, slug):
     
     return render(request, 'prompts/tag_detail.html', context)
 
+@query_budget(5)
+@replica_reads
 def search_prompts(request):
     """Search prompts with filters and sorting."""
     form = SearchForm(request.GET)
@@ -419,7 +446,7 @@ def search_prompts(request):
         prompts = Prompt.objects.filter(
             status='published',
             is_active=True
-        )
+        ).select_related('author', 'category').prefetch_related('tags')
         
         # Apply search query
         if query:
@@ -444,9 +471,7 @@ def search_prompts(request):
         elif sort_by == 'oldest':
             prompts = prompts.order_by('created_at')
         elif sort_by == 'popular':
-            prompts = prompts.annotate(
-                engagement_score=Coalesce(F('views') + F('downloads') + F('purchases'), 0)
-            ).order_by('-engagement_score')
+            prompts = prompts.order_by('-engagement_score')
         elif sort_by == 'rating':
             prompts = prompts.annotate(
                 avg_rating=Coalesce(Avg('reviews__rating'), 0.0)
@@ -456,10 +481,15 @@ def search_prompts(request):
         elif sort_by == 'price_high':
             prompts = prompts.order_by('-price')
         
-        # Paginate results
+        # Review counts for the result cards, in the same query
+        prompts = prompts.annotate(review_count=Count('reviews', distinct=True))
+        
+        # Paginate results; evaluating the page here lets the timing cover the search
         paginator = Paginator(prompts, 12)
         page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        with SEARCH_LATENCY.time(endpoint='search_prompts'):
+            page_obj = paginator.get_page(page_number)
+            page_obj.object_list = list(page_obj.object_list)
     
     context = {
         'form': form,
@@ -470,6 +500,8 @@ def search_prompts(request):
     
     return render(request, 'prompts/search_results.html', context)
 
+@query_budget(11)
+@replica_reads
 @login_required
 def analytics_dashboard(request):
     user = request.user
@@ -480,29 +512,18 @@ def analytics_dashboard(request):
     # Overall statistics
     total_prompts = user_prompts.count()
     published_prompts = user_prompts.filter(status='published').count()
-    total_earnings = user_prompts.filter(
-        price_type='paid',
-        promptpurchase_set__payment_status='completed'
-    ).aggregate(
-        total=Sum('promptpurchase_set__amount')
-    )['total'] or 0
+    balance = creator_balance(user)
+    total_earnings = balance.gross_total
     
     # Monthly statistics
-    current_month = timezone.now().month
-    monthly_earnings = user_prompts.filter(
-        price_type='paid',
-        promptpurchase_set__payment_status='completed',
-        promptpurchase_set__created_at__month=current_month
-    ).aggregate(
-        total=Sum('promptpurchase_set__amount')
-    )['total'] or 0
+    current_month_earnings = monthly_earnings(user)
     
     # Top performing prompts
-    top_prompts = user_prompts.filter(
+    top_prompts = with_rating_stats(user_prompts.filter(
         promptpurchase_set__payment_status='completed'
-    ).annotate(
+    ).select_related('category').annotate(
         total_revenue=Sum('promptpurchase_set__amount')
-    ).order_by('-total_revenue')[:5]
+    )).order_by('-total_revenue')[:5]
     
     # Recent activity
     recent_downloads = PromptDownload.objects.filter(
@@ -515,39 +536,40 @@ def analytics_dashboard(request):
     ).select_related('prompt', 'user').order_by('-created_at')[:10]
     
     # Chart data (last 30 days)
-    end_date = timezone.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
+    range_start, range_end = date_range(start_date, end_date)
+    
+    daily_downloads = daily_totals(
+        PromptDownload.objects.filter(prompt__author=user),
+        range_start, range_end,
+        downloads=Count('id')
+    )
+    daily_purchases = daily_totals(
+        completed_purchases(user),
+        range_start, range_end,
+        purchases=Count('id'),
+        revenue=Sum('amount')
+    )
     
     daily_stats = []
     for i in range(30):
         date = start_date + timedelta(days=i)
-        downloads = PromptDownload.objects.filter(
-            prompt__author=user,
-            created_at__date=date
-        ).count()
-        purchases = PromptPurchase.objects.filter(
-            prompt__author=user,
-            payment_status='completed',
-            created_at__date=date
-        ).count()
-        revenue = PromptPurchase.objects.filter(
-            prompt__author=user,
-            payment_status='completed',
-            created_at__date=date
-        ).aggregate(total=Sum('amount'))['total'] or 0
+        purchases = daily_purchases.get(date, {})
         
         daily_stats.append({
             'date': date.strftime('%Y-%m-%d'),
-            'downloads': downloads,
-            'purchases': purchases,
-            'revenue': float(revenue)
+            'downloads': daily_downloads.get(date, {}).get('downloads', 0),
+            'purchases': purchases.get('purchases', 0),
+            'revenue': float(purchases.get('revenue') or 0)
         })
     
     context = {
         'total_prompts': total_prompts,
         'published_prompts': published_prompts,
         'total_earnings': total_earnings,
-        'monthly_earnings': monthly_earnings,
+        'balance': balance,
+        'monthly_earnings': current_month_earnings,
         'top_prompts': top_prompts,
         'recent_downloads': recent_downloads,
         'recent_purchases': recent_purchases,
@@ -556,6 +578,8 @@ def analytics_dashboard(request):
     
     return render(request, 'prompts/analytics_dashboard.html', context)
 
+@query_budget(2)
+@replica_reads
 @csrf_exempt
 def api_search(request):
     """API endpoint for AJAX search."""
@@ -570,7 +594,9 @@ def api_search(request):
             Q(tags__name__icontains=query),
             status='published',
             is_active=True
-        ).distinct()[:10]
+        ).select_related('category').distinct()[:10]
+        with SEARCH_LATENCY.time(endpoint='api_search'):
+            prompts = list(prompts)
         
         results = []
         for prompt in prompts:
@@ -590,29 +616,91 @@ def api_search(request):
     
     return JsonResponse({'error': 'Invalid request method'}, status=400)
 
+@query_budget(4)
 @login_required
 def export_prompts(request):
-    """Export user's prompts as JSON"""
-    user = request.user
-    prompts = Prompt.objects.filter(author=user)
-    
-    data = []
-    for prompt in prompts:
-        data.append({
-            'title': prompt.title,
-            'description': prompt.description,
-            'content': prompt.content,
-            'category': prompt.category.name,
-            'price_type': prompt.price_type,
-            'price': float(prompt.price),
-            'status': prompt.status,
-            'created_at': prompt.created_at.isoformat(),
-            'views': prompt.views,
-            'downloads': prompt.downloads,
-            'purchases': prompt.purchases,
-            'earnings': float(prompt.total_earnings),
-        })
+    """Stream the user's prompts as JSON, NDJSON or CSV, optionally gzipped."""
+    export_format = request.GET.get('format', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'error': 'Invalid export format'}, status=400)
+    
+    prompts = Prompt.objects.filter(author=request.user).select_related('category').order_by('pk')
+    rows = (prompt_export_row(prompt) for prompt in prompts.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+    
+    return streaming_export_response(
+        rows,
+        PROMPT_EXPORT_FIELDS,
+        export_format,
+        f'my_prompts_{timezone.now().strftime("%Y%m%d")}',
+        compress=request.GET.get('gzip') in ('1', 'true'),
+    )
+
+
+@query_budget(3)
+@login_required
+def import_prompts(request):
+    """Bulk import prompts from an uploaded JSON or NDJSON file."""
+    result = None
+    if request.method == 'POST':
+        form = PromptImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            importer = PromptImporter(
+                request.user,
+                overwrite_existing=form.cleaned_data['overwrite_existing']
+            )
+            result = importer.run(form.cleaned_data['json_file'])
+            if result.fatal_error:
+                messages.error(request, f'Import stopped: {result.fatal_error}')
+            messages.success(
+                request,
+                f'Imported {result.created} new and {result.updated} updated prompts '
+                f'({len(result.errors)} rows skipped).'
+            )
+    else:
+        form = PromptImportForm()
+    
+    return render(request, 'prompts/prompt_import.html', {
+        'form': form,
+        'result': result,
+    })
+
+@query_budget(5)
+@login_required
+@require_POST
+def bulk_prompt_action(request):
+    """Apply a bulk action to the user's selected prompts."""
+    form = BulkPromptForm(request.POST)
+    if not form.is_valid():
+        return JsonResponse({'success': False, 'errors': form.errors}, status=400)
+    
+    action = form.cleaned_data['action']
+    prompt_ids = form.cleaned_data['prompt_ids']
+    new_category = form.cleaned_data.get('new_category')
+    new_price = form.cleaned_data.get('new_price')
+    
+    # Large selections run in chunks in the background; poll the status URL
+    if len(prompt_ids) > settings.BULK_ACTION_ASYNC_THRESHOLD:
+        job_id = start_bulk_action(request.user, action, prompt_ids, new_category, new_price)
+        return JsonResponse({
+            'success': True,
+            'job_id': job_id,
+            'status_url': reverse('prompts:bulk_action_status', kwargs={'job_id': job_id}),
+        }, status=202)
+    
+    job = run_bulk_action(request.user, action, prompt_ids, new_category, new_price)
+    return JsonResponse({
+        'success': True,
+        'action': action,
+        'requested': job['total'],
+        'affected': job['affected'],
+    })
+
+@query_budget(3)
+@login_required
+def bulk_action_status(request, job_id):
+    """Report progress of a background bulk action."""
+    job = get_job(job_id, request.user)
+    if job is None:
+        return JsonResponse({'error': 'Job not found'}, status=404)
     
-    response = JsonResponse(data, safe=False)
-    response['Content-Disposition'] = f'attachment; filename="my_prompts_{timezone.now().strftime("%Y%m%d")}.json"'
-    return response 
\ No newline at end of file
+    return JsonResponse(job)